@@ -5,12 +5,15 @@ I/O handling for BAM alignment files.
 
 import warnings
 import logging
+import abc
 import re
 import sys
 
 import numpy as np
 
-from pbcore.io import IndexedBamReader
+from pbcore.io import openDataFile
+
+from pbreports.io.pbi_cache import load_pbi_columns
 
 log = logging.getLogger(__name__)
 
@@ -63,63 +66,117 @@ def alignment_info_from_bam(bam_file_name):
     Extract subread information from an indexed BAM file.  This should be
     relatively fast since it will not access the BAM records directly.
     """
+    return alignment_info_from_pbi(bam_file_name,
+                                   load_pbi_columns(bam_file_name))
+
+
+def alignment_info_from_pbi(bam_file_name, pbi):
+    """
+    Extract subread information from the PbiColumns of an indexed BAM file.
+    """
     by_movie = {}
     last_zmw_id = None
-    with IndexedBamReader(bam_file_name) as bam:
-        if len(bam) > 0:
-            identities = bam.identity
-            subread_lengths = bam.aEnd - bam.aStart
-            for i_aln, rgId in enumerate(bam.qId):
-                movie_name = bam.readGroupInfo(rgId).MovieName
-                if not movie_name in by_movie:
-                    by_movie[movie_name] = MovieAlignmentInfo(bam_file_name,
-                                                              movie_name)
-                m = by_movie[movie_name]
-                hole_number = bam.holeNumber[i_aln]
-                qs, qe = bam.qStart[i_aln], bam.qEnd[i_aln]
-                rstart, rend = bam.aStart[i_aln], bam.aEnd[i_aln]
-                identity = None
-                if (qs, qe) == (-1, -1):
-                    qs = 0
-                    # XXX This is only used to key subreads so the exact value is
-                    # not important - still clumsy though
-                    qe = rend - rstart
-
-                # Compound ids
-                zmw_id = (movie_name, hole_number)
-                subread_id = (movie_name, hole_number, qs, qe)
-
-                this_a = []
-                this_a.append(subread_lengths[i_aln])
-
-                this_a.append(identities[i_aln])
-                this_a.append(bam.readQual[i_aln])
-
-                this_a.append(1.0 if zmw_id != last_zmw_id else 0.0)  # isFirst
-
-                # modStart, a value without a clear meaning, so just write some
-                # garbage
-                this_a.append(99999)
-
-                last_zmw_id = zmw_id
-
-                if subread_id in m.datum:
-                    warnings.warn("Duplicate subread %s" % str(subread_id))
-
-                # No Z-score
-                m.datum[subread_id] = tuple(this_a)
-
-                if zmw_id not in m.max_subread or subread_lengths[i_aln] > m.max_subread[zmw_id][1]:
-                    m.max_subread[zmw_id] = (
-                        subread_id, subread_lengths[i_aln])
-
-                m.unrolled.setdefault(zmw_id, [99999, 0])
-                m.unrolled[zmw_id][0] = min(m.unrolled[zmw_id][0], rstart)
-                m.unrolled[zmw_id][1] = max(m.unrolled[zmw_id][1], rend)
+    if len(pbi) > 0:
+        identities = pbi.identity
+        subread_lengths = pbi.aEnd - pbi.aStart
+        for i_aln, movie_code in enumerate(pbi.movie):
+            movie_name = pbi.movie_names[movie_code]
+            if not movie_name in by_movie:
+                by_movie[movie_name] = MovieAlignmentInfo(bam_file_name,
+                                                          movie_name)
+            m = by_movie[movie_name]
+            hole_number = pbi.holeNumber[i_aln]
+            qs, qe = pbi.qStart[i_aln], pbi.qEnd[i_aln]
+            rstart, rend = pbi.aStart[i_aln], pbi.aEnd[i_aln]
+            identity = None
+            if (qs, qe) == (-1, -1):
+                qs = 0
+                # XXX This is only used to key subreads so the exact value is
+                # not important - still clumsy though
+                qe = rend - rstart
+
+            # Compound ids
+            zmw_id = (movie_name, hole_number)
+            subread_id = (movie_name, hole_number, qs, qe)
+
+            this_a = []
+            this_a.append(subread_lengths[i_aln])
+
+            this_a.append(identities[i_aln])
+            this_a.append(pbi.readQual[i_aln])
+
+            this_a.append(1.0 if zmw_id != last_zmw_id else 0.0)  # isFirst
+
+            # modStart, a value without a clear meaning, so just write some
+            # garbage
+            this_a.append(99999)
+
+            last_zmw_id = zmw_id
+
+            if subread_id in m.datum:
+                warnings.warn("Duplicate subread %s" % str(subread_id))
+
+            # No Z-score
+            m.datum[subread_id] = tuple(this_a)
+
+            if zmw_id not in m.max_subread or subread_lengths[i_aln] > m.max_subread[zmw_id][1]:
+                m.max_subread[zmw_id] = (
+                    subread_id, subread_lengths[i_aln])
+
+            m.unrolled.setdefault(zmw_id, [99999, 0])
+            m.unrolled[zmw_id][0] = min(m.unrolled[zmw_id][0], rstart)
+            m.unrolled[zmw_id][1] = max(m.unrolled[zmw_id][1], rend)
 
     return by_movie  # datum, unrolled, max_subread
 
 
+def alignment_file_names(alignment_file):
+    """
+    The BAM files of an AlignmentSet XML, or the BAM file itself.
+    """
+    with openDataFile(alignment_file) as ds:
+        return list(ds.toExternalFiles())
+
+
+class PbiConsumer(object):
+    """
+    Consumer of the pbi columns of each alignment file, registered with an
+    AlignmentSetCollector.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def consume(self, bam_file_name, pbi):
+        """Process the PbiColumns of one alignment file"""
+        pass
+
+
+class AlignmentSetCollector(object):
+    """
+    Drives a single pass over the pbi columns of each alignment file,
+    handing each file's columns to every registered consumer, so that the
+    statistics for several reports cost one read of each pbi.  The pbi
+    columns are kept in memo, a PbiMemo, if given.
+    """
+
+    def __init__(self, bam_file_names, memo=None):
+        self.bam_file_names = list(bam_file_names)
+        self.consumers = []
+        self.memo = memo
+
+    def register(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    def run(self):
+        for bam_file_name in self.bam_file_names:
+            log.info("reading {f}.pbi".format(f=bam_file_name))
+            pbi = load_pbi_columns(bam_file_name, memo=self.memo)
+            for consumer in self.consumers:
+                consumer.consume(bam_file_name, pbi)
+        return self.consumers
+
+
 def from_alignment_file(aln_info):  # movie_name, alignment_file_name):
     columns = ["Length", "Concordance", "Read quality", "isFirst", "modStart"]
     datum, unrolled, max_subread, movie_names = aln_info.as_tuple()
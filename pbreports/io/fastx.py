@@ -0,0 +1,196 @@
+
+"""
+Fast per-record statistics for FASTA and FASTQ files.
+
+The files are read in large blocks which are split into lines with NumPy,
+so sequences and qualities are never decoded into per-record Python
+objects.  FASTA lengths are taken from the .fai index when an up-to-date
+one is present.  FASTQ records must be in the four-line format.
+"""
+
+from collections import namedtuple
+import gzip
+import logging
+import os
+import os.path as op
+
+import numpy as np
+
+from pbcore.io import ContigSet
+
+log = logging.getLogger(__name__)
+
+
+class Constants(object):
+    CHUNK_SIZE = 1 << 22
+    QV_OFFSET = 33
+    NEWLINE = ord("\n")
+    CR = ord("\r")
+    FASTA_HEADER = ord(">")
+    FASTQ_HEADER = ord("@")
+    FAI_EXT = ".fai"
+
+# names is None unless requested
+FastqStats = namedtuple("FastqStats", ["names", "lengths", "mean_qvs"])
+
+
+def _open(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rb")
+    return open(file_name, "rb")
+
+
+def _split_lines(data):
+    """
+    Split a block of text into lines, returning (buf, starts, ends) where buf
+    is the uint8 view of data and line i is buf[starts[i]:ends[i]], without
+    its line terminator.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == Constants.NEWLINE)
+    if len(buf) > 0 and buf[-1] != Constants.NEWLINE:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(ends.dtype)
+    has_cr = (ends > starts) & (buf[np.maximum(ends - 1, 0)] == Constants.CR)
+    return buf, starts, ends - has_cr
+
+
+def _iter_line_blocks(file_name, chunk_size=Constants.CHUNK_SIZE):
+    """
+    Yield (data, buf, starts, ends) for each block of complete lines in the
+    file, see _split_lines.
+    """
+    tail = b""
+    with _open(file_name) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if len(chunk) == 0:
+                if len(tail) > 0:
+                    yield (tail,) + _split_lines(tail)
+                break
+            data = tail + chunk
+            last = data.rfind(b"\n")
+            if last < 0:
+                tail = data
+                continue
+            data, tail = data[:last + 1], data[last + 1:]
+            yield (data,) + _split_lines(data)
+
+
+def _line_sums(buf, starts, ends):
+    """Sum of the byte values of each line"""
+    totals = np.concatenate([[0], np.cumsum(buf, dtype=np.int64)])
+    return totals[ends] - totals[starts]
+
+
+def read_fai(file_name):
+    """
+    Record names and lengths of a FASTA file from its .fai index, as a list
+    and an array, or None if there is no index at least as recent as the
+    file.
+    """
+    fai_file_name = file_name + Constants.FAI_EXT
+    if not op.exists(fai_file_name):
+        return None
+    if os.stat(fai_file_name).st_mtime < os.stat(file_name).st_mtime:
+        log.warn("Ignoring out of date index {f}".format(f=fai_file_name))
+        return None
+    names, lengths = [], []
+    with open(fai_file_name) as f:
+        for line in f:
+            if line.strip():
+                fields = line.split("\t")
+                names.append(fields[0])
+                lengths.append(int(fields[1]))
+    return names, np.array(lengths, dtype=np.int64)
+
+
+def _scan_fasta_lengths(file_name, chunk_size=Constants.CHUNK_SIZE):
+    # non-empty arrays of record lengths; the last record of a block may
+    # continue in the next one
+    blocks = []
+    for data, buf, starts, ends in _iter_line_blocks(file_name, chunk_size):
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        is_header = buf[starts] == Constants.FASTA_HEADER
+        # 0 for lines continuing the record from the previous block
+        records = np.cumsum(is_header)
+        is_seq = ~is_header
+        lengths = np.bincount(records[is_seq],
+                              weights=(ends - starts)[is_seq],
+                              minlength=int(records[-1]) + 1 if
+                              len(records) > 0 else 1).astype(np.int64)
+        if len(blocks) > 0:
+            blocks[-1][-1] += lengths[0]
+        elif lengths[0] > 0:
+            raise ValueError("{f} is not a FASTA file".format(f=file_name))
+        if len(lengths) > 1:
+            blocks.append(lengths[1:])
+    if len(blocks) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+def fasta_lengths(file_name, use_index=True):
+    """
+    Get the length of each record of a FASTA file (optionally gzipped), in
+    file order, from its .fai index if use_index and an up-to-date index is
+    present.
+
+    :rtype: np.ndarray
+    """
+    if use_index:
+        fai = read_fai(file_name)
+        if fai is not None:
+            return fai[1]
+    return _scan_fasta_lengths(file_name)
+
+
+def contig_set_lengths(file_name):
+    """
+    Get the record lengths of a ContigSet XML, or of a FASTA file.
+    """
+    if not file_name.endswith(".xml"):
+        return fasta_lengths(file_name)
+    with ContigSet(file_name) as ds:
+        fasta_files = ds.toExternalFiles()
+    if len(fasta_files) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([fasta_lengths(f) for f in fasta_files])
+
+
+def fastq_stats(file_name, with_names=False,
+                chunk_size=Constants.CHUNK_SIZE):
+    """
+    Get the length and mean QV of each record of a four-line FASTQ file
+    (optionally gzipped), in file order, and their names (the full header
+    lines) if with_names.
+
+    :rtype: FastqStats
+    """
+    names, lengths, qv_sums, qv_lengths = [], [], [], []
+    nlines = 0
+    for data, buf, starts, ends in _iter_line_blocks(file_name, chunk_size):
+        kinds = (nlines + np.arange(len(starts))) % 4
+        nlines += len(starts)
+        headers = kinds == 0
+        h_starts, h_ends = starts[headers], ends[headers]
+        bad = (h_ends > h_starts) & (buf[h_starts] != Constants.FASTQ_HEADER)
+        if bad.any():
+            raise ValueError("{f} is not a four-line FASTQ file".format(
+                f=file_name))
+        if with_names:
+            names.extend(data[s + 1:e] for s, e in zip(h_starts, h_ends))
+        lengths.append(ends[kinds == 1] - starts[kinds == 1])
+        quals = kinds == 3
+        qv_sums.append(_line_sums(buf, starts[quals], ends[quals]))
+        qv_lengths.append(ends[quals] - starts[quals])
+    nrecords = nlines // 4
+    qv_lengths = np.concatenate([np.zeros(0, dtype=np.int64)] + qv_lengths)
+    qv_sums = np.concatenate([np.zeros(0, dtype=np.int64)] + qv_sums)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_qvs = (qv_sums - Constants.QV_OFFSET * qv_lengths) / \
+            qv_lengths.astype(float)
+    lengths = np.concatenate([np.zeros(0, dtype=np.int64)] + lengths)
+    return FastqStats(names[:nrecords] if with_names else None,
+                      lengths[:nrecords], mean_qvs)
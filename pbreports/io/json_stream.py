@@ -0,0 +1,100 @@
+
+"""
+Incremental decoding of large JSON objects.
+
+Some tools (e.g. juliet) write a single top-level JSON object with one
+member per sample, which can be too large to json.load at once.
+iter_json_object decodes the members one at a time, so only one member's
+text and value are held in memory.  Malformed or truncated input raises
+ValueError, like json.load; anything after the closing brace is ignored.
+"""
+
+import json
+import re
+
+
+class Constants(object):
+    CHUNK_SIZE = 1 << 20
+
+
+class _JsonObjectReader(object):
+    """Decodes the members of a top-level JSON object from a file"""
+
+    _NON_WS = re.compile(r"\S")
+    _NUMBER_CHARS = "0123456789+-.eE"
+
+    def __init__(self, file_obj, chunk_size):
+        self._file_obj = file_obj
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+
+    def _fill(self):
+        """Reads another chunk, growing with the unconsumed buffer so that
+           re-decoding a large member stays linear. False at EOF."""
+        chunk = self._file_obj.read(max(self._chunk_size,
+                                        len(self._buf) - self._pos))
+        if not chunk:
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _next_char(self):
+        """Consumes and returns the next non-whitespace character"""
+        while True:
+            m = self._NON_WS.search(self._buf, self._pos)
+            if m is not None:
+                self._pos = m.end()
+                return m.group(0)
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON data")
+
+    def _next_value(self):
+        """Decodes the next JSON value"""
+        self._next_char()
+        self._pos -= 1
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # a number may continue in the next chunk
+                partial = (end == len(self._buf) or
+                           self._buf[end] in self._NUMBER_CHARS)
+                if not partial or not self._fill():
+                    self._pos = end
+                    return value
+            except ValueError:
+                if not self._fill():
+                    raise
+
+    def _expect(self, chars):
+        c = self._next_char()
+        if c not in chars:
+            raise ValueError("Expected one of '{e}' in JSON object, "
+                             "found '{c}'".format(e=chars, c=c))
+        return c
+
+    def __iter__(self):
+        self._expect("{")
+        c = self._expect('"}')
+        while c != "}":
+            self._pos -= 1
+            key = self._next_value()
+            self._expect(":")
+            yield key, self._next_value()
+            if self._expect(",}") == ",":
+                c = self._expect('"')
+            else:
+                c = "}"
+
+
+def iter_json_object(file_obj, chunk_size=Constants.CHUNK_SIZE):
+    """
+    Yield the (key, value) pairs of the top-level JSON object in file_obj,
+    in file order, reading it chunk_size characters at a time.
+
+    Members are yielded as they are decoded, so a ValueError for malformed
+    or truncated input is raised after the members before it.
+    """
+    return iter(_JsonObjectReader(file_obj, chunk_size))
@@ -0,0 +1,222 @@
+
+"""
+Cache of BAM index (.pbi) columns as memory-mapped .npy files.
+
+Several reports in a workflow read the same AlignmentSet; with the cache
+enabled each .pbi is only decoded by the first of them, and the others load
+its columns zero-copy.  Enable it by pointing PBREPORTS_PBI_CACHE_DIR at a
+directory shared by the report tasks.  Entries are keyed by the path, size
+and mtime of the .pbi.  Without it the columns are read directly from the
+.pbi; a report that reads the same .pbi again can pass a PbiMemo to keep
+the most recently read ones in memory.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import os.path as op
+import shutil
+import tempfile
+
+import numpy as np
+
+from pbcore.io import IndexedBamReader
+
+log = logging.getLogger(__name__)
+
+
+class Constants(object):
+    CACHE_DIR_ENV = "PBREPORTS_PBI_CACHE_DIR"
+    COLUMNS = ("holeNumber", "qStart", "qEnd", "tId", "tStart", "tEnd",
+               "aStart", "aEnd", "readQual", "mapQV", "identity")
+    FLOAT_COLUMNS = ("readQual", "identity")
+    # index into PbiColumns.movie_names for each record
+    C_MOVIE = "movie"
+    META_FILE = "meta.json"
+    # total size of the columns kept in memory by a PbiMemo
+    MEMO_MAX_BYTES = 1 << 28
+
+
+class PbiColumns(object):
+    """
+    Column arrays from a BAM index.  The read group of each record is
+    resolved to the movie column, indexing movie_names (the movies of all
+    read groups in the header), and reference_names maps each tId to the
+    reference name.
+    """
+
+    def __init__(self, columns, movie_names, reference_names):
+        self._columns = columns
+        self.movie_names = movie_names
+        self.reference_names = reference_names
+
+    def __len__(self):
+        return len(self._columns[Constants.C_MOVIE])
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self._columns.itervalues())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _read_pbi_columns(bam_file_name):
+    with IndexedBamReader(bam_file_name) as bam:
+        reference_names = {r.ID: r.Name for r in bam.referenceInfoTable}
+        if len(bam) == 0:
+            columns = {name: np.zeros(0, dtype=(
+                float if name in Constants.FLOAT_COLUMNS else int))
+                for name in Constants.COLUMNS}
+            qIds = np.zeros(0, dtype=int)
+        else:
+            columns = {name: np.asarray(getattr(bam, name))
+                       for name in Constants.COLUMNS}
+            qIds = bam.qId
+        # resolve each distinct read group once
+        rg_ids, rg_codes = np.unique(qIds, return_inverse=True)
+        rg_movies = [bam.readGroupInfo(rg_id).MovieName for rg_id in rg_ids]
+        # include the movies of read groups without alignments
+        movie_names = sorted(set(rg.MovieName for rg in bam.readGroupTable))
+    movie_codes = {movie: i for i, movie in enumerate(movie_names)}
+    columns[Constants.C_MOVIE] = np.array(
+        [movie_codes[movie] for movie in rg_movies], dtype=int)[rg_codes]
+    return PbiColumns(columns, movie_names, reference_names)
+
+
+def _pbi_fingerprint(pbi_file_name):
+    st = os.stat(pbi_file_name)
+    return (op.abspath(pbi_file_name), st.st_size, st.st_mtime)
+
+
+def _get_cache_path(cache_dir, fingerprint):
+    return op.join(cache_dir, hashlib.md5(json.dumps(fingerprint)).hexdigest())
+
+
+class PbiMemo(object):
+    """
+    PbiColumns read without the cache, kept in memory so that reading the
+    same .pbi again does not decode it again.  Entries are keyed by the path,
+    size and mtime of the .pbi, and the oldest are dropped once the columns
+    take more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=Constants.MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._pbi_columns = OrderedDict()
+
+    def __len__(self):
+        return len(self._pbi_columns)
+
+    def load(self, bam_file_name):
+        fingerprint = _pbi_fingerprint(bam_file_name + ".pbi")
+        pbi_columns = self._pbi_columns.pop(fingerprint, None)
+        if pbi_columns is None:
+            pbi_columns = _read_pbi_columns(bam_file_name)
+        self._pbi_columns[fingerprint] = pbi_columns
+        nbytes = sum(c.nbytes for c in self._pbi_columns.itervalues())
+        while nbytes > self.max_bytes:
+            nbytes -= self._pbi_columns.popitem(last=False)[1].nbytes
+        return pbi_columns
+
+
+def pbi_checksum(pbi_file_name):
+    """Checksum of the .pbi contents"""
+    md5 = hashlib.md5()
+    with open(pbi_file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _write_cache(cache_path, pbi_columns):
+    """
+    Write the columns to a temporary directory and move it into place, so
+    that concurrent tasks never see a partial cache entry.
+    """
+    tmp_dir = None
+    try:
+        if not op.isdir(op.dirname(cache_path)):
+            os.makedirs(op.dirname(cache_path))
+        tmp_dir = tempfile.mkdtemp(dir=op.dirname(cache_path))
+        for name in Constants.COLUMNS + (Constants.C_MOVIE,):
+            np.save(op.join(tmp_dir, name + ".npy"),
+                    getattr(pbi_columns, name))
+        meta = dict(nrecords=len(pbi_columns),
+                    movies=pbi_columns.movie_names,
+                    references=sorted(pbi_columns.reference_names.items()))
+        with open(op.join(tmp_dir, Constants.META_FILE), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp_dir, cache_path)
+    except (IOError, OSError) as e:
+        # another task may have filled it first; either way the columns
+        # are already in memory
+        if not op.exists(op.join(cache_path, Constants.META_FILE)):
+            log.warn("Unable to cache pbi columns in {d}: {e}".format(
+                d=cache_path, e=e))
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _load_cache(cache_path):
+    with open(op.join(cache_path, Constants.META_FILE)) as f:
+        meta = json.load(f)
+    # numpy can't memory-map a zero-length array
+    mmap_mode = "r" if meta["nrecords"] > 0 else None
+    columns = {name: np.load(op.join(cache_path, name + ".npy"),
+                             mmap_mode=mmap_mode)
+               for name in Constants.COLUMNS + (Constants.C_MOVIE,)}
+    movie_names = [str(movie) for movie in meta["movies"]]
+    reference_names = {i: str(name) for i, name in meta["references"]}
+    return PbiColumns(columns, movie_names, reference_names)
+
+
+def cached_movie_names(bam_file_name, cache_dir=None):
+    """
+    Movie names of the read groups of an indexed BAM file if its pbi columns
+    are in the pbi column cache (cache_dir, or PBREPORTS_PBI_CACHE_DIR),
+    without reading the BAM or its pbi; otherwise None.
+    """
+    pbi_file_name = bam_file_name + ".pbi"
+    if not op.exists(pbi_file_name):
+        return None
+    fingerprint = _pbi_fingerprint(pbi_file_name)
+    if cache_dir is None:
+        cache_dir = os.environ.get(Constants.CACHE_DIR_ENV)
+    if cache_dir:
+        meta_file = op.join(_get_cache_path(cache_dir, fingerprint),
+                            Constants.META_FILE)
+        if op.exists(meta_file):
+            with open(meta_file) as f:
+                return [str(movie) for movie in json.load(f)["movies"]]
+    return None
+
+
+def load_pbi_columns(bam_file_name, cache_dir=None, memo=None):
+    """
+    Load the index columns of an indexed BAM file, from the pbi column cache
+    when enabled (cache_dir, or PBREPORTS_PBI_CACHE_DIR), filling it on first
+    use.  Without the cache they are read from the pbi, or from the PbiMemo
+    memo if given.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(Constants.CACHE_DIR_ENV)
+    if not cache_dir:
+        if memo is None:
+            return _read_pbi_columns(bam_file_name)
+        return memo.load(bam_file_name)
+    cache_path = _get_cache_path(cache_dir,
+                                 _pbi_fingerprint(bam_file_name + ".pbi"))
+    if op.exists(op.join(cache_path, Constants.META_FILE)):
+        log.debug("Loading cached pbi columns from {d}".format(d=cache_path))
+        return _load_cache(cache_path)
+    pbi_columns = _read_pbi_columns(bam_file_name)
+    _write_cache(cache_path, pbi_columns)
+    return pbi_columns
@@ -0,0 +1,95 @@
+
+"""
+Contig index of a ReferenceSet, for reports that only need the ids and
+lengths of its contigs, and the records of a few of them.
+
+Ids and lengths are read from the .fai index of each FASTA file, so the
+sequences are never touched; FASTA files without an up-to-date index fall
+back to the contig records.
+"""
+
+import heapq
+import logging
+
+import numpy as np
+
+from pbreports.io.fastx import read_fai
+
+log = logging.getLogger(__name__)
+
+
+class ReferenceIndex(object):
+    """
+    Contig ids and lengths of a reference, in file order, with constant
+    time lookup by id.
+    """
+
+    def __init__(self, ids, lengths):
+        self.ids = list(ids)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self._slots = {contig_id: i for i, contig_id in enumerate(self.ids)}
+
+    @staticmethod
+    def from_contigs(contigs):
+        ids, lengths = [], []
+        for contig in contigs:
+            ids.append(contig.id)
+            lengths.append(len(contig))
+        return ReferenceIndex(ids, lengths)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, contig_id):
+        return contig_id in self._slots
+
+    def slot(self, contig_id):
+        """Position of the contig in the reference, or None"""
+        return self._slots.get(contig_id)
+
+    def top_ids(self, max_contigs):
+        """
+        Ids of the max_contigs longest contigs, longest first (in file order
+        for equal lengths).
+        """
+        lengths = self.lengths.tolist()
+        slots = heapq.nlargest(max_contigs, xrange(len(lengths)),
+                               key=lengths.__getitem__)
+        return [self.ids[i] for i in slots]
+
+
+def load_reference_index(reference):
+    """
+    :param reference: (ReferenceSet) see pbreports.util.openReference
+    :rtype: ReferenceIndex
+    """
+    ids, lengths = [], []
+    for fasta_file in reference.toExternalFiles():
+        fai = read_fai(fasta_file)
+        if fai is None:
+            log.info("No index for {f}, reading contig records".format(
+                f=fasta_file))
+            return ReferenceIndex.from_contigs(reference.contigs)
+        ids.extend(fai[0])
+        lengths.append(fai[1])
+    if len(lengths) == 0:
+        return ReferenceIndex([], [])
+    return ReferenceIndex(ids, np.concatenate(lengths))
+
+
+def get_contigs(reference, contig_ids):
+    """
+    Get the contig records of the given ids (or names) in one pass over the
+    reference, instead of one ReferenceSet.get_contig scan per contig.
+
+    :returns: dict of contig id to record, for the ids that were found
+    """
+    wanted = set(contig_ids)
+    found = {}
+    for contig in reference.contigs:
+        for key in (contig.id, contig.name):
+            if key in wanted and key not in found:
+                found[key] = contig
+        if len(found) == len(wanted):
+            break
+    return found
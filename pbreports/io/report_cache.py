@@ -0,0 +1,298 @@
+"""
+Cache of report results, keyed by the report id, tool version, options and
+inputs.
+
+Inputs are identified by their dataset UUID and the size and mtime of their
+external resources (or of the file itself, for inputs that are not dataset
+XML files).  A report whose key is already cached is not recomputed: its
+report JSON, plot images and other outputs are copied from the cache.  The
+key also covers the report spec, so editing a spec invalidates the reports
+using it; to avoid recomputing everything when only the view changes,
+reports may also cache their intermediate results separately, keyed
+without the spec (see cached_result).  Keys also cover the pbreports
+version, and restored reports get a new UUID.
+
+Enable it by pointing PBREPORTS_REPORT_CACHE_DIR at a directory shared by
+the report tasks.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import os.path as op
+import shutil
+import tempfile
+import uuid
+import zipfile
+
+import numpy as np
+
+from pbcore.io import openDataSet
+
+from pbreports import get_version
+from pbreports.io.specs import get_spec_file
+
+log = logging.getLogger(__name__)
+
+
+class Constants(object):
+    CACHE_DIR_ENV = "PBREPORTS_REPORT_CACHE_DIR"
+    REPORTS_DIR = "reports"
+    RESULTS_DIR = "results"
+    FILES_DIR = "files"
+    META_FILE = "meta.json"
+    REPORT_FILE = "report.json"
+    # plot group and plot fields that are paths to files
+    PLOT_GROUP_FILES = ("thumbnail", "legend")
+    PLOT_FILES = ("image", "thumbnail")
+
+
+def _get_cache_dir(cache_dir):
+    if cache_dir is None:
+        cache_dir = os.environ.get(Constants.CACHE_DIR_ENV)
+    return cache_dir or None
+
+
+def _file_fingerprint(file_name):
+    st = os.stat(file_name)
+    return [op.abspath(file_name), st.st_size, st.st_mtime]
+
+
+def _input_fingerprint(file_name):
+    if file_name.endswith(".xml"):
+        with openDataSet(file_name) as ds:
+            return [ds.uuid] + [_file_fingerprint(f)
+                                for f in ds.toExternalFiles()]
+    return _file_fingerprint(file_name)
+
+
+def _get_dataset_uuids(input_files):
+    uuids = []
+    for file_name in input_files:
+        if file_name is not None and file_name.endswith(".xml"):
+            with openDataSet(file_name) as ds:
+                uuids.append(ds.uuid)
+    return uuids
+
+
+def _md5_file(file_name):
+    md5 = hashlib.md5()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def get_cache_key(name, version, input_files, options=None, report_id=None):
+    """
+    Checksum identifying a result computed by name (and tool and pbreports
+    version) from the input files and options, and displayed with the spec
+    of report_id if given.
+
+    :param input_files: paths, None entries are ignored
+    :param options: JSON-serializable dict
+    """
+    key = dict(name=name,
+               version=version,
+               pbreports_version=get_version(),
+               options=options or {},
+               inputs=[_input_fingerprint(f) for f in input_files
+                       if f is not None])
+    if report_id is not None:
+        try:
+            key["spec"] = _md5_file(get_spec_file(report_id))
+        except KeyError:
+            key["spec"] = None
+    return hashlib.md5(json.dumps(key, sort_keys=True)).hexdigest()
+
+
+def _move_into_place(tmp_path, cache_path):
+    """
+    Rename a fully written cache entry into place, so that concurrent tasks
+    never see a partial one.
+    """
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # another task got there first
+        if op.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif op.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _iter_plot_files(report_d):
+    """Yield (dict, key) for each file referenced by the report"""
+    for plot_group in report_d.get("plotGroups", []):
+        for key in Constants.PLOT_GROUP_FILES:
+            if plot_group.get(key):
+                yield plot_group, key
+        for plot in plot_group.get("plots", []):
+            for key in Constants.PLOT_FILES:
+                if plot.get(key):
+                    yield plot, key
+
+
+def _get_output_files(report_json, output_dir):
+    """
+    Paths of the files referenced by the report, relative to output_dir, or
+    None if any of them is outside output_dir.
+    """
+    with open(report_json) as f:
+        report_d = json.load(f)
+    file_names = set()
+    for d, key in _iter_plot_files(report_d):
+        file_name = op.relpath(op.join(output_dir, d[key]), output_dir)
+        if file_name.startswith(os.pardir):
+            log.warn("Not caching {r}, {f} is outside of {d}".format(
+                r=report_json, f=d[key], d=output_dir))
+            return None
+        file_names.add(file_name)
+    return sorted(file_names)
+
+
+def _write_report_cache(cache_path, report_json, output_dir, extra_outputs):
+    file_names = _get_output_files(report_json, output_dir)
+    if file_names is None:
+        return
+    tmp_dir = None
+    try:
+        if not op.isdir(op.dirname(cache_path)):
+            os.makedirs(op.dirname(cache_path))
+        tmp_dir = tempfile.mkdtemp(dir=op.dirname(cache_path))
+        files_dir = op.join(tmp_dir, Constants.FILES_DIR)
+        for file_name in file_names:
+            cached_file = op.join(files_dir, file_name)
+            if not op.isdir(op.dirname(cached_file)):
+                os.makedirs(op.dirname(cached_file))
+            shutil.copyfile(op.join(output_dir, file_name), cached_file)
+        for i, file_name in enumerate(extra_outputs):
+            shutil.copyfile(file_name, op.join(tmp_dir, str(i)))
+        shutil.copyfile(report_json, op.join(tmp_dir, Constants.REPORT_FILE))
+        meta = dict(output_dir=op.abspath(output_dir), files=file_names,
+                    nextra=len(extra_outputs))
+        with open(op.join(tmp_dir, Constants.META_FILE), "w") as f:
+            json.dump(meta, f)
+        _move_into_place(tmp_dir, cache_path)
+    except (IOError, OSError) as e:
+        log.warn("Unable to cache report in {d}: {e}".format(d=cache_path,
+                                                             e=e))
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _restore_report_cache(cache_path, report_json, output_dir,
+                          extra_outputs, input_files):
+    with open(op.join(cache_path, Constants.META_FILE)) as f:
+        meta = json.load(f)
+    if meta["nextra"] != len(extra_outputs):
+        return False
+    for file_name in meta["files"]:
+        output_file = op.join(output_dir, file_name)
+        if not op.isdir(op.dirname(output_file)):
+            os.makedirs(op.dirname(output_file))
+        shutil.copyfile(op.join(cache_path, Constants.FILES_DIR, file_name),
+                        output_file)
+    for i, file_name in enumerate(extra_outputs):
+        shutil.copyfile(op.join(cache_path, str(i)), file_name)
+    with open(op.join(cache_path, Constants.REPORT_FILE)) as f:
+        report_d = json.load(f)
+    # this is a new report of the current inputs
+    report_d["uuid"] = str(uuid.uuid4())
+    if report_d.get("dataset_uuids"):
+        uuids = set(_get_dataset_uuids(input_files))
+        report_d["dataset_uuids"] = [u for u in report_d["dataset_uuids"]
+                                     if u in uuids]
+    # absolute paths point into the output dir of the cached run
+    old_dir, new_dir = meta["output_dir"], op.abspath(output_dir)
+    for d, key in _iter_plot_files(report_d):
+        if op.isabs(d[key]):
+            d[key] = op.join(new_dir, op.relpath(d[key], old_dir))
+    with open(report_json, "w") as f:
+        json.dump(report_d, f, indent=4)
+    return True
+
+
+def run_cached_report(run_report, report_json, report_id, version,
+                      input_files, options=None, output_dir=None,
+                      extra_outputs=(), cache_dir=None):
+    """
+    Run a report, or restore its outputs from the report cache when enabled
+    (cache_dir, or PBREPORTS_REPORT_CACHE_DIR) and it has already been run
+    with the same inputs.
+
+    :param run_report: callable writing report_json (with its plots in
+    output_dir) and any extra_outputs, returning the exit code
+    :param output_dir: directory of the plot files, by default that of
+    report_json
+    :param extra_outputs: paths of other files written by run_report
+    :returns: exit code
+    """
+    cache_dir = _get_cache_dir(cache_dir)
+    if cache_dir is None:
+        return run_report()
+    if output_dir is None:
+        output_dir = op.dirname(op.abspath(report_json))
+    key = get_cache_key(report_id, version, input_files, options=options,
+                        report_id=report_id)
+    cache_path = op.join(cache_dir, Constants.REPORTS_DIR, key)
+    if op.exists(op.join(cache_path, Constants.META_FILE)):
+        try:
+            if _restore_report_cache(cache_path, report_json, output_dir,
+                                     extra_outputs, input_files):
+                log.info("Restored report {i} from {d}".format(
+                    i=report_id, d=cache_path))
+                return 0
+        except (IOError, OSError, ValueError) as e:
+            log.warn("Unable to restore report from {d}: {e}".format(
+                d=cache_path, e=e))
+    exit_code = run_report()
+    if exit_code == 0:
+        _write_report_cache(cache_path, report_json, output_dir,
+                            extra_outputs)
+    return exit_code
+
+
+def cached_result(name, compute, input_files, version, options=None,
+                  cache_dir=None):
+    """
+    Get the result of compute(), an intermediate result of a report (e.g.
+    its aggregated statistics) as a dict of numpy arrays, from the report
+    cache when enabled (cache_dir, or PBREPORTS_REPORT_CACHE_DIR), filling
+    it on first use.  Unlike whole reports these are not invalidated by the
+    report spec.
+
+    Results are saved as .npz files, loaded without unpickling, so arrays
+    of Python objects can't be cached.
+    """
+    cache_dir = _get_cache_dir(cache_dir)
+    if cache_dir is None:
+        return compute()
+    key = get_cache_key(name, version, input_files, options=options)
+    cache_file = op.join(cache_dir, Constants.RESULTS_DIR, key + ".npz")
+    if op.exists(cache_file):
+        log.debug("Loading cached {n} from {f}".format(n=name, f=cache_file))
+        try:
+            with np.load(cache_file, allow_pickle=False) as npz:
+                return {k: npz[k] for k in npz.files}
+        except (IOError, ValueError, zipfile.BadZipfile) as e:
+            log.warn("Unable to load {f}: {e}".format(f=cache_file, e=e))
+    result = compute()
+    if any(np.asarray(value).dtype.hasobject for value in result.itervalues()):
+        raise ValueError("Can't cache {n}, it has arrays of Python "
+                         "objects".format(n=name))
+    tmp_file = None
+    try:
+        if not op.isdir(op.dirname(cache_file)):
+            os.makedirs(op.dirname(cache_file))
+        fd, tmp_file = tempfile.mkstemp(dir=op.dirname(cache_file))
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **result)
+        _move_into_place(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        log.warn("Unable to cache {n} in {f}: {e}".format(n=name,
+                                                          f=cache_file, e=e))
+        if tmp_file is not None and op.exists(tmp_file):
+            os.remove(tmp_file)
+    return result
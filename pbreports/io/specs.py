@@ -1,43 +1,97 @@
 
 """
 Lightweight IO layer for accessing view metadata in report specs.
+
+Specs are located through SPEC_INDEX, a JSON mapping of report id to spec
+file name, so that only the specs a process actually uses get loaded.
+Regenerate it after adding a spec with::
+
+    python -m pbreports.io.specs
 """
 
+import logging
 import os.path as op
 import os
+import json
 
 from pbcommand.pb_io import load_report_spec_from_json
 
 SPEC_DIR = op.join(op.dirname(op.dirname(__file__)), "report", "specs")
+SPEC_INDEX = op.join(SPEC_DIR, "index.json")
 REGISTERED_SPECS = {}
+# report id -> spec file name, loaded from SPEC_INDEX on first use
+_SPEC_FILES = {}
+# (report id, plotgroup id, plot id) -> plot spec
+_PLOT_SPECS = {}
+
+
+def build_spec_index(spec_dir=SPEC_DIR):
+    """
+    Map each report id to the name of its spec file in spec_dir.
+    """
+    index = {}
+    for file_name in sorted(os.listdir(spec_dir)):
+        if file_name == op.basename(SPEC_INDEX):
+            continue
+        with open(op.join(spec_dir, file_name)) as f:
+            index[json.load(f)["id"]] = file_name
+    return index
+
+
+def write_spec_index(file_name=SPEC_INDEX, spec_dir=SPEC_DIR):
+    with open(file_name, "w") as f:
+        json.dump(build_spec_index(spec_dir), f, indent=4, sort_keys=True,
+                  separators=(",", ": "))
+        f.write("\n")
+
+
+def get_spec_file(report_id):
+    global _SPEC_FILES
+    if not _SPEC_FILES:
+        with open(SPEC_INDEX) as f:
+            _SPEC_FILES = json.load(f)
+    if not report_id in _SPEC_FILES:
+        # no module-level log: report modules star-import this one
+        msg = "Report spec {i} is missing from {f}, rescanning {d}".format(
+            i=report_id, f=SPEC_INDEX, d=SPEC_DIR)
+        logging.getLogger(__name__).warn(msg)
+        _SPEC_FILES = build_spec_index()
+    return op.join(SPEC_DIR, _SPEC_FILES[report_id])
 
 
 def load_spec(report_id):
     global REGISTERED_SPECS
     if not report_id in REGISTERED_SPECS:
-        for file_name in os.listdir(SPEC_DIR):
-            full_file_name = op.join(SPEC_DIR, file_name)
-            try:
-                spec = load_report_spec_from_json(full_file_name)
-            except ValueError as err:
-                import traceback
-                msg = 'Failed to load report spec from {!r}:\n{}'.format(
-                    op.abspath(full_file_name), traceback.format_exc())
-                raise ValueError(msg)
-            REGISTERED_SPECS[spec.id] = spec
+        full_file_name = get_spec_file(report_id)
+        try:
+            spec = load_report_spec_from_json(full_file_name)
+        except ValueError as err:
+            import traceback
+            msg = 'Failed to load report spec from {!r}:\n{}'.format(
+                op.abspath(full_file_name), traceback.format_exc())
+            raise ValueError(msg)
+        REGISTERED_SPECS[spec.id] = spec
     return REGISTERED_SPECS[report_id]
 
 
+def _get_plot_spec(spec, plotgroup_id, plot_id):
+    key = (spec.id, plotgroup_id, plot_id)
+    if not key in _PLOT_SPECS:
+        _PLOT_SPECS[key] = spec.get_plotgroup_spec(
+            plotgroup_id).get_plot_spec(plot_id)
+    return _PLOT_SPECS[key]
+
+
 def get_plot_xlabel(spec, plotgroup_id, plot_id):
-    return spec.get_plotgroup_spec(plotgroup_id).get_plot_spec(plot_id).xlabel
+    return _get_plot_spec(spec, plotgroup_id, plot_id).xlabel
 
 
 def get_plot_ylabel(spec, plotgroup_id, plot_id):
-    return spec.get_plotgroup_spec(plotgroup_id).get_plot_spec(plot_id).ylabel
+    return _get_plot_spec(spec, plotgroup_id, plot_id).ylabel
 
 
 def get_plot_title(spec, plotgroup_id, plot_id):
-    return spec.get_plotgroup_spec(plotgroup_id).get_plot_spec(plot_id).title
+    return _get_plot_spec(spec, plotgroup_id, plot_id).title
 
 
 def get_plotgroup_title(spec, plotgroup_id):
@@ -45,4 +99,8 @@ def get_plotgroup_title(spec, plotgroup_id):
 
 
 def get_plot_caption(spec, plotgroup_id, plot_id):
-    return spec.get_plotgroup_spec(plotgroup_id).get_plot_spec(plot_id).caption
+    return _get_plot_spec(spec, plotgroup_id, plot_id).caption
+
+
+if __name__ == "__main__":
+    write_spec_index()
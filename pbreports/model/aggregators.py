@@ -2,9 +2,32 @@ import math
 import abc
 import logging
 
+import numpy as np
+
 log = logging.getLogger(__name__)
 
 
+def bin_indices(values, dx):
+    """
+    Vectorized version of int(math.ceil(v / dx)) used by the histogram
+    aggregators. When both the values and dx are integers the scalar path
+    does (Python 2) integer division, so that is preserved here.
+
+    :param values: np.array of values
+    :param dx: bin width
+    :returns: np.array of int
+    """
+    values = np.asarray(values)
+    if isinstance(dx, (int, long)) and np.issubdtype(values.dtype, np.integer):
+        return values // dx
+    return np.ceil(values / float(dx)).astype(np.int64)
+
+
+def _incompatible(a, b):
+    _d = dict(s=type(a), o=type(b))
+    return TypeError("Incompatible types. {s} {o}".format(**_d))
+
+
 class BaseAggregator(object):
     __metaclass__ = abc.ABCMeta
 
@@ -12,6 +35,31 @@ class BaseAggregator(object):
     def apply(self, record):
         pass
 
+    @abc.abstractmethod
+    def apply_array(self, values):
+        """
+        Apply a numpy array of record_field values at once. This must give
+        the same result as calling apply on each of the records.
+        """
+        pass
+
+    def apply_batch(self, records):
+        """
+        Apply a block of records at once. records is a numpy record array
+        (or anything indexable by field name returning a numpy array).
+        """
+        self.apply_array(records[self.record_field])
+
+    @abc.abstractmethod
+    def merge(self, other):
+        """
+        Fold the state of another aggregator of the same type (e.g., one
+        computed on a different chunk of the data) into this one.
+
+        :returns: self
+        """
+        pass
+
 
 class BaseAttribute(object):
     # This class is to be used for aggregators that
@@ -36,6 +84,15 @@ class CountAggregator(BaseAggregatorAttribute):
     def apply(self, record):
         self.total += 1
 
+    def apply_array(self, values):
+        self.total += len(values)
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        self.total += other.total
+        return self
+
     def __repr__(self):
         _d = dict(k=self.__class__.__name__, t=self.total, f=self.record_field)
         return "<{k} {f} total={t} >".format(**_d)
@@ -53,12 +110,26 @@ class MinAggregator(BaseAggregatorAttribute):
 
     def apply(self, record):
         v = getattr(record, self.record_field)
+        self._update(v)
+
+    def _update(self, v):
         if self.value is None:
             self.value = v
 
         if v < self.value:
             self.value = v
 
+    def apply_array(self, values):
+        if len(values) > 0:
+            self._update(np.min(values).item())
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        if other.value is not None:
+            self._update(other.value)
+        return self
+
     def __repr__(self):
         _d = dict(k=self.__class__.__name__, t=self.value, f=self.record_field)
         return "<{k} {f} min={t} >".format(**_d)
@@ -76,12 +147,26 @@ class MaxAggregator(BaseAggregatorAttribute):
 
     def apply(self, record):
         v = getattr(record, self.record_field)
+        self._update(v)
+
+    def _update(self, v):
         if self.value is None:
             self.value = v
 
         if v > self.value:
             self.value = v
 
+    def apply_array(self, values):
+        if len(values) > 0:
+            self._update(np.max(values).item())
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        if other.value is not None:
+            self._update(other.value)
+        return self
+
     def __repr__(self):
         _d = dict(k=self.__class__.__name__, t=self.value, f=self.record_field)
         return "<{k} {f} max={t}>".format(**_d)
@@ -100,6 +185,15 @@ class SumAggregator(BaseAggregatorAttribute):
     def apply(self, record):
         self.total += getattr(record, self.record_field)
 
+    def apply_array(self, values):
+        self.total += np.sum(values).item()
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        self.total += other.total
+        return self
+
     def __repr__(self):
         _d = dict(k=self.__class__.__name__,
                   t=self.total,
@@ -123,6 +217,17 @@ class MeanAggregator(BaseAggregatorAttribute):
         v = getattr(record, self.record_field)
         self.total += v
 
+    def apply_array(self, values):
+        self.nvalues += len(values)
+        self.total += np.sum(values).item()
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        self.nvalues += other.nvalues
+        self.total += other.total
+        return self
+
     @property
     def mean(self):
         if self.nvalues == 0:
@@ -148,11 +253,18 @@ class HistogramAggregator(BaseAggregator):
         self.min_value = min_value
         # bin width
         self.dx = dx
-        self.bins = [0 for _ in xrange(nbins)]
+        # the allocated array may be larger than nbins; the extra capacity
+        # is grown geometrically so adding bins is amortized O(1)
+        self._bins = np.zeros(nbins, dtype=np.int64)
+        self._nbins = nbins
+
+    @property
+    def bins(self):
+        return self._bins[:self._nbins]
 
     @property
     def nbins(self):
-        return len(self.bins)
+        return self._nbins
 
     @property
     def max_value(self):
@@ -172,13 +284,16 @@ class HistogramAggregator(BaseAggregator):
         """
         return [self.dx * i for i in xrange(self.nbins)]
 
-    def apply(self, record):
-        """Adaptively compute the histogram. If there are not enough bins,
-        more will be added."""
-        v = getattr(record, self.record_field)
-        # If value is larger than the current list of bins
-        n = int(math.ceil(v / self.dx))
+    def _resize(self, nbins):
+        if nbins > self._bins.size:
+            bins = np.zeros(max(nbins, 2 * self._bins.size),
+                            dtype=self._bins.dtype)
+            bins[:self._nbins] = self.bins
+            self._bins = bins
+        self._nbins = max(nbins, self._nbins)
 
+    def _grow(self, v):
+        """Add bins, if necessary, so that the value v can be stored"""
         max_v = (self.nbins - 1) * self.dx
 
         if v >= max_v:
@@ -187,13 +302,46 @@ class HistogramAggregator(BaseAggregator):
             i = int(math.ceil(n_new_bins)) + 2
             # add more bins
             #log.info(("Adding more bins ", delta, n_new_bins, i))
-            for _ in xrange(i):
-                self.bins.append(0)
+            self._resize(self.nbins + i)
+
+    def apply(self, record):
+        """Adaptively compute the histogram. If there are not enough bins,
+        more will be added."""
+        v = getattr(record, self.record_field)
+        # If value is larger than the current list of bins
+        n = int(math.ceil(v / self.dx))
+
+        self._grow(v)
 
-        #log.info((v, n, max_v ))
         #log.info("{k} {f} Adding value {v} index={n} to nbins {b} dx {x}".format(v=v, b=self.nbins, x=self.dx, n=n, f=self.record_field, k=self.__class__.__name__))
 
-        self.bins[n] += 1
+        self._bins[n] += 1
+
+    def apply_array(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+        # Only values that exceed every value before them can trigger
+        # growth, so replaying those gives the same bins as calling apply()
+        # on each record in order.
+        running_max = np.maximum.accumulate(values)
+        is_new_max = np.ones(len(values), dtype=bool)
+        is_new_max[1:] = values[1:] > running_max[:-1]
+        for v in values[is_new_max].tolist():
+            self._grow(v)
+
+        counts = np.bincount(bin_indices(values, self.dx))
+        self._bins[:counts.size] += counts
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            raise _incompatible(self, other)
+        if (self.dx, self.min_value) != (other.dx, other.min_value):
+            raise ValueError("Unable to merge histograms with different "
+                             "binning {a} {b}".format(a=self, b=other))
+        self._resize(other.nbins)
+        self._bins[:other.nbins] += other.bins
+        return self
 
     def __repr__(self):
         _d = dict(k=self.__class__.__name__,
@@ -201,5 +349,5 @@ class HistogramAggregator(BaseAggregator):
                   n=self.min_value,
                   x=self.max_value,
                   dx=self.dx,
-                  nbins=len(self.bins))
+                  nbins=self.nbins)
         return "<{k} {f} nbins={nbins} dx={dx} min={n} max={x} >".format(**_d)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import os
 import logging
+import multiprocessing
 
 import numpy as np
 import matplotlib
@@ -233,30 +234,91 @@ def apply_histogram_data(ax, data, bins, axis_labels=('', ''),
     data_file - pass in a file name to which to write tab-delimited chart data
         (for debugging purposes)
     """
-    edgeColor = '#ffffff'
-
-    if not showEdges:
-        edgeColor = barcolor
-
     if len(data) > 0:
         if not isinstance(data, np.ndarray):
             data = np.array(data)
-        dtype = np.result_type(data)
-        if "int" in dtype.type.__name__ and len(np.unique(data)) > 1:
-            # FIXME still not working properly (see for example the function
-            # make_readlength_histogram in reports/barcode.py)
-            d = min(np.diff(np.unique(data)))
-            left_of_first_bin = min(data) - float(d) / 2
-            right_of_last_bin = max(data) + float(d) / 2
-            ax.hist(data, np.arange(left_of_first_bin, right_of_last_bin + d, d),
-                    ec=edgeColor, fc=barcolor, log=log_scale, weights=weights)
-        else:
-            ax.hist(data, bins=bins, ec=edgeColor, fc=barcolor, log=log_scale,
-                    weights=weights)
+        counts, edges = np.histogram(data, bins=_get_histogram_bins(data, bins),
+                                     weights=weights)
+        _apply_histogram_bars(ax, counts, edges, barcolor, showEdges,
+                              log_scale)
     else:
         # Perhaps this should be an exception.
         log.warn("Empty dataset. Unable to generate histogram.")
 
+    _apply_histogram_labels(ax, axis_labels, xlim, ylim, title)
+
+    try:
+        if data_file is not None:
+            dump = ChartDataDump(data_file)
+            dump.addData("data", data)
+            dump.write()
+    except Exception as err:
+        log.error('Unable to dump chart data to {f}: {e}'.format(
+            f=data_file, e=err))
+
+
+def apply_histogram_counts(ax, counts, edges, axis_labels=('', ''),
+                           barcolor='#226F96',
+                           xlim=None, ylim=None,
+                           showEdges=True, log_scale=False, title=None):
+    """
+    Apply pre-binned histogram data to axes, e.g. counts accumulated while
+    streaming through the data instead of the data itself.
+        The default barcolor is steel blue
+
+    Arguments:\n
+    axes - required param, see get_fig_axes()\n
+    counts - number of items (or sum of weights) in each bin\n
+    edges - bin edges, one more than the counts (as from np.histogram)\n
+    """
+    if len(counts) > 0:
+        _apply_histogram_bars(ax, np.asarray(counts), np.asarray(edges),
+                              barcolor, showEdges, log_scale)
+    else:
+        log.warn("Empty dataset. Unable to generate histogram.")
+
+    _apply_histogram_labels(ax, axis_labels, xlim, ylim, title)
+
+
+def get_histogram_edges(data, bins):
+    """
+    The bin edges apply_histogram_data uses for data.  They only depend on
+    the type and the distinct values of data, so np.unique(data) gives the
+    same edges as the full data.
+    """
+    return np.histogram(data, bins=_get_histogram_bins(data, bins))[1]
+
+
+def _get_histogram_bins(data, bins):
+    """
+    The bins apply_histogram_data uses for data: integer data with more than
+    one value gets one bin per multiple of the smallest distance between
+    values, centered on the values.
+    """
+    dtype = np.result_type(data)
+    if "int" in dtype.type.__name__ and len(np.unique(data)) > 1:
+        # FIXME still not working properly (see for example the function
+        # make_readlength_histogram in reports/barcode.py)
+        d = min(np.diff(np.unique(data)))
+        left_of_first_bin = min(data) - float(d) / 2
+        right_of_last_bin = max(data) + float(d) / 2
+        return np.arange(left_of_first_bin, right_of_last_bin + d, d)
+    return bins
+
+
+def _apply_histogram_bars(ax, counts, edges, barcolor, showEdges, log_scale):
+    # the bars ax.hist would draw for these counts
+    edgeColor = '#ffffff'
+
+    if not showEdges:
+        edgeColor = barcolor
+
+    widths = np.diff(edges)
+    ax.bar(edges[:-1] + widths / 2.0, counts, widths, align='center',
+           ec=edgeColor, fc=barcolor, log=log_scale)
+
+
+def _apply_histogram_labels(ax, axis_labels, xlim, ylim, title):
     ax.set_xlabel(axis_labels[0])
     ax.set_ylabel(axis_labels[1])
 
@@ -268,15 +330,6 @@ def apply_histogram_data(ax, data, bins, axis_labels=('', ''),
     if title is not None:
         ax.set_title(title)
 
-    try:
-        if data_file is not None:
-            dump = ChartDataDump(data_file)
-            dump.addData("data", data)
-            dump.write()
-    except Exception as err:
-        log.error('Unable to dump chart data to {f}: {e}'.format(
-            f=data_file, e=err))
-
 
 def set_tick_label_font_size(ax, minor, major):
     """Convenience function for changing font size of major and minor ticks"""
@@ -313,14 +366,18 @@ def save_figure_with_thumbnail(figure, filename, dpi=DEFAULT_DPI, bbox_inches=No
 
     returns a tuple of (basename of image, basename of thumbnail)
     """
-    parts = os.path.splitext(filename)
-    thumb = '{b}_thumb{e}'.format(b=parts[0], e=parts[1])
+    thumb = _get_thumbnail_file_name(filename)
     _save_figures(
         figure, [(filename, dpi), (thumb, DEFAULT_THUMB_DPI)], bbox_inches=bbox_inches)
     plt.close(figure)
     return filename, thumb
 
 
+def _get_thumbnail_file_name(filename):
+    parts = os.path.splitext(filename)
+    return '{b}_thumb{e}'.format(b=parts[0], e=parts[1])
+
+
 def _save_figures(figure, file_tuples, bbox_inches=None):
     """
     Save a single matplotlib figure to one or more image files.
@@ -333,6 +390,92 @@ def _save_figures(figure, file_tuples, bbox_inches=None):
         figure.savefig(fname, bbox_inches=bbox_inches, dpi=dpi)
 
 
+class LineFillFigure(object):
+
+    """
+    A styled figure with a single LineFill that is redrawn for each data set,
+    so that many plots of the same kind share one figure and axes instead of
+    building and styling a new figure per plot.
+    """
+
+    def __init__(self, line_fill, axis_labels=('', ''), dims=(8, 6)):
+        """
+        line_fill - LineFill with the style to draw; its data is not used
+        """
+        self.fig, self.ax = get_fig_axes_lpr(dims)
+        self._style = line_fill
+        self._line, = self.ax.plot([], [], line_fill.style,
+                                   color=line_fill.color,
+                                   linewidth=line_fill.width)
+        self.ax.set_xlabel(axis_labels[0])
+        self.ax.set_ylabel(axis_labels[1])
+        self._fill = None
+
+    def draw(self, line_fill):
+        """
+        Replace the plotted data with the data of line_fill, and rescale the
+        axes as apply_line_data + apply_line_fill_data would on new axes.
+        """
+        self._line.set_data(line_fill.xData, line_fill.yData)
+        if self._fill is not None:
+            self._fill.remove()
+        # a fill_between polygon can't be updated in place
+        self._fill = self.ax.fill_between(
+            line_fill.xData, line_fill.yDataMin, line_fill.yDataMax,
+            where=None, alpha=self._style.alpha,
+            edgecolor=self._style.edgecolor, facecolor=self._style.facecolor)
+        # relim only accounts for the line, not the fill collection
+        self.ax.relim()
+        for y in (line_fill.yDataMin, line_fill.yDataMax):
+            self.ax.update_datalim(np.column_stack([line_fill.xData, y]))
+        self.ax.autoscale_view()
+
+
+def _save_line_fill_figures(args):
+    style, axis_labels, dpi, figures = args
+    line_fill_figure = LineFillFigure(style, axis_labels)
+    try:
+        for line_fill, filename, with_thumbnail in figures:
+            line_fill_figure.draw(line_fill)
+            file_tuples = [(filename, dpi)]
+            if with_thumbnail:
+                file_tuples.append((_get_thumbnail_file_name(filename),
+                                    DEFAULT_THUMB_DPI))
+            _save_figures(line_fill_figure.fig, file_tuples)
+    finally:
+        plt.close(line_fill_figure.fig)
+
+
+def save_line_fill_figures(line_fills, filenames, axis_labels=('', ''),
+                           dpi=DEFAULT_DPI, nproc=1):
+    """
+    Save one line + fill plot per LineFill (all styled like the first one) to
+    the matching file name, plus a thumbnail of the first plot.  The plots
+    are drawn on a single reused LineFillFigure, or with nproc > 1 on one per
+    worker process, each rendering a batch of the plots.
+
+    returns the thumbnail file name, or None if there are no plots
+    """
+    if len(line_fills) == 0:
+        return None
+    figures = [(line_fill, filename, i == 0) for i, (line_fill, filename)
+               in enumerate(zip(line_fills, filenames))]
+    nproc = max(1, min(nproc, len(figures)))
+    batches = [figures[i::nproc] for i in range(nproc)]
+    args = [(line_fills[0], axis_labels, dpi, batch) for batch in batches]
+    if nproc > 1:
+        pool = multiprocessing.Pool(nproc)
+        try:
+            pool.map(_save_line_fill_figures, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for batch_args in args:
+            _save_line_fill_figures(batch_args)
+    return _get_thumbnail_file_name(filenames[0])
+
+
 class ChartDataDump(object):
 
     """For debugging. Writes the data backing a chart to a tab file."""
@@ -415,12 +558,40 @@ def make_histogram(datum, axis_labels, nbins, barcolor):
     return fig, ax
 
 
+def make_histogram_from_counts(counts, edges, axis_labels, barcolor):
+    """Create a fig, ax instance and generate a histogram from bin counts.
+
+    :param counts: (np.array) number of items in each bin
+    :param edges: (np.array) bin edges, see np.histogram
+    :param axis_labels: (tuple of str) (axis label, y axis label)
+    :return: matplotlib fig, ax
+    """
+    fig, ax = get_fig_axes_lpr()
+    apply_histogram_counts(ax, counts, edges, axis_labels=axis_labels,
+                           barcolor=barcolor)
+    return fig, ax
+
+
 def make_histogram_with_cdf(datum, axis_labels, nbins, barcolor):
     """
     Make a histogram png file with cdf.
     """
     fig, ax = make_histogram(datum, axis_labels, nbins, barcolor)
     bins, bin_edges = np.histogram(datum, bins=nbins)
+    _apply_cdf(ax, bins, bin_edges, axis_labels)
+    return fig, ax
+
+
+def make_histogram_with_cdf_from_counts(counts, edges, axis_labels, barcolor):
+    """
+    Make a histogram png file with cdf from bin counts.
+    """
+    fig, ax = make_histogram_from_counts(counts, edges, axis_labels, barcolor)
+    _apply_cdf(ax, np.asarray(counts), np.asarray(edges), axis_labels)
+    return fig, ax
+
+
+def _apply_cdf(ax, bins, bin_edges, axis_labels):
     bin_edges = np.array(bin_edges)
     rax = ax.twinx()
     log.debug("Min edges {e} bins {b}".format(e=len(bin_edges), b=len(bins)))
@@ -433,7 +604,6 @@ def make_histogram_with_cdf(datum, axis_labels, nbins, barcolor):
     rax.set_ylim(ymin=0)
     if len(axis_labels) == 3:
         rax.set_ylabel(axis_labels[2])
-    return fig, ax
 
 
 def create_plot_impl(_make_plot_func, plot_id, axis_labels, nbins,
@@ -478,21 +648,51 @@ def make_2d_histogram(x, y, n_bins, xlabel, ylabel, cbar_label,
     :param cbar_label: Color bar label
     :returns: matplotlib figure
     """
+    counts, xedges, yedges = np.histogram2d(x, y, bins=n_bins)
+    ymax = max(y) if len(y) > 0 else 1
+    return _plot_2d_histogram(counts, xedges, yedges, ymax, xlabel, ylabel,
+                              cbar_label, figsize)
+
+
+def make_2d_histogram_from_counts(counts, xedges, yedges, xlabel, ylabel,
+                                  cbar_label, figsize=(12, 4), ymax=None):
+    """
+    Generate a rainbow-colored 2D histogram from bin counts.
+
+    :param counts: 2D array of counts, indexed by (x bin, y bin)
+    :param xedges: X-axis bin edges, see np.histogram2d
+    :param yedges: Y-axis bin edges
+    :param xlabel: X-axis label
+    :param ylabel: Y-axis label
+    :param cbar_label: Color bar label
+    :param ymax: Largest Y value, defaults to the top of the highest bin
+        with counts
+    :returns: matplotlib figure
+    """
+    counts = np.asarray(counts)
+    if ymax is None:
+        filled = np.flatnonzero(counts.sum(axis=0) > 0)
+        ymax = yedges[filled[-1] + 1] if len(filled) > 0 else 1
+    return _plot_2d_histogram(counts, np.asarray(xedges), np.asarray(yedges),
+                              ymax, xlabel, ylabel, cbar_label, figsize)
+
+
+def _plot_2d_histogram(counts, xedges, yedges, ymax, xlabel, ylabel,
+                       cbar_label, figsize):
+    n_x_bins = len(xedges) - 1
     cmap = plt.cm.Spectral_r
     cmap.set_under(color=(0.875, 0.875, 0.875))
     fig = plt.figure(figsize=figsize)
     ax = fig.add_subplot(111)
     ax.axesPatch.set_facecolor((0.875, 0.875, 0.875))
     ax.grid(color="white", linewidth=0.5, linestyle='-')
-    counts, xedges, yedges, im = ax.hist2d(x, y, cmap=cmap, vmin=1,
-                                           bins=n_bins)
+    im = ax.pcolormesh(xedges, yedges, counts.T, cmap=cmap, vmin=1)
     x_margin = 5
-    if n_bins[0] < 20:
+    if n_x_bins < 20:
         x_margin = 1
-    elif n_bins[0] < 50:
+    elif n_x_bins < 50:
         x_margin = 2
-    ymax = max(y) if len(y) > 0 else 1
-    ax.set_xlim(-x_margin, n_bins[0] + x_margin)
+    ax.set_xlim(-x_margin, n_x_bins + x_margin)
     ax.set_ylim(-(int(ymax * 0.05)), ymax + int(ymax * (0.05)))
     ax.set_ylabel(ylabel)
     ax.set_xlabel(xlabel)
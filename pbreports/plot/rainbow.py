@@ -19,6 +19,8 @@ from pbcore.io import openDataFile, CmpH5Reader
 from pbcommand.models.report import Report, PlotGroup, Plot
 
 from pbreports.plot.helper import save_figure_with_thumbnail, get_fig_axes_lpr, DEFAULT_DPI
+from pbreports.io.align import (AlignmentSetCollector, PbiConsumer,
+                                alignment_file_names)
 
 log = logging.getLogger(__name__)
 
@@ -76,34 +78,55 @@ def _read_in_file(in_fn, reference=None):
     return data
 
 
+class RainbowConsumer(PbiConsumer):
+    """
+    Collects the length, concordance and MapQV of each alignment (to
+    reference, if given) for the rainbow plot.
+    """
+
+    def __init__(self, reference=None):
+        self.reference = reference
+        self._chunks = []
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def consume(self, bam_file_name, pbi):
+        if len(pbi) == 0:
+            return
+        sel = np.full(len(pbi), True, dtype=bool)
+        if self.reference is not None:
+            ref_id = None
+            for id_, name in pbi.reference_names.iteritems():
+                if name == self.reference:
+                    ref_id = id_
+                    break
+            sel = pbi.tId == ref_id
+        self._chunks.append(np.column_stack([(pbi.aEnd - pbi.aStart)[sel],
+                                             pbi.identity[sel],
+                                             pbi.mapQV[sel]]))
+
+    def add_array(self, data):
+        """Add the rows of a 2D array as returned by to_array"""
+        if len(data) > 0:
+            self._chunks.append(data)
+
+    def to_array(self):
+        """A 2D array of lengths, percent concordance and MapQV"""
+        if len(self._chunks) == 0:
+            return np.zeros((0, 3))
+        return np.concatenate(self._chunks).astype(float)
+
+
 def _read_in_indexed_alignmentset(in_fn, reference=None):
     """
     Extract data from the .pbi files in an AlignmentSet using numpy array
     operations.
     """
-    lengths, percent_accs, map_qvs = [], [], []
-    with openDataFile(in_fn) as ds:
-        for bam in ds.resourceReaders():
-            if len(bam) == 0:
-                continue
-            identities = bam.identity
-            ref_name_to_id = {r.Name: r.ID for r in bam.referenceInfoTable}
-            sel = np.full(len(identities), True, dtype=bool)
-            bam_lengths = bam.pbi.aEnd - bam.pbi.aStart
-            if reference is not None:
-                ref_id = None
-                # FIXME there must be a cleaner way to do this...
-                for ref_info in bam.referenceInfoTable:
-                    if ref_info.Name == reference:
-                        ref_id = ref_info.ID
-                        break
-                sel = bam.pbi.tId == ref_id
-            lengths.extend(bam_lengths[sel])
-            percent_accs.extend(identities[sel])
-            map_qvs.extend(bam.pbi.mapQV[sel])
-    data = np.array([lengths, percent_accs, map_qvs])
-    data = data.transpose()
-    return data
+    collector = AlignmentSetCollector(alignment_file_names(in_fn))
+    rainbow = collector.register(RainbowConsumer(reference))
+    collector.run()
+    return rainbow.to_array()
 
 
 def _make_plot(data, png_fn, bounds=None, dpi=DEFAULT_DPI, nolegend=False,
@@ -197,3 +220,12 @@ def make_rainbow_plot(in_fn, png_name, reference=None,
     _make_plot(data, png_name, x_label=x_label)
     t2 = time.time()
     log.info("Plot generated in {s:.2f} sec".format(s=t2 - t1))
+
+
+def make_rainbow_plot_from_consumer(rainbow, png_name,
+                                    x_label="Subread Length (bp)"):
+    """
+    Plot the data gathered by a RainbowConsumer in an AlignmentSetCollector
+    pass shared with other reports.
+    """
+    _make_plot(rainbow.to_array(), png_name, x_label=x_label)
@@ -39,33 +39,39 @@ spec = load_spec(Constants.R_ID)
 def create_table(d, barcode):
     """Long Amplicon Analysis results table"""
 
-    columns = []
+    column_ids = []
 
     if barcode:
-        columns.append(Column(Constants.C_BARCODE))
+        column_ids.append(Constants.C_BARCODE)
 
-    columns.append(Column(Constants.C_CLUSTER))
-    columns.append(Column(Constants.C_PHASE))
-    columns.append(Column(Constants.C_LENGTH))
-    columns.append(Column(Constants.C_ACCURACY))
-    columns.append(Column(Constants.C_COVERAGE))
+    column_ids.append(Constants.C_CLUSTER)
+    column_ids.append(Constants.C_PHASE)
+    column_ids.append(Constants.C_LENGTH)
+    column_ids.append(Constants.C_ACCURACY)
+    column_ids.append(Constants.C_COVERAGE)
+
+    # one stable sort by sequence name, then take each column in that order
+    order = np.argsort(d.fastaname, kind="mergesort")
+    columns = [Column(column_id, values=d[column_id][order].tolist())
+               for column_id in column_ids]
 
     t = Table(Constants.T_ID,
               columns=columns)
 
-    for fastaname in sorted(d.fastaname):
-        row = d[d.fastaname == fastaname]
-        for column in columns:
-            # if column.id == "predictedaccuracy":
-            #    accuracy = round(100 * row[column.id][0], 2)
-            #    t.add_data_by_column_id(column.id, accuracy)
-            # else:
-            t.add_data_by_column_id(column.id, row[column.id][0])
-
     log.info(str(t))
     return t
 
 
+def _to_filter_mask(d):
+    """Mask of the sequences that are neither noise nor chimeras"""
+    mask = np.ones(len(d), dtype=bool)
+    for name in ("noisesequence", "ischimera"):
+        # XXX older summaries may lack these columns
+        if name in d.dtype.names:
+            mask &= (d[name] == False)
+    return mask
+
+
 def run_to_report(summary_file):
     log.info("Generating report v{v} from file: {f}".format(f=summary_file,
                                                             v=__version__))
@@ -78,12 +84,7 @@ def run_to_report(summary_file):
         barcode = True
 
     # Filter out noise and chimera sequences
-    try:
-        s = s[s.noisesequence == False]
-        s = s[s.ischimera == False]
-    except AttributeError:
-        # XXX not yet implemented
-        pass
+    s = s[_to_filter_mask(s)]
 
     # Convert the data to a table and the report
     table = create_table(s, barcode)
@@ -13,13 +13,19 @@ import logging
 import os.path as op
 import sys
 
+import numpy as np
+
 from pbcommand.cli import pbparser_runner
 from pbcommand.models.report import Report, Table, Column, Attribute, Plot, PlotGroup
 from pbcommand.models import DataStore, FileTypes, get_pbparser
 from pbcommand.utils import setup_log
 from pbcore.io import openDataSet, BarcodeSet, SubreadSet
 
-from pbreports.plot.helper import make_histogram, make_2d_histogram, get_blue, get_fig_axes_lpr, save_figure_with_thumbnail, DEFAULT_DPI, DEFAULT_THUMB_DPI
+from pbreports.plot.helper import make_histogram, get_blue, get_fig_axes_lpr, save_figure_with_thumbnail, DEFAULT_DPI, DEFAULT_THUMB_DPI
+from pbreports.plot.helper import (make_histogram_from_counts,
+                                   make_2d_histogram_from_counts,
+                                   get_histogram_edges)
+from pbreports.io.report_cache import run_cached_report
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -71,6 +77,9 @@ class Constants(object):
     P_HIST2D_BQ = "binned_bcqual"
     BQ_BINS = 50
     RL_BINS = 50
+    # per-group histograms merge bins beyond this, values below it are
+    # counted exactly
+    MAX_GROUP_BINS = 1024
 
     SHOW_COLUMNS = [
         C_BIOSAMPLE,
@@ -135,21 +144,52 @@ def _to_plot(fig, plot_id, base_dir):
     return Plot(plot_id, img_name, thumbnail=op.basename(thumb_name))
 
 
+def _get_group_hist2d(hists, n_bins):
+    """
+    Compute the histogram np.histogram2d would give for the (rank, value)
+    pairs of the values of each group, ranked 1..n, from the ValueHistogram
+    of each group: each one is binned separately on the common value bins.
+    The result is exact while the groups' histograms count exact values.
+
+    :returns: tuple of (counts, rank edges, value edges, largest value)
+    """
+    nonempty = [hist for hist in hists if hist.n > 0]
+    ranks = np.array([i for i, hist in enumerate(hists, start=1)
+                      if hist.n > 0], dtype=int)
+    if len(nonempty) == 0:
+        lo, hi, ymax = 0, 1, 1
+    else:
+        lo = min(hist.min_value for hist in nonempty)
+        hi = ymax = max(hist.max_value for hist in nonempty)
+    xedges = np.histogram(ranks, bins=max(len(hists), 1))[1]
+    yedges = np.histogram([], bins=n_bins, range=(lo, hi))[1]
+    counts = np.zeros((len(xedges) - 1, n_bins))
+    # the last bin is closed on the right
+    xbins = np.minimum(np.searchsorted(xedges, ranks, side="right") - 1,
+                       len(xedges) - 2)
+    for xbin, hist in zip(xbins, nonempty):
+        values, weights = hist.get_values()
+        counts[xbin] += np.histogram(values, bins=yedges, weights=weights)[0]
+    return counts, xedges, yedges, ymax
+
+
+def _make_group_hist2d(hists, n_bins, ylabel):
+    counts, xedges, yedges, ymax = _get_group_hist2d(hists, n_bins)
+    return make_2d_histogram_from_counts(
+        counts, xedges, yedges,
+        xlabel="Barcode Rank Order By Read Count",
+        ylabel=ylabel,
+        cbar_label="Read Count",
+        ymax=ymax)
+
+
 def make_readlength_hist2d(bc_groups, base_dir):
     """
     Create 2D histogram of read lengths per barcoded sample.
     """
     log.info("Creating 2D histogram of read lengths")
-    x, y = [], []
-    for i, group in enumerate(bc_groups, start=1):
-        x.extend([i] * group.n_reads)
-        y.extend(group.readlengths)
-    x_bins = max(len(bc_groups), 1)
-    fig, ax = make_2d_histogram(x, y,
-                                n_bins=[x_bins, Constants.RL_BINS],
-                                xlabel="Barcode Rank Order By Read Count",
-                                ylabel="Read Length",
-                                cbar_label="Read Count")
+    hists = [group.readlength_hist for group in bc_groups]
+    fig, ax = _make_group_hist2d(hists, Constants.RL_BINS, "Read Length")
     return _to_plot(fig, Constants.P_HIST2D_RL, base_dir)
 
 
@@ -158,16 +198,9 @@ def make_bcqual_hist2d(bc_groups, base_dir):
     Create 2D histogram of barcode quality scores per barcoded sample.
     """
     log.info("Creating 2D histogram of barcode quality scores")
-    x, y = [], []
-    for i, group in enumerate(bc_groups, start=1):
-        x.extend([i] * group.n_subreads)
-        y.extend(group.bqs)
-    x_bins = max(1, len(bc_groups))
-    fig, ax = make_2d_histogram(x, y,
-                                n_bins=[x_bins, Constants.BQ_BINS],
-                                xlabel="Barcode Rank Order By Read Count",
-                                ylabel="Read Barcode Quality Score",
-                                cbar_label="Read Count")
+    fig, ax = _make_group_hist2d([group.bq_hist for group in bc_groups],
+                                 Constants.BQ_BINS,
+                                 "Read Barcode Quality Score")
     ax.axhline(26, color='black', linestyle='--')
     return _to_plot(fig, Constants.P_HIST2D_BQ, base_dir)
 
@@ -214,13 +247,18 @@ def make_bcqual_histogram(bc_groups, base_dir):
     Create simple histogram of barcode quality score frequency over all
     barcoded subreads.
     """
-    data = []
-    for g in bc_groups:
-        data.extend(g.bqs)
-    fig, ax = make_histogram(
-        datum=data,
+    bqs = [g.bq_hist.get_values() for g in bc_groups if g.n_subreads > 0]
+    if len(bqs) > 0:
+        # the bins only depend on the distinct scores
+        edges = get_histogram_edges(
+            np.unique(np.concatenate([values for values, _ in bqs])), 50)
+        counts = sum(np.histogram(values, bins=edges, weights=weights)[0]
+                     for values, weights in bqs)
+    else:
+        counts, edges = [], [0]
+    fig, ax = make_histogram_from_counts(
+        counts, edges,
         axis_labels=["Barcode Quality Score", "Number of Barcoded Subreads"],
-        nbins=50,
         barcolor=get_blue(3))
     ax.axvline(26, color='r')
     return _to_plot(fig, Constants.P_HIST_BQ, base_dir)
@@ -269,11 +307,84 @@ def make_plots(bc_groups, base_dir):
     ]
 
 
+class ValueHistogram(object):
+    """
+    Bounded histogram of non-negative integer values, with their count,
+    sum, min and max.  Bins are dx wide starting at 0; when a value would
+    need more than max_bins bins, pairs of bins are merged and dx doubles,
+    so small values (e.g. barcode quality scores) are counted exactly.
+    """
+    __slots__ = ["max_bins", "dx", "bins", "n", "total", "min_value",
+                 "max_value"]
+
+    def __init__(self, values=(), max_bins=Constants.MAX_GROUP_BINS):
+        self.max_bins = max_bins
+        self.dx = 1
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.n = self.total = 0
+        self.min_value = self.max_value = None
+        self.add_array(values)
+
+    def _merge_bins(self):
+        if len(self.bins) % 2 == 1:
+            self.bins = np.append(self.bins, 0)
+        self.bins = self.bins.reshape(-1, 2).sum(axis=1)
+        self.dx *= 2
+
+    def _update_range(self, vmin, vmax):
+        if self.min_value is None:
+            self.min_value, self.max_value = vmin, vmax
+        else:
+            self.min_value = min(self.min_value, vmin)
+            self.max_value = max(self.max_value, vmax)
+        while self.max_value // self.dx >= self.max_bins:
+            self._merge_bins()
+
+    def _grow_bins(self, nbins):
+        if nbins > len(self.bins):
+            self.bins = np.concatenate(
+                [self.bins, np.zeros(nbins - len(self.bins), dtype=np.int64)])
+
+    def add(self, value):
+        value = int(value)
+        self.n += 1
+        self.total += value
+        self._update_range(value, value)
+        i = value // self.dx
+        self._grow_bins(i + 1)
+        self.bins[i] += 1
+
+    def add_array(self, values):
+        """Add the values of an array (or list) at once"""
+        values = np.asarray(values, dtype=np.int64)
+        if values.size == 0:
+            return
+        self.n += values.size
+        self.total += int(values.sum())
+        self._update_range(int(values.min()), int(values.max()))
+        counts = np.bincount(values // self.dx)
+        self._grow_bins(len(counts))
+        self.bins[:len(counts)] += counts
+
+    def get_values(self):
+        """
+        The values and their counts, as arrays: the distinct values while dx
+        is 1, otherwise the middle of each non-empty bin (within the min and
+        max value).
+        """
+        i = np.flatnonzero(self.bins)
+        values = i * self.dx + self.dx // 2
+        if len(values) > 0:
+            values = np.clip(values, self.min_value, self.max_value)
+        return values, self.bins[i]
+
+
 class BarcodeGroup(object):
     """
     Utility class for storing per-barcode metrics from multiple reads
     """
-    __slots__ = ["label", "n_bases", "readlengths", "bqs", "srl_max", "idx"]
+    __slots__ = ["label", "n_bases", "readlength_hist", "bq_hist", "srl_max",
+                 "idx"]
 
     def __init__(self,
                  label,
@@ -284,35 +395,35 @@ class BarcodeGroup(object):
                  idx=None):
         self.label = label
         self.n_bases = n_bases
-        self.readlengths = list(readlengths)
-        self.bqs = list(bqs)
+        self.readlength_hist = ValueHistogram(readlengths)
+        self.bq_hist = ValueHistogram(bqs)
         self.srl_max = srl_max
         self.idx = idx
 
     def add_read(self, read_info):
         assert read_info.label == self.label
         self.n_bases += read_info.nbases
-        self.readlengths.append(read_info.readlength)
-        self.bqs.extend(list(read_info.bq))
+        self.readlength_hist.add(read_info.readlength)
+        self.bq_hist.add_array(read_info.bq)
         self.srl_max = max(read_info.srl_max, self.srl_max)
 
     @property
     def n_subreads(self):
-        return len(self.bqs)
+        return self.bq_hist.n
 
     @property
     def n_reads(self):
-        return len(self.readlengths)
+        return self.readlength_hist.n
 
     def mean_read_length(self):
         if self.n_reads == 0:
             return 0
-        return int(sum(self.readlengths) / self.n_reads)
+        return int(self.readlength_hist.total / self.n_reads)
 
     def mean_bcqual(self):
         if self.n_subreads == 0:
             return 0
-        return int(sum(self.bqs) / self.n_subreads)
+        return int(self.bq_hist.total / self.n_subreads)
 
 
 class ReadInfo(object):
@@ -495,10 +606,8 @@ def _make_report_impl(attribute_ids,
         base_dir = os.getcwd()
 
     bc_groups = {}
-    bc_info = defaultdict(list)
 
     for bc_read in read_info:
-        bc_info[bc_read.label].append(bc_read)
         if not bc_read.label in bc_groups:
             bc_groups[bc_read.label] = BarcodeGroup(
                 bc_read.label, idx=bc_read.idx)
@@ -556,8 +665,8 @@ def _make_report_impl(attribute_ids,
         #rl_sum = sum([bc_groups[k].bases for k in labels_bc])
         srl_max_sum = rl_sum = 0
         for k in labels_bc:
-            rl_sum += sum([b.readlength for b in bc_info[k]])
-            srl_max_sum += max([b.srl_max for b in bc_info[k]])
+            rl_sum += bc_groups[k].readlength_hist.total
+            srl_max_sum += bc_groups[k].srl_max
         attributes.extend([
             Attribute(Constants.A_MEAN_READS, value=int(
                 n_reads_sum / n_barcodes)),
@@ -618,30 +727,42 @@ def run_to_report(ds_bc_file, barcodes_file, subreads_in_file, base_dir=None,
                                base_dir=base_dir)
 
 
+def _run_cached_report(ds_bc_file, barcodes_file, subreads_in_file,
+                       report_json, csv_file=None, isoseq_mode=False):
+    def _run_report():
+        report = run_to_report(ds_bc_file, barcodes_file, subreads_in_file,
+                               base_dir=op.dirname(report_json),
+                               isoseq_mode=isoseq_mode)
+        log.debug(pformat(report.to_dict()))
+        report.write_json(report_json)
+        if csv_file is not None:
+            report.tables[0].to_csv(csv_file)
+        return 0
+    extra_outputs = [csv_file] if csv_file is not None else []
+    return run_cached_report(
+        _run_report, report_json, spec.id, __version__,
+        [ds_bc_file, barcodes_file, subreads_in_file],
+        options={Constants.ISOSEQ_MODE: isoseq_mode},
+        extra_outputs=extra_outputs)
+
+
 def args_runner(args):
     log.info("Starting {f} version {v} report generation".format(
         f=__file__, v=__version__))
-    report = run_to_report(args.ds_bc, args.barcodes, args.subreads_in,
-                           base_dir=op.dirname(args.report_json),
-                           isoseq_mode=args.isoseq_mode)
-    log.info(pformat(report.to_dict()))
-    report.write_json(args.report_json)
-    return 0
+    return _run_cached_report(args.ds_bc, args.barcodes, args.subreads_in,
+                              args.report_json, isoseq_mode=args.isoseq_mode)
 
 
 def resolved_tool_contract_runner(rtc):
     log.info("Starting {f} version {v} report generation".format(
         f=__file__, v=__version__))
-    report = run_to_report(
+    return _run_cached_report(
         ds_bc_file=rtc.task.input_files[0],
         barcodes_file=rtc.task.input_files[2],
         subreads_in_file=rtc.task.input_files[1],
-        base_dir=op.dirname(rtc.task.output_files[0]),
+        report_json=rtc.task.output_files[0],
+        csv_file=rtc.task.output_files[1],
         isoseq_mode=rtc.task.options.get(Constants.ISOSEQ_MODE, False))
-    log.debug(pformat(report.to_dict()))
-    report.write_json(rtc.task.output_files[0])
-    report.tables[0].to_csv(rtc.task.output_files[1])
-    return 0
 
 
 def get_parser():
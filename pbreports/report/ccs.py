@@ -30,6 +30,7 @@ from pbcore.io import ConsensusReadSet, BarcodeSet
 from pbreports.plot.helper import (get_fig_axes_lpr, make_histogram,
                                    get_blue, get_green, Line, apply_line_data, DEFAULT_DPI, DEFAULT_THUMB_DPI)
 from pbreports.util import accuracy_as_phred_qv
+from pbreports.io.report_cache import run_cached_report
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -448,12 +449,15 @@ def run_report(
         output_dir):
     log.info("Running {f} v{v}.".format(
         f=os.path.basename(__file__), v=__version__))
-    report = None
-    ds = ConsensusReadSet(input_file)
-    report = to_report(ds, output_dir)
-    log.info(pformat(report.to_dict()))
-    report.write_json(report_json)
-    return 0
+
+    def _run_report():
+        ds = ConsensusReadSet(input_file)
+        report = to_report(ds, output_dir)
+        log.info(pformat(report.to_dict()))
+        report.write_json(report_json)
+        return 0
+    return run_cached_report(_run_report, report_json, Constants.R_ID,
+                             __version__, [input_file], output_dir=output_dir)
 
 
 def _args_runner(args):
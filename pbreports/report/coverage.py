@@ -25,7 +25,10 @@ from pbcore.io import GffReader, ReferenceSet
 from pbreports.util import get_top_contigs
 from pbreports.plot.helper import (get_fig_axes_lpr, apply_line_data,
                                    apply_line_fill_data, apply_histogram_data,
-                                   LineFill, save_figure_with_thumbnail, DEFAULT_DPI)
+                                   LineFill, save_figure_with_thumbnail,
+                                   save_line_fill_figures)
+from pbreports.io.reference import ReferenceIndex
+from pbreports.io.report_cache import run_cached_report
 from pbreports.io.specs import *
 
 
@@ -66,6 +69,8 @@ class CoverageReport(object):
             driver_exe=self.DRIVER_EXE,
             is_distributed=True)
         ap = p.arg_parser.parser
+        ap.add_argument("--nproc", type=int, default=1,
+                        help="Number of processes drawing the contig plots")
         p.add_input_file_type(FileTypes.DS_REF, "reference",
                               name="Reference DataSet",
                               description="Reference DataSet XML or FASTA file")
@@ -84,29 +89,40 @@ class CoverageReport(object):
             description="Maximum number of contigs to plot in coverage report")
         return p
 
+    def _run_cached_report(self, gff, reference, max_contigs_to_plot,
+                           report_json, nproc=1):
+        def _run_report():
+            rpt = self.make_report(gff, reference, max_contigs_to_plot,
+                                   op.basename(report_json),
+                                   op.dirname(report_json), nproc=nproc)
+            log.info(rpt)
+            return 0
+        return run_cached_report(
+            _run_report, report_json, self.spec.id, __version__,
+            [reference, gff],
+            options={Constants.MAX_CONTIGS_ID: max_contigs_to_plot})
+
     def args_runner(self, args):
-        rpt = self.make_report(args.gff, args.reference, args.maxContigs,
-                               args.report_json, op.dirname(args.report_json))
-        log.info(rpt)
-        return 0
+        return self._run_cached_report(args.gff, args.reference,
+                                       args.maxContigs, args.report_json,
+                                       nproc=args.nproc)
 
     def resolved_tool_contract_runner(self, rtc):
-        rpt = self.make_report(
+        return self._run_cached_report(
             gff=rtc.task.input_files[1],
             reference=rtc.task.input_files[0],
             max_contigs_to_plot=rtc.task.options[Constants.MAX_CONTIGS_ID],
-            report=op.basename(rtc.task.output_files[0]),
-            output_dir=op.dirname(rtc.task.output_files[0]))
-        log.info(rpt)
-        return 0
+            report_json=rtc.task.output_files[0],
+            nproc=rtc.task.nproc)
 
     def make_report(self, gff, reference, max_contigs_to_plot, report,
-                    output_dir):
+                    output_dir, nproc=1):
         """
         Entry to report.
         :param gff: (str) path to alignment_summary.gff
         :param reference: (str) path to reference_dir
         :param max_contigs_to_plot: (int) max number of contigs to plot
+        :param nproc: (int) number of processes drawing the contig plots
         """
         _validate_inputs(gff, reference)
         top_contigs = get_top_contigs(reference, max_contigs_to_plot)
@@ -119,7 +135,7 @@ class CoverageReport(object):
         a2 = _get_att_percent_missing(stats)
 
         plot_grp_coverage = self._create_coverage_plot_grp(
-            top_contigs, cov_map, output_dir)
+            top_contigs, cov_map, output_dir, nproc=nproc)
 
         plot_grp_histogram = None
         if stats is not None:
@@ -145,42 +161,44 @@ class CoverageReport(object):
         rpt.write_json(os.path.join(output_dir, report))
         return rpt
 
-    def _create_coverage_plot_grp(self, top_contigs, cov_map, output_dir):
+    def _create_coverage_plot_grp(self, top_contigs, cov_map, output_dir,
+                                  nproc=1):
         """
         Returns io.model.PlotGroup object
         Create the plotGroup element that contains the coverage plots of the top contigs.
         :param top_contigs: (list of Contig objects) sorted by contig size
         :param cov_map: (dict string:ContigCoverage) mapping of contig.id to ContigCoverage object
         :param output_dir: (string) where to write images
+        :param nproc: (int) number of processes drawing the plots
         """
         plots = []
-        thumbnail = None
-        idx = 0
+        line_fills = []
+        fnames = []
         log.debug('Creating plots for {n} top contig(s)'.format(
             n=str(len(top_contigs))))
+        caption = self.spec.get_plotgroup_spec(Constants.PG_COVERAGE
+                                               ).get_plot_spec(Constants.P_COVERAGE).caption + " {c}."
         for tc in top_contigs:
             if not tc.id in cov_map:
                 # no coverage of this contig
                 log.debug('contig {c} has no coverage info '.format(c=tc.id))
                 continue
             ctg_cov = cov_map[tc.id]
-            fig, ax = self._create_contig_plot(ctg_cov)
-
+            line_fills.append(self._get_contig_line_fill(ctg_cov))
             fname = os.path.join(output_dir, ctg_cov.file_name)
-            if thumbnail is None:
-                imgfiles = save_figure_with_thumbnail(fig, fname)
-                thumbnail = os.path.basename(imgfiles[1])
-            else:
-                fig.savefig(fname, dpi=DEFAULT_DPI)
-            plt.close(fig)
-            id_ = "coverage_contig_{i}".format(i=str(idx))
-            caption = self.spec.get_plotgroup_spec(Constants.PG_COVERAGE
-                                                   ).get_plot_spec(Constants.P_COVERAGE).caption + " {c}."
+            fnames.append(fname)
+            id_ = "coverage_contig_{i}".format(i=str(len(plots)))
             plot = Plot(id_, os.path.basename(fname),
                         caption.format(c=ctg_cov.name),
                         title=caption.format(c=ctg_cov.name))
             plots.append(plot)
-            idx += 1
+
+        # all contig plots are drawn on the same figure
+        thumbnail = save_line_fill_figures(line_fills, fnames,
+                                           self._get_contig_axis_labels(),
+                                           nproc=nproc)
+        if thumbnail is not None:
+            thumbnail = os.path.basename(thumbnail)
 
         plot_group = PlotGroup(
             Constants.PG_COVERAGE,
@@ -209,27 +227,34 @@ class CoverageReport(object):
                                title=get_plotgroup_title(self.spec, Constants.PG_COVERAGE_HIST))
         return plot_group
 
-    def _create_contig_plot(self, contig_coverage):
+    def _get_contig_line_fill(self, contig_coverage):
         """
-        Returns a fig,ax plot for this contig
+        Returns the LineFill of the coverage plot for this contig
         :param contig_coverage: (ContigCoverage)
         """
-        npXData = np.array(contig_coverage.xData)
-        line_fill = LineFill(xData=npXData,
-                             yData=np.array(contig_coverage.yDataMean),
-                             linecolor=Constants.COLOR_STEEL_BLUE_DARK, alpha=0.6,
-                             yDataMin=np.array(
-                                 contig_coverage.yDataStdevMinus),
-                             yDataMax=np.array(contig_coverage.yDataStdevPlus),
-                             edgecolor=Constants.COLOR_STEEL_BLUE_LIGHT,
-                             facecolor=Constants.COLOR_STEEL_BLUE_LIGHT)
-        lines_fills = [line_fill]
-        fig, ax = get_fig_axes_lpr()
+        return LineFill(xData=contig_coverage.xData,
+                        yData=contig_coverage.yDataMean,
+                        linecolor=Constants.COLOR_STEEL_BLUE_DARK, alpha=0.6,
+                        yDataMin=contig_coverage.yDataStdevMinus,
+                        yDataMax=contig_coverage.yDataStdevPlus,
+                        edgecolor=Constants.COLOR_STEEL_BLUE_LIGHT,
+                        facecolor=Constants.COLOR_STEEL_BLUE_LIGHT)
+
+    def _get_contig_axis_labels(self):
         xlabel = get_plot_xlabel(
             self.spec, Constants.PG_COVERAGE, Constants.P_COVERAGE)
         ylabel = get_plot_ylabel(
             self.spec, Constants.PG_COVERAGE, Constants.P_COVERAGE)
-        apply_line_data(ax, lines_fills, (xlabel, ylabel))
+        return xlabel, ylabel
+
+    def _create_contig_plot(self, contig_coverage):
+        """
+        Returns a fig,ax plot for this contig
+        :param contig_coverage: (ContigCoverage)
+        """
+        lines_fills = [self._get_contig_line_fill(contig_coverage)]
+        fig, ax = get_fig_axes_lpr()
+        apply_line_data(ax, lines_fills, self._get_contig_axis_labels())
         apply_line_fill_data(ax, lines_fills)
         return fig, ax
 
@@ -277,32 +302,55 @@ def _get_contigs_to_plot(alignment_summ_gff, contigs):
     :param alignment_summ_gff: (str) path to alignment_summ_gff
     :param contigs: (list) top contigs from reference
     """
+    index = ReferenceIndex.from_contigs(contigs)
+    regions = load_coverage_regions(alignment_summ_gff, index)
+    return {seqid: ContigCoverage(seqid, contigs[index.slot(seqid)].name,
+                                  regions=regions)
+            for seqid in regions.seqids}
 
-    def _get_name(id_):
-        for c in contigs:
-            if c.id == id_:
-                return c.name
-
-    cov_map = {}
-    contig_ids = [c.id for c in contigs]
 
+def load_coverage_regions(alignment_summ_gff, seqids=None):
+    """
+    Load the coverage regions of an alignment summary GFF in one pass, as
+    CoverageRegions columns.
+    :param alignment_summ_gff: (str) path to alignment_summ_gff
+    :param seqids: (ReferenceIndex or iterable) contigs to load, or None for
+    all of them
+    """
+    if seqids is not None and not isinstance(seqids, ReferenceIndex):
+        seqids = set(seqids)
+    codes = {}
+    skipped = set()
+    contig_codes, starts, ends, cov2, gaps = [], [], [], [], []
     reader = GffReader(alignment_summ_gff)
-    for rec in reader:
-        if rec.seqid not in contig_ids:
-            log.info("Skipping seqid '{i}'.".format(i=rec.seqid))
-            continue
-
-        try:
-            contig_cov = cov_map[rec.seqid]
-        except KeyError:
-            contig_cov = ContigCoverage(rec.seqid, _get_name(rec.seqid))
-            cov_map[rec.seqid] = contig_cov
-
-        contig_cov.add_data(rec)
-
-    reader.close()
-
-    return cov_map
+    try:
+        for rec in reader:
+            if seqids is not None and rec.seqid not in seqids:
+                if rec.seqid not in skipped:
+                    log.info("Skipping seqid '{i}'.".format(i=rec.seqid))
+                    skipped.add(rec.seqid)
+                continue
+            if rec.seqid not in codes:
+                codes[rec.seqid] = len(codes)
+            contig_codes.append(codes[rec.seqid])
+            starts.append(rec.start)
+            ends.append(rec.end)
+            cov2.append(rec.attributes["cov2"])
+            gaps.append(rec.attributes["gaps"])
+    finally:
+        reader.close()
+
+    def _to_pairs(values):
+        # parse all the "x,y" attribute values at once
+        return np.fromstring(",".join(values), sep=",").reshape(-1, 2)
+
+    stats = _to_pairs(cov2)
+    return CoverageRegions(sorted(codes, key=codes.get),
+                           np.array(contig_codes, dtype=int),
+                           np.array(starts, dtype=np.int64),
+                           np.array(ends, dtype=np.int64),
+                           stats[:, 0], stats[:, 1],
+                           _to_pairs(gaps)[:, 1].astype(np.int64))
 
 
 def _get_att_mean_coverage(stats):
@@ -332,8 +380,6 @@ def _get_att_percent_missing(stats):
 def _get_reference_coverage_stats(contigList):
     """Get a dictionary of coverage stats for the list of contigs"""
 
-    maxbin = 0
-    means = []
     cumulativeAveRegionSize = 0
     totalNumBases = 0
     totalMissingBases = 0
@@ -341,16 +387,8 @@ def _get_reference_coverage_stats(contigList):
     contigCoverages = []
     numContigs = len(contigList)
     for cc in contigList:
-
         contigCoverages.append(cc.meanCoveragePerBase() * cc.numBases())
         cumulativeAveRegionSize += cc.aveRegionSize()
-
-        if len(cc.yDataMean) > 0:
-            means.extend(cc.yDataMean)
-            localmax = max(cc.yDataMean)
-            if localmax > maxbin:
-                maxbin = localmax
-
         totalNumBases += cc.numBases()
         totalMissingBases += cc.missingBases()
 
@@ -359,6 +397,8 @@ def _get_reference_coverage_stats(contigList):
             'totalNumBases is zero. Not able to calculate reference coverage stats.')
         return None
 
+    means = np.concatenate([cc.yDataMean for cc in contigList])
+    maxbin = max(0, means.max()) if len(means) > 0 else 0
     mean_depth_of_coverage = sum(contigCoverages) / totalNumBases
     ave_region_size = int(cumulativeAveRegionSize / float(numContigs))
     perc_missing_bases = (float(totalMissingBases) /
@@ -400,32 +440,90 @@ class ReferenceStats(object):
         return self._perc_missing_bases
 
 
+class CoverageRegions(object):
+
+    """
+    Coverage regions (GFF records) of a set of contigs as NumPy columns,
+    grouped by contig with the records of each contig in file order. The
+    per-contig totals are computed for all contigs at once.
+    """
+
+    def __init__(self, seqids, contig_codes, starts, ends, means, stddevs,
+                 missing):
+        """
+        :param seqids: contig ids, indexed by contig_codes
+        :param contig_codes: contig of each region
+        """
+        self.seqids = list(seqids)
+        self._codes = {seqid: i for i, seqid in enumerate(self.seqids)}
+        ncontigs = len(self.seqids)
+        contig_codes = np.asarray(contig_codes, dtype=int)
+        order = np.argsort(contig_codes, kind="mergesort")
+        self.offsets = np.searchsorted(contig_codes[order],
+                                       np.arange(ncontigs + 1))
+        self.starts = np.asarray(starts)[order]
+        self.ends = np.asarray(ends)[order]
+        self.means = np.asarray(means, dtype=float)[order]
+        self.stddevs = np.asarray(stddevs, dtype=float)[order]
+        self.missing = np.asarray(missing, dtype=np.int64)[order]
+        self.stdev_plus = self.means + self.stddevs
+        # clip at zero
+        self.stdev_minus = np.maximum(self.means - self.stddevs, 0)
+
+        def _sum_by_contig(values):
+            # accumulates in record order, like adding one record at a time
+            return np.bincount(contig_codes, weights=values,
+                               minlength=ncontigs)
+
+        region_sizes = (np.asarray(ends) - np.asarray(starts)) + 1
+        self.num_records = np.diff(self.offsets)
+        self.total_coverage = _sum_by_contig(
+            np.asarray(means, dtype=float) * region_sizes)
+        self.region_sizes = _sum_by_contig(region_sizes).astype(np.int64)
+        self.missing_bases = _sum_by_contig(missing).astype(np.int64)
+        has_records = self.num_records > 0
+        first = self.offsets[:-1][has_records]
+        self.ref_starts = np.zeros(ncontigs, dtype=np.int64)
+        self.ref_starts[has_records] = self.starts[first]
+        self.ref_ends = np.zeros(ncontigs, dtype=np.int64)
+        self.ref_ends[has_records] = self.ends[self.offsets[1:][has_records] - 1]
+        # assumption: regions are continuous
+        self.num_bases = np.zeros(ncontigs, dtype=np.int64)
+        if len(first) > 0:
+            self.num_bases[has_records] = np.maximum(
+                np.maximum.reduceat(self.ends, first), 0)
+
+    def __len__(self):
+        return len(self.seqids)
+
+    def index(self, seqid):
+        return self._codes[seqid]
+
+
 class ContigCoverage(object):
 
-    def __init__(self, seqid, name=None):
-        """Encapsulates sequence info relevant to one chart"""
+    def __init__(self, seqid, name=None, regions=None):
+        """
+        Encapsulates sequence info relevant to one chart
+
+        :param regions: (CoverageRegions) with the coverage of this contig,
+        see load_coverage_regions; records can also be added one at a time
+        with add_data
+        """
 
         self._seqid = seqid
         if name is None:
             name = seqid
         self._name = name
 
-        self.xData = []
-
-        self._numRecords = 0
-
-        self._totalCoverage = 0
-        self._refEnd = 0
-        self._refStart = None
-
-        self._cumulativeRegionSizes = 0
-        self._numBases = 0
-        self._missingBases = 0
-        self._windowSize = 0
-
-        self.yDataMean = []
-        self.yDataStdevPlus = []
-        self.yDataStdevMinus = []
+        if regions is None:
+            regions = CoverageRegions([seqid], [], [], [], [], [], [])
+        self._regions = regions
+        self._index = regions.index(seqid)
+        # columns of the records added with add_data, built into _regions
+        # when they are next read
+        self._added = None
+        self._stale = False
 
         seqid_clean = re.sub("\|", "_", re.sub(
             "/", "__", self._seqid))  # for services
@@ -436,44 +534,76 @@ class ContigCoverage(object):
                   s=self._refStart, e=self._refEnd, x=self._numRecords, b=self._numBases)
         return "<{k} {i} name:{n} ({s}, {e}) nrecords:{x} nbases:{b} >".format(**_d)
 
-    def add_data(self, gff3Record):
-        """Append x,y data from this record to the contig graph"""
-
-        self._numRecords += 1
+    @property
+    def regions(self):
+        """CoverageRegions including the records added with add_data"""
+        if self._stale:
+            starts, ends, means, stddevs, missing = self._added
+            self._regions = CoverageRegions(
+                [self._seqid], np.zeros(len(starts), dtype=int),
+                np.array(starts, dtype=np.int64),
+                np.array(ends, dtype=np.int64), means, stddevs, missing)
+            self._index = 0
+            self._stale = False
+        return self._regions
+
+    def _column(self, values):
+        r, i = self.regions, self._index
+        return values[r.offsets[i]:r.offsets[i + 1]]
 
-        if self._refStart is None:
-            self._refStart = gff3Record.start
+    @property
+    def xData(self):
+        return self._column(self.regions.starts)
 
-        self.xData.append(gff3Record.start)
-        stats = gff3Record.attributes['cov2'].split(",")
-        mean = float(stats[0])
-        stddev = float(stats[1])
+    @property
+    def yDataMean(self):
+        return self._column(self.regions.means)
 
-        self.yDataMean.append(mean)
-        self.yDataStdevPlus.append(mean + stddev)
+    @property
+    def yDataStdevPlus(self):
+        return self._column(self.regions.stdev_plus)
 
-        # what is better - recalculating each time data is added, or storing 2
-        # more arrays?
-        regSize = (gff3Record.end - gff3Record.start) + 1
+    @property
+    def yDataStdevMinus(self):
+        return self._column(self.regions.stdev_minus)
 
-        self._totalCoverage += mean * regSize
-        self._refEnd = gff3Record.end
+    @property
+    def _numRecords(self):
+        return int(self.regions.num_records[self._index])
 
-        self._cumulativeRegionSizes = self._cumulativeRegionSizes + regSize
+    @property
+    def _refStart(self):
+        if self._numRecords == 0:
+            return None
+        return int(self.regions.ref_starts[self._index])
 
-        # the second value of gaps pair is missing bases for region
-        self._missingBases = self._missingBases + \
-            int(gff3Record.attributes['gaps'].split(",")[1])
+    @property
+    def _refEnd(self):
+        return int(self.regions.ref_ends[self._index])
 
-        # assumption: regions are continuous
-        if self._numBases < gff3Record.end:
-            self._numBases = gff3Record.end
+    @property
+    def _numBases(self):
+        return int(self.regions.num_bases[self._index])
 
-        # clip at zero
-        lowerBound = mean - stddev
-        if lowerBound < 0:
-            lowerBound = 0
-        self.yDataStdevMinus.append(lowerBound)
+    def add_data(self, gff3Record):
+        """
+        Append x,y data from this record to the contig graph. The records
+        are buffered, and the columns built once when next read; loading
+        all records with load_coverage_regions is still faster.
+        """
+        if self._added is None:
+            r = self._regions
+            self._added = tuple(list(self._column(values)) for values in
+                                (r.starts, r.ends, r.means, r.stddevs,
+                                 r.missing))
+        stats = gff3Record.attributes['cov2'].split(",")
+        # the second value of gaps pair is missing bases for region
+        missing = int(gff3Record.attributes['gaps'].split(",")[1])
+        record = (gff3Record.start, gff3Record.end, float(stats[0]),
+                  float(stats[1]), missing)
+        for column, value in zip(self._added, record):
+            column.append(value)
+        self._stale = True
 
     @property
     def name(self):
@@ -484,17 +614,19 @@ class ContigCoverage(object):
         if self._refStart is None:
             # contig wasn't found in gff
             return 0.0
-        return self._totalCoverage / float(self._refEnd - self._refStart + 1)
+        return self.regions.total_coverage[self._index] / \
+            float(self._refEnd - self._refStart + 1)
 
     def aveRegionSize(self):
         """Get the average chunk size of this contig"""
         if self._numRecords == 0:
             return 0
-        return int(self._cumulativeRegionSizes / float(self._numRecords))
+        return int(self.regions.region_sizes[self._index] /
+                   float(self._numRecords))
 
     def missingBases(self):
         """Get number missing bases"""
-        return self._missingBases
+        return int(self.regions.missing_bases[self._index])
 
     def numBases(self):
         """Get number bases"""
@@ -502,9 +634,9 @@ class ContigCoverage(object):
 
 
 def make_coverage_report(gff, reference, max_contigs_to_plot, report,
-                         output_dir):
+                         output_dir, nproc=1):
     return CoverageReport().make_report(gff, reference, max_contigs_to_plot,
-                                        report, output_dir)
+                                        report, output_dir, nproc=nproc)
 
 
 def main(argv=sys.argv[1:], driver_class=CoverageReport):
@@ -23,7 +23,7 @@ from pbcore.io import SubreadSet
 
 from pbreports.plot.helper import (get_fig_axes_lpr,
                                    save_figure_with_thumbnail, get_green, DEFAULT_DPI)
-from pbreports.util import (compute_n50, continuous_dist_shaper,
+from pbreports.util import (compute_n50_from_counts, continuous_dist_shaper,
                             get_subreads_report_parser,
                             arg_runner_subreads_report,
                             rtc_runner_subreads_report)
@@ -93,7 +93,8 @@ def _to_read_stats_attributes(readLenDists, readQualDists):
     n50 = 0
     readscoretotal = 0
     readscorenumber = 0
-    approx_read_lens = []
+    bin_values = []
+    bin_counts = []
 
     # if a merge failed there may be more than one dist:
     for rlendist in readLenDists:
@@ -109,14 +110,16 @@ def _to_read_stats_attributes(readLenDists, readQualDists):
             # for the last bin, just use the value
             else:
                 value = (i * rlendist.binWidth) + rlendist.minBinValue
-            approx_read_lens.extend([value] * lbin)
+            bin_values.append(value)
+            bin_counts.append(lbin)
             # TODO(mdsmith)(2016-02-09) make sure maxOutlierValue is updated
             # during a merge /todo
             # but pop off that last value and replace it with the
             # maxOutlierValue:
             # approx_read_lens.pop()
             # approx_read_lens.append(rlendist.maxBinValue)
-    n50 = int(np.round(compute_n50(approx_read_lens), decimals=0))
+    n50 = int(np.round(compute_n50_from_counts(bin_values, bin_counts),
+                       decimals=0))
     for rqualdist in readQualDists:
         readscoretotal += _total_from_bins(rqualdist.bins,
                                            rqualdist.minBinValue,
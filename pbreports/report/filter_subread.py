@@ -39,7 +39,6 @@ Attributes
 import os
 import sys
 import logging
-import functools
 import itertools
 import math
 
@@ -59,7 +58,7 @@ from pbreports.report.streaming_utils import (PlotViewProperties,
 from pbreports.model.aggregators import (BaseAggregator, SumAggregator,
                                          HistogramAggregator,
                                          MaxAggregator, MeanAggregator,
-                                         CountAggregator)
+                                         CountAggregator, bin_indices)
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -135,6 +134,14 @@ class _BaseHistogram(BaseAggregator):
         """This will be readlengths"""
         raise NotImplementedError("Not implemented")
 
+    def merge(self, other):
+        if not isinstance(other, self.__class__) or \
+                (self.dx, self.nbins) != (other.dx, other.nbins):
+            _d = dict(s=self, o=other)
+            raise TypeError("Incompatible histograms. {s} {o}".format(**_d))
+        self.bins += other.bins
+        return self
+
     def __repr__(self):
         x = self.dx * self.nbins
         _d = dict(k=self.__class__.__name__,
@@ -160,6 +167,22 @@ class SubreadLengthHistogram(_BaseHistogram):
             log.error(
                 "Max value {v} dx:{d} nbins{n} max value {x}".format(**_d))
 
+    def apply_batch(self, records):
+        self.apply_array(records['length'])
+
+    def apply_array(self, values):
+        indices = bin_indices(values, self.dx)
+        out_of_range = indices >= self.nbins
+        if out_of_range.any():
+            x = self.dx * self.nbins
+            _d = dict(v=values[out_of_range].max(), c=out_of_range.sum(),
+                      d=self.dx, x=x, n=self.nbins)
+            log.error("Dropping {c} values. Max value {v} dx:{d} nbins{n} "
+                      "max value {x}".format(**_d))
+            indices = indices[~out_of_range]
+        self.bins += np.bincount(indices,
+                                 minlength=self.nbins).astype(self.bins.dtype)
+
 
 class MeanSubreadLengthAggregator(MeanAggregator):
     pass
@@ -171,19 +194,42 @@ class N50Aggregator(BaseAggregator):
         self.record_field = record_field
         # this is not constant memory
         self.values = values if values else []
+        # np.array blocks added by apply_array
+        self._batches = []
 
     def apply(self, record):
         v = getattr(record, self.record_field)
         self.values.append(v)
 
+    def apply_array(self, values):
+        # copy, so the parsed block can be released
+        self._batches.append(np.array(values))
+
+    def merge(self, other):
+        if not isinstance(other, self.__class__):
+            _d = dict(s=type(self), o=type(other))
+            raise TypeError("Incompatible types. {s} {o}".format(**_d))
+        self.values.extend(other.values)
+        self._batches.extend(other._batches)
+        return self
+
+    @property
+    def nvalues(self):
+        return len(self.values) + sum(len(b) for b in self._batches)
+
     @property
     def n50(self):
-        return compute_n50(self.values)
+        batches = list(self._batches)
+        if self.values:
+            batches.append(np.array(self.values))
+        if not batches:
+            return compute_n50([])
+        return compute_n50(np.concatenate(batches))
 
     def __repr__(self):
 
         _d = dict(k=self.__class__.__name__,
-                  v=len(self.values),
+                  v=self.nvalues,
                   n=self.n50)
         return "<{k} n50:{n} nvalues:{v} >".format(**_d)
 
@@ -192,95 +238,59 @@ class N50Aggregator(BaseAggregator):
         return self.n50
 
 
-class Record(object):
+# Column names of the filtered subread summary CSV
+_CSV_FIELDS = ('movie_name', 'hole_number', 'start', 'end', 'length',
+               'passed_filter')
 
-    def __init__(self, movie_name, hole_number, start, end, length, passed_filter):
-        self.movie_name = movie_name
-        self.hole_number = hole_number
-        self.start = start
-        self.end = end
-        self.length = length
-        self.passed_filter = passed_filter
-
-    def __repr__(self):
-        _d = dict(m=self.movie_name,
-                  h=self.hole_number,
-                  s=self.start,
-                  e=self.end,
-                  l=self.length,
-                  p=self.passed_filter)
-        return "<{k} {m} {h} {s} {e} {l} {p}>".format(**_d)
 
+def to_records(lines):
+    """
+    Parse a block of CSV lines into a numpy record array with the columns
+    in _CSV_FIELDS.
 
-def to_record(line):
-    to_b = lambda x: True if x == '1' else False
-    to_c = [str, int, int, int, int, to_b]
+    :param lines: list of str
+    :rtype: np.recarray
+    """
+    rows = [line.strip().split(',') for line in lines if line.strip()]
+    try:
+        raw = np.array(rows, dtype=str)
+    except ValueError:
+        raw = None
+    if raw is None or raw.ndim != 2 or raw.shape[1] != len(_CSV_FIELDS):
+        for row in rows:
+            if len(row) != len(_CSV_FIELDS):
+                msg = "Unable to process line '{l}'".format(l=','.join(row))
+                sys.stderr.write(msg + "\n")
+                raise ValueError(msg)
+        # all lines were empty
+        raw = np.empty((0, len(_CSV_FIELDS)), dtype=str)
 
     try:
-        a = [v(k) for k, v in zip(line.strip().split(','), to_c)]
-        r = Record(*a)
-        return r
-    except (ValueError, TypeError) as e:
-        msg = "Unable to process line '{l}'".format(l=line)
+        columns = [raw[:, 0],
+                   raw[:, 1].astype(np.int64),
+                   raw[:, 2].astype(np.int64),
+                   raw[:, 3].astype(np.int64),
+                   raw[:, 4].astype(np.int64),
+                   raw[:, 5] == '1']
+    except ValueError as e:
+        msg = "Unable to process lines: {e}".format(e=e)
         sys.stderr.write(msg + "\n")
         raise
+    return np.rec.fromarrays(columns, names=_CSV_FIELDS)
 
 
-def _filter_record(filter_func, record):
-    """Returns Bool"""
-    return filter_func(record)
-
-
-def null_filter(record):
-    return True
-
-
-def _multi_filter_record(filter_funcs, record):
-    """Returns Bool"""
-    for filter_func in filter_funcs:
-        if not filter_func(record):
-            # Bail out at the first chance
-            return False
-
-    return True
-
-
-def _apply(filter_funcs, aggregators, record):
-    """
-    Run the filters and call apply method on the aggregator if
-    the record passes filtering.
-
-    The should be used with functools.partial
-
-
-    my_func = functools.partial(_apply, [lambda r: True], [])
-
-    This will be my_func(record)
-
-    """
-    if not isinstance(filter_funcs, (list, tuple)):
-        filter_funcs = [filter_funcs]
-
-    if not isinstance(aggregators, (list, tuple)):
-        aggregators = [aggregators]
-
-    if _multi_filter_record(filter_funcs, record):
-        for aggregator in aggregators:
-            aggregator.apply(record)
-
-
-def applyer(row_to_record_func, iterable, funcs):
+def iter_record_blocks(file_obj, block_size=100000):
     """
+    Iterate over the (header-less) CSV file in blocks of numpy record arrays.
 
-    :params funcs: list of funcs that operate on Records
-
+    :param file_obj: file handle, or any iterable of lines
+    :param block_size: max number of lines parsed per block
     """
-    for it in iterable:
-        record = row_to_record_func(it)
-        for func in funcs:
-            func(record)
-
-        del record
+    while True:
+        lines = list(itertools.islice(file_obj, block_size))
+        if not lines:
+            break
+        yield to_records(lines)
 
 
 def _to_attributes(nreads, nbases, mean_readlength, n50):
@@ -319,25 +329,20 @@ def to_report(filtered_csv, output_dir, dpi=DEFAULT_DPI, thumb_dpi=DEFAULT_THUMB
                    'readlength_histogram': HistogramAggregator('length', 0, 100, nbins=10000),
                    'subread': SubreadLengthHistogram(dx=100)}
 
-    passed_filter = lambda record: record.passed_filter is True
-
-    passed_filter_func = functools.partial(
-        _apply, [passed_filter], aggregators.values())
-
     all_subread_aggregators = {'raw_nreads': SumAggregator('length'),
                                'max_raw_readlength': MaxAggregator('length'),
                                'raw_readlength_histogram': HistogramAggregator('length', 0, 100, nbins=10000)}
 
-    all_filter_func = functools.partial(
-        _apply, [null_filter], all_subread_aggregators.values())
-
-    funcs = [passed_filter_func, all_filter_func]
-
     with open(filtered_csv, 'r') as f:
         # read in header
         header = f.readline()
         # validate_header(header)
-        applyer(to_record, f, funcs)
+        for records in iter_record_blocks(f):
+            passed = records[records.passed_filter]
+            for aggregator in aggregators.values():
+                aggregator.apply_batch(passed)
+            for aggregator in all_subread_aggregators.values():
+                aggregator.apply_batch(records)
 
     for aggregator in itertools.chain(aggregators.values(), all_subread_aggregators.values()):
         log.info(aggregator)
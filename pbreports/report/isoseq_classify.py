@@ -24,6 +24,7 @@ from pbcore.io import ContigSet
 from pbreports.plot.helper import (create_plot_impl, get_blue,
                                    make_histogram_with_cdf)
 from pbreports.util import attributes_to_table, report_to_attributes
+from pbreports.io.fastx import contig_set_lengths
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -87,13 +88,7 @@ def make_report(contig_set, summary_txt, output_dir):
              format(f=contig_set))
 
     # Collect read lengths of
-    def _get_reads():
-        with ContigSet(contig_set) as f:
-            for record in f:
-                yield len(record.sequence)
-
-    readlengths = np.fromiter(
-        _get_reads(), dtype=np.int64, count=-1).astype(float)
+    readlengths = contig_set_lengths(contig_set).astype(float)
 
     # Plot read length histogram
     readlength_plot = create_readlength_plot(readlengths, output_dir)
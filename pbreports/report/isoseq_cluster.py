@@ -19,10 +19,11 @@ from pbcommand.models import FileTypes, get_pbparser
 from pbcommand.pb_io.report import load_report_from_json
 from pbcommand.cli import pbparser_runner
 from pbcommand.utils import setup_log
-from pbcore.io import ContigSet, FastqReader
+from pbcore.io import ContigSet
 
 from pbreports.plot.helper import (create_plot_impl, get_blue,
                                    make_histogram_with_cdf)
+from pbreports.io.fastx import contig_set_lengths, fastq_stats
 from pbreports.io.specs import *
 from pbreports.util import attributes_to_table, report_to_attributes
 
@@ -91,10 +92,7 @@ def make_report(reads_fasta, hq_isoforms_fq, lq_isoforms_fq, summary_txt, output
              format(f=reads_fasta))
 
     # Collect read lengths of
-    reader = ContigSet(reads_fasta)
-    rs = [len(r.sequence) for r in reader]
-    reader.close()
-    readlengths = np.array(rs).astype(float)
+    readlengths = contig_set_lengths(reads_fasta).astype(float)
 
     # Plot read length histogram
     readlength_plot = create_readlength_plot(readlengths, output_dir)
@@ -103,9 +101,8 @@ def make_report(reads_fasta, hq_isoforms_fq, lq_isoforms_fq, summary_txt, output
                                  thumbnail=readlength_plot.thumbnail)
 
     # Collect average qvs
-    hq_qvs = [np.mean(r.quality) for r in FastqReader(hq_isoforms_fq)]
-    lq_qvs = [np.mean(r.quality) for r in FastqReader(lq_isoforms_fq)]
-    avgqvs = np.array(hq_qvs + lq_qvs)
+    avgqvs = np.concatenate([fastq_stats(hq_isoforms_fq).mean_qvs,
+                             fastq_stats(lq_isoforms_fq).mean_qvs])
 
     # Plot average qv histogram
     avgqv_plot = create_avgqv_plot(avgqvs, output_dir)
@@ -116,7 +113,8 @@ def make_report(reads_fasta, hq_isoforms_fq, lq_isoforms_fq, summary_txt, output
     log.info("Plotting summary attributes from file: {f}".
              format(f=summary_txt))
     # Produce attributes based on summary.
-    dataset_uuids = [ContigSet(reads_fasta).uuid]
+    with ContigSet(reads_fasta) as ds:
+        dataset_uuids = [ds.uuid]
     attributes = report_to_attributes(summary_txt)
     r = load_report_from_json(summary_txt)
     # FIXME(nechols)(2016-03-22) not using the dataset UUIDs from these
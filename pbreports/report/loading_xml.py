@@ -78,14 +78,11 @@ def to_hq_hist_plot(hqbasefraction_dist, output_dir):
     return plot_groups
 
 
-def expand_data(bin_counts, max_val):
-    nbins = len(bin_counts)
-    midpoints = [max_val * (float(bn + 0.5) / float(nbins))
-                 for bn in xrange(nbins)]
-    data = []
-    for i in xrange(nbins):
-        data.extend([midpoints[i]] * bin_counts[i])
-    return data
+def to_bin_edges(nbins, max_val):
+    """
+    Edges of nbins equal-width bins covering [0, max_val].
+    """
+    return np.linspace(0, max_val, nbins + 1)
 
 
 def to_rl_overlay_plot(numunfilteredbasecalls_dist, readlen_dist, output_dir):
@@ -98,13 +95,15 @@ def to_rl_overlay_plot(numunfilteredbasecalls_dist, readlen_dist, output_dir):
     max_unfiltered = len(unfiltered_bins) * \
         int(numunfilteredbasecalls_dist['BinWidth'].metavalue)
     max_poly = len(poly_bins) * int(readlen_dist['BinWidth'].metavalue)
-    unfiltered_data = expand_data(unfiltered_bins, max_unfiltered)
-    poly_data = expand_data(poly_bins, max_poly)
+    unfiltered_edges = to_bin_edges(len(unfiltered_bins), max_unfiltered)
+    poly_edges = to_bin_edges(len(poly_bins), max_poly)
     fig, ax = get_fig_axes_lpr()
-    ax.hist(unfiltered_data, label="Unfiltered", histtype='stepfilled',
-            alpha=0.3, bins=len(unfiltered_bins), range=[0, max_unfiltered])
-    ax.hist(poly_data, label="Polymerase", histtype='stepfilled',
-            alpha=0.3, bins=len(poly_bins), range=[0, max_poly])
+    # the counts are already binned, so draw each bin once with its count
+    # as the weight instead of expanding them back into per-read values
+    ax.hist(unfiltered_edges[:-1], label="Unfiltered", histtype='stepfilled',
+            alpha=0.3, bins=unfiltered_edges, weights=unfiltered_bins)
+    ax.hist(poly_edges[:-1], label="Polymerase", histtype='stepfilled',
+            alpha=0.3, bins=poly_edges, weights=poly_bins)
     ax.set_xlabel(x_label)
     ax.set_ylabel(y_label)
     ax.legend()
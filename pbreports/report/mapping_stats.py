@@ -5,10 +5,13 @@ Blasr/pbalign.
 """
 
 from collections import OrderedDict
+import zipfile
+import json
 import sys
 import os
 import os.path as op
 import math
+import tempfile
 import time
 import functools
 import logging
@@ -24,11 +27,15 @@ from pbcommand.utils import setup_log
 from pbcore.io import openAlignmentFile, openDataSet, openDataFile
 from pbcore.io import AlignmentSet, ConsensusAlignmentSet, SubreadSet
 
-from pbreports.plot.rainbow import make_rainbow_plot
+from pbreports.plot.rainbow import (RainbowConsumer,
+                                    make_rainbow_plot_from_consumer)
 from pbreports.plot.helper import get_blue, get_green
 from pbreports.util import compute_n50_from_bins
-from pbreports.io.align import (alignment_info_from_bam, from_alignment_file,
-                                CrunchedAlignments)
+from pbreports.io.align import (alignment_info_from_pbi, from_alignment_file,
+                                CrunchedAlignments, AlignmentSetCollector,
+                                PbiConsumer)
+from pbreports.io.pbi_cache import PbiMemo, pbi_checksum
+from pbreports.io.report_cache import cached_result, run_cached_report
 from pbreports.report.streaming_utils import (PlotViewProperties,
                                               to_plot_groups, get_percentile,
                                               generate_plot)
@@ -331,6 +338,18 @@ class ReadLengthHistogram(_BaseHistogram):
             self.bins[i] += 1
 
 
+def _add_to_length_bins(bins, lengths):
+    """
+    Count each length in the unit-width bin at its index, growing the bins
+    if needed.
+    """
+    counts = np.bincount(np.asarray(lengths).astype(int))
+    if counts.size > bins.size:
+        bins = np.concatenate([bins, np.zeros(counts.size - bins.size)])
+    bins[:counts.size] += counts
+    return bins
+
+
 class N50Aggreggator(BaseAggregator, AttributeAble):
     DATA_TYPE = READ_TYPE
 
@@ -345,10 +364,7 @@ class N50Aggreggator(BaseAggregator, AttributeAble):
         return "<{k} nbins:{n} attribute:{a} >".format(**_d)
 
     def apply(self, npa):
-        for value in npa:
-            if int(value) >= self.bins.size:
-                self.bins.resize(int(value) + 1)
-            self.bins[int(value)] += 1
+        self.bins = _add_to_length_bins(self.bins, npa)
 
     @property
     def attribute(self):
@@ -362,10 +378,7 @@ class SubreadN50Aggregator(BaseAggregator, AttributeAble):
         self.bins = np.zeros(max_bins)
 
     def apply(self, crunched_npa):
-        for value in crunched_npa['Length']:
-            if int(value) >= self.bins.size:
-                self.bins.resize(int(value) + 1)
-            self.bins[int(value)] += 1
+        self.bins = _add_to_length_bins(self.bins, crunched_npa['Length'])
 
     @property
     def attribute(self):
@@ -484,6 +497,24 @@ class SubReadlengthHistogram(_BaseHistogram):
                 self.bins.resize(i + 1)
             self.bins[i] += 1
 
+    def rebinned(self, dx):
+        """
+        Copy of the histogram with bins of width dx, a multiple of self.dx.
+        Lengths are binned by ceil(length / dx), so with dx = n * self.dx
+        bin i moves to bin ceil(i / n).
+        """
+        n = int(round(dx / float(self.dx)))
+        if n < 1 or n * self.dx != dx:
+            raise ValueError("Can't rebin from dx {d} to {x}".format(
+                d=self.dx, x=dx))
+        counts = np.bincount(-(-np.arange(self.nbins) // n),
+                             weights=self.bins)
+        other = self.__class__(dx=dx)
+        if counts.size > other.nbins:
+            other.bins.resize(counts.size)
+        other.bins[:counts.size] += counts.astype(other.bins.dtype)
+        return other
+
 
 class SubReadConcordanceHistogram(_BaseHistogram):
     DATA_TYPE = SUBREAD_TYPE
@@ -615,20 +646,181 @@ def _process_movie_data(movie, alignment_file, stats_models, movie_names,
             pass
 
 
-def analyze_movies(movies, alignment_file_names, stats_models):
-    all_results = []
-    log.info("collecting data from {n} BAM files...".format(
-             n=len(alignment_file_names)))
-    for file_name in alignment_file_names:
-        log.info("reading {f}.pbi".format(f=file_name))
-        results = alignment_info_from_bam(file_name)
+class MovieStatsConsumer(PbiConsumer):
+    """
+    Applies the statistics models to the alignments of each movie, as part
+    of an AlignmentSetCollector pass.
+    """
+
+    def __init__(self, stats_models):
+        self.stats_models = stats_models
+
+    def consume(self, bam_file_name, pbi):
+        results = alignment_info_from_pbi(bam_file_name, pbi)
         for movie, aln_info in results.iteritems():
-            log.info("Analyzing Movie {n} in {f}".format(n=movie, f=file_name))
+            log.info("Analyzing Movie {n} in {f}".format(n=movie,
+                                                         f=bam_file_name))
             args = from_alignment_file(aln_info)
-            _process_movie_data(movie, file_name, stats_models, *args)
+            _process_movie_data(movie, bam_file_name, self.stats_models,
+                                *args)
+
+
+def analyze_movies(movies, alignment_file_names, stats_models,
+                   consumers=(), memo=None):
+    """
+    Run the statistics models over the alignments, along with any other
+    PbiConsumers that should share the same pass over the pbi files.
+
+    :param memo: PbiMemo keeping the pbi columns for a later read
+    """
+    collector = AlignmentSetCollector(alignment_file_names, memo=memo)
+    collector.register(MovieStatsConsumer(stats_models))
+    for consumer in consumers:
+        collector.register(consumer)
+    log.info("collecting data from {n} BAM files...".format(
+             n=len(alignment_file_names)))
+    collector.run()
     log.info("Completed analyzing {n} movies.".format(n=len(movies)))
 
 
+class AggregatorState(object):
+    """
+    Aggregators of the alignment files already analyzed, persisted between
+    runs of the report on a growing AlignmentSet so that each run only
+    reads the resources added since the last one.
+    """
+
+    def __init__(self, kind, resources, total_aggregators, movie_aggregators,
+                 rainbow):
+        """
+        :param kind: collector class and version that wrote the state
+        :param resources: dict of alignment file name to the size, mtime
+        and checksum of its pbi
+        :param total_aggregators: OrderedDict of id to aggregator
+        :param movie_aggregators: dict of movie name to aggregators
+        :param rainbow: RainbowConsumer
+        """
+        self.kind = kind
+        self.resources = resources
+        self.total_aggregators = total_aggregators
+        self.movie_aggregators = movie_aggregators
+        self.rainbow = rainbow
+
+    def __repr__(self):
+        _d = dict(k=self.__class__.__name__,
+                  n=len(self.resources),
+                  m=len(self.movie_aggregators))
+        return "<{k} nresources:{n} nmovies:{m} >".format(**_d)
+
+
+def _aggregator_to_dict(aggregator, arrays):
+    """
+    Plain data describing an aggregator, its class name and attributes.
+    Array attributes are added to arrays and referenced by key.
+    """
+    attrs = {}
+    for name, value in vars(aggregator).iteritems():
+        if isinstance(value, np.ndarray):
+            key = "a{i}".format(i=len(arrays))
+            arrays[key] = value
+            attrs[name] = dict(array=key)
+        elif isinstance(value, type):
+            # the dtype of a histogram
+            attrs[name] = dict(dtype=np.dtype(value).name)
+        elif isinstance(value, np.generic):
+            attrs[name] = dict(value=value.item())
+        else:
+            attrs[name] = dict(value=value)
+    return dict(klass=aggregator.__class__.__name__, attrs=attrs)
+
+
+def _aggregator_from_dict(d, arrays):
+    klass = globals().get(d["klass"])
+    if not (isinstance(klass, type) and issubclass(klass, BaseAggregator)):
+        raise ValueError("Unknown aggregator class {k}".format(k=d["klass"]))
+    aggregator = klass.__new__(klass)
+    for name, attr in d["attrs"].iteritems():
+        if "array" in attr:
+            # a copy, so that histograms can grow their bins in place
+            value = np.array(arrays[attr["array"]])
+        elif "dtype" in attr:
+            value = getattr(np, attr["dtype"])
+        else:
+            value = attr["value"]
+        setattr(aggregator, str(name), value)
+    return aggregator
+
+
+def _state_to_arrays(state):
+    """
+    Plain-data form of an AggregatorState: a dict of numpy arrays, with the
+    description of the aggregators as JSON under "meta".  This is what is
+    saved to state files and to the report cache.
+    """
+    arrays = {}
+    meta = dict(
+        kind=state.kind,
+        resources=state.resources,
+        total=[[id_, _aggregator_to_dict(aggregator, arrays)]
+               for id_, aggregator in state.total_aggregators.iteritems()],
+        movies={movie: [_aggregator_to_dict(a, arrays) for a in aggregators]
+                for movie, aggregators in state.movie_aggregators.iteritems()},
+        rainbow_reference=state.rainbow.reference)
+    arrays["rainbow"] = state.rainbow.to_array()
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+def _state_from_arrays(arrays):
+    """
+    Rebuild an AggregatorState from the arrays written by _state_to_arrays
+    (a dict, or the NpzFile they were saved to).
+    """
+    meta = json.loads(arrays["meta"].item())
+    reference = meta["rainbow_reference"]
+    rainbow = RainbowConsumer(None if reference is None else str(reference))
+    rainbow.add_array(arrays["rainbow"])
+    return AggregatorState(
+        str(meta["kind"]),
+        {str(f): r for f, r in meta["resources"].iteritems()},
+        OrderedDict([(str(id_), _aggregator_from_dict(d, arrays))
+                     for id_, d in meta["total"]]),
+        {str(movie): [_aggregator_from_dict(d, arrays) for d in ds]
+         for movie, ds in meta["movies"].iteritems()},
+        rainbow)
+
+
+def load_aggregator_state(file_name):
+    """Load an AggregatorState, or None if file_name is missing or invalid"""
+    if not op.exists(file_name):
+        return None
+    try:
+        with np.load(file_name, allow_pickle=False) as npz:
+            return _state_from_arrays(npz)
+    except (IOError, ValueError, KeyError, zipfile.BadZipfile) as e:
+        log.warn("Unable to load aggregator state from {f}: {e}".format(
+            f=file_name, e=e))
+        return None
+
+
+def write_aggregator_state(file_name, state):
+    """
+    Write the state (as plain arrays, see _state_to_arrays) to a temporary
+    file and move it into place, so that an interrupted run never leaves a
+    partial state behind.
+    """
+    dir_name = op.dirname(op.abspath(file_name))
+    fd, tmp_file = tempfile.mkstemp(dir=dir_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **_state_to_arrays(state))
+        os.rename(tmp_file, file_name)
+    except Exception:
+        os.remove(tmp_file)
+        raise
+    log.info("Wrote {s} to {f}".format(s=repr(state), f=file_name))
+
+
 def get_attributes(aggregators_d):
 
     attributes = []
@@ -686,10 +878,15 @@ class MappingStatsCollector(object):
         MeanSubreadConcordanceAggregator
     ]
 
-    def __init__(self, alignment_file, subreads_file=None):
+    # keep the pbi columns of the analysis for add_more_plots
+    MEMO_PBI_COLUMNS = False
+
+    def __init__(self, alignment_file, subreads_file=None, state_file=None):
         self.alignment_file = alignment_file
         self.subreads_file = subreads_file
+        self.state_file = state_file
         self.dataset_uuids = []
+        self.pbi_memo = PbiMemo() if self.MEMO_PBI_COLUMNS else None
         if alignment_file.endswith('.xml'):
             log.debug('Importing alignments from dataset XML')
             alignment_set = openDataSet(alignment_file)
@@ -716,15 +913,8 @@ class MappingStatsCollector(object):
             with SubreadSet(subreads_file) as subreads_ds:
                 self.dataset_uuids.append(subreads_ds.uuid)
 
-    def _get_subread_length_histogram_bin_width(self):
+    def _get_subread_length_histogram_bin_width(self, subread_length_max):
         BIN_SIZES = [100, 200, 500]
-        subread_length_max = 0
-        with openDataFile(self.alignment_file) as ds:
-            for rr in ds.resourceReaders():
-                if len(rr) == 0:
-                    continue
-                subread_length_max = max(subread_length_max,
-                                         (rr.pbi.aEnd - rr.pbi.aStart).max())
         for bin_width in BIN_SIZES:
             if (subread_length_max / float(bin_width)) < 100:
                 return bin_width
@@ -791,7 +981,6 @@ class MappingStatsCollector(object):
         return {v.plot_id: v for v in _p}
 
     def _get_total_aggregators(self):
-        dx_subreads = self._get_subread_length_histogram_bin_width()
         return OrderedDict([
             (Constants.A_SUBREAD_CONCORDANCE, MeanSubreadConcordanceAggregator()),
             (Constants.A_NSUBREADS, SubreadCounterAggregator()),
@@ -810,12 +999,30 @@ class MappingStatsCollector(object):
             (Constants.A_READLENGTH_MAX, MaxReadLengthAggregator()),
             #'mapped_subread_read_quality_mean', MeanSubreadQualityAggregator()),
             (Constants.P_READLENGTH_HIST, ReadLengthHistogram(dx=500)),
-            (Constants.P_SUBREAD_LENGTH_HIST,
-             SubReadlengthHistogram(dx=dx_subreads)),
+            # collected at the finest bin width and rebinned once the max
+            # subread length is known, see _get_plot_aggregators
+            (Constants.P_SUBREAD_LENGTH_HIST, SubReadlengthHistogram(dx=100)),
             (Constants.P_SUBREAD_CONCORDANCE_HIST, SubReadConcordanceHistogram(dx=0.005,
                                                                                nbins=1001))
         ])
 
+    def _get_plot_aggregators(self, total_aggregators):
+        """
+        Histogram aggregators by plot id, with the subread length histogram
+        rebinned to the bin width for the max subread length.
+        """
+        aggregators = {}
+        for plot_id, hist_id in self.HISTOGRAM_IDS.iteritems():
+            aggregator = total_aggregators[hist_id]
+            if hist_id == Constants.P_SUBREAD_LENGTH_HIST:
+                subread_length_max = total_aggregators[
+                    Constants.A_SUBREAD_LENGTH_MAX].value
+                aggregator = aggregator.rebinned(
+                    self._get_subread_length_histogram_bin_width(
+                        subread_length_max))
+            aggregators[plot_id] = aggregator
+        return aggregators
+
     def _to_table(self, movie_datum):
         """
         Create a pbreports Table for each movie.
@@ -874,27 +1081,63 @@ class MappingStatsCollector(object):
     def _get_rainbow_plot_x_label(self):
         return get_plot_xlabel(spec, Constants.PG_RAINBOW, Constants.P_RAINBOW)
 
-    def to_report(self, output_dir, report_id=Constants.R_ID):
-        """
-        This needs to be cleaned up. Keeping the old interface for testing purposes.
-        """
-        started_at = time.time()
+    def _get_state_kind(self):
+        return "{m}.{k} {v}".format(m=self.__class__.__module__,
+                                    k=self.__class__.__name__, v=__version__)
 
-        log.info("Found {n} movies.".format(n=len(self.movies)))
+    def _new_state(self):
+        return AggregatorState(self._get_state_kind(), {},
+                               self._get_total_aggregators(), {},
+                               RainbowConsumer())
 
-        log.info("Working from {n} alignment file{s}: {f}".format(
-            n=len(self.alignment_file_list),
-            s='s' if len(self.alignment_file_list) > 1 else '',
-            f=self.alignment_file_list))
-
-        # make this a dict {attribute_key_name:Aggreggator} so it's easy to
-        # access the instances after they've been computed.
-        # there's duplicated keys in the attributes?
-        # number_of_aligned_reads/mapped_reads_n
-        _total_aggregators = self._get_total_aggregators()
+    def _get_resources(self, saved_resources):
+        """
+        The size, mtime and checksum of the pbi of each alignment file.  Only
+        the pbis that are new or changed since saved_resources are hashed.
+        """
+        resources = {}
+        for file_name in self.alignment_file_list:
+            pbi_file_name = file_name + ".pbi"
+            st = os.stat(pbi_file_name)
+            saved = saved_resources.get(file_name)
+            if saved is not None and saved[:2] == [st.st_size, st.st_mtime]:
+                resources[file_name] = saved
+            else:
+                resources[file_name] = [st.st_size, st.st_mtime,
+                                        pbi_checksum(pbi_file_name)]
+        return resources
+
+    def _load_state(self):
+        """
+        Load the saved state, with the resources of the alignment files (see
+        _get_resources).  The state is None if it can't be carried forward
+        to them.
+        """
+        state = load_aggregator_state(self.state_file)
+        if state is not None and state.kind != self._get_state_kind():
+            log.info("{f} was written by {k}, starting over".format(
+                f=self.state_file, k=state.kind))
+            state = None
+        if state is None:
+            return None, self._get_resources({})
+        resources = self._get_resources(state.resources)
+        changed = [f for f, saved in state.resources.iteritems()
+                   if f not in resources or resources[f][2] != saved[2]]
+        if len(changed) > 0:
+            log.warn("Resources {r} were removed or modified since {f} was "
+                     "written, starting over".format(r=changed,
+                                                     f=self.state_file))
+            return None, resources
+        return state, resources
+
+    def _analyze_files(self, state, file_names):
+        """
+        Run the statistics models over the alignments of file_names, adding
+        them to the aggregators of the state.
+        """
         null_filter = lambda r: True
         total_model = StatisticsModel(
-            _total_aggregators.values(), filter_func=null_filter)
+            state.total_aggregators.values(), filter_func=null_filter)
 
         # need to create specific instances for a given movie. This is used to
         # create the mapping reports stats table
@@ -904,7 +1147,10 @@ class MappingStatsCollector(object):
             return movie_name1 == movie_name2
 
         for movie in self.movies:
-            ags = [k() for k in self.COLUMN_AGGREGATOR_CLASSES]
+            ags = state.movie_aggregators.get(movie)
+            if ags is None:
+                ags = [k() for k in self.COLUMN_AGGREGATOR_CLASSES]
+                state.movie_aggregators[movie] = ags
             # Note this WILL NOT work because of how scope works in python
             # filter_by_movie_func = lambda m_name: movie.name == m_name
             _my_filter_func = functools.partial(_my_filter, movie)
@@ -915,9 +1161,59 @@ class MappingStatsCollector(object):
         all_models = [total_model] + movie_models.values()
         log.debug(all_models)
 
-        # Run all the analysis. Now the aggregators can be accessed
+        # the rainbow plot data is gathered in the same pass
+        analyze_movies(self.movies, file_names, all_models,
+                       consumers=[state.rainbow], memo=self.pbi_memo)
 
-        analyze_movies(self.movies, self.alignment_file_list, all_models)
+    def _analyze(self):
+        """
+        Run the statistics models over the alignments.  With a state file,
+        only the resources added since it was written are analyzed.
+
+        :returns: AggregatorState
+        """
+        if self.state_file is None:
+            state = self._new_state()
+            self._analyze_files(state, self.alignment_file_list)
+        else:
+            state, resources = self._load_state()
+            if state is None:
+                state = self._new_state()
+            new_files = [f for f in self.alignment_file_list
+                         if f not in state.resources]
+            log.info("Analyzing {n} of {m} alignment files".format(
+                n=len(new_files), m=len(self.alignment_file_list)))
+            self._analyze_files(state, new_files)
+            state.resources = resources
+            write_aggregator_state(self.state_file, state)
+        return state
+
+    def to_report(self, output_dir, report_id=Constants.R_ID):
+        """
+        This needs to be cleaned up. Keeping the old interface for testing purposes.
+        """
+        started_at = time.time()
+
+        log.info("Found {n} movies.".format(n=len(self.movies)))
+
+        log.info("Working from {n} alignment file{s}: {f}".format(
+            n=len(self.alignment_file_list),
+            s='s' if len(self.alignment_file_list) > 1 else '',
+            f=self.alignment_file_list))
+
+        # the aggregates don't depend on the report spec, so they are cached
+        # apart from the report (the state file takes the place of the cache)
+        if self.state_file is None:
+            state = _state_from_arrays(cached_result(
+                "{m}.{k}".format(m=self.__class__.__module__,
+                                 k=self.__class__.__name__),
+                lambda: _state_to_arrays(self._analyze()),
+                [self.alignment_file], __version__))
+        else:
+            state = self._analyze()
+        _total_aggregators = state.total_aggregators
+        movie_aggregators = state.movie_aggregators
+        rainbow = state.rainbow
 
         # temp structure used to create the report table. The order is
         # important
@@ -929,9 +1225,9 @@ class MappingStatsCollector(object):
         movie_datum = [_row]
 
         # Add each individual movie stats
-        for movie_name_, model_ in movie_models.iteritems():
+        for movie_name_, aggregators_ in movie_aggregators.iteritems():
             _row = [movie_name_]
-            for a in model_.aggregators:
+            for a in aggregators_:
                 _row.append(a.attribute)
             movie_datum.append(_row)
         log.info(movie_datum)
@@ -940,14 +1236,14 @@ class MappingStatsCollector(object):
 
         table = self._to_table(movie_datum)
 
-        for movie_name, model in movie_models.iteritems():
+        for movie_name, aggregators in movie_aggregators.iteritems():
             log.info("Movie name {n}".format(n=movie_name))
-            for a in model.aggregators:
+            for a in aggregators:
                 log.info(movie_name + " " + repr(a))
 
         log.info("")
         log.info("Total models")
-        for a in total_model.aggregators:
+        for a in _total_aggregators.values():
             log.info(a)
 
         attributes = get_attributes(_total_aggregators)
@@ -960,19 +1256,17 @@ class MappingStatsCollector(object):
         plot_config_views = self._get_plot_view_configs()
         plot_groups = []
 
-        ds = openDataFile(self.alignment_file)
-        ds.updateCounts()
-        if len(ds) > 0:
+        if len(rainbow) > 0:
             # keeping the ids independent requires a bit of dictionary madness
             # {report_id:HistogramAggregator}
-            id_to_aggregators = {k: _total_aggregators[v]
-                                 for k, v in self.HISTOGRAM_IDS.iteritems()}
+            id_to_aggregators = self._get_plot_aggregators(_total_aggregators)
             plot_groups = to_plot_groups(plot_config_views, output_dir,
                                          id_to_aggregators)
             rb_pg = PlotGroup(Constants.PG_RAINBOW)
             rb_png = "mapped_concordance_vs_read_length.png"
-            make_rainbow_plot(self.alignment_file, op.join(output_dir, rb_png),
-                              x_label=self._get_rainbow_plot_x_label())
+            make_rainbow_plot_from_consumer(
+                rainbow, op.join(output_dir, rb_png),
+                x_label=self._get_rainbow_plot_x_label())
             rb_plt = Plot(Constants.P_RAINBOW, rb_png)
             rb_pg.add_plot(rb_plt)
             plot_groups.append(rb_pg)
@@ -992,8 +1286,9 @@ class MappingStatsCollector(object):
         return report
 
 
-def to_report(alignment_file, output_dir, subreads_file=None):
-    return spec.apply_view(MappingStatsCollector(alignment_file, subreads_file).to_report(output_dir))
+def to_report(alignment_file, output_dir, subreads_file=None,
+              state_file=None):
+    return spec.apply_view(MappingStatsCollector(alignment_file, subreads_file, state_file).to_report(output_dir))
 
 
 def summarize_report(report_file, out=sys.stdout):
@@ -1014,17 +1309,25 @@ def summarize_report(report_file, out=sys.stdout):
 
 
 def run_and_write_report(alignment_file, json_report, report_func=to_report,
-                         subreads_file=None):
+                         subreads_file=None, report_id=Constants.R_ID,
+                         version=__version__, state_file=None):
     output_dir = os.path.dirname(json_report)
-    report = report_func(alignment_file, output_dir,
-                         subreads_file=subreads_file)
-    report.write_json(json_report)
-    log.info("Wrote output to %s" % json_report)
-    return 0
+
+    def _run_report():
+        report = report_func(alignment_file, output_dir,
+                             subreads_file=subreads_file,
+                             state_file=state_file)
+        report.write_json(json_report)
+        log.info("Wrote output to %s" % json_report)
+        return 0
+
+    return run_cached_report(_run_report, json_report, report_id, version,
+                             [alignment_file, subreads_file])
 
 
 def _args_runner(args):
-    return run_and_write_report(args.alignment_file, args.report_json)
+    return run_and_write_report(args.alignment_file, args.report_json,
+                                state_file=args.state_file)
 
 
 def _resolved_tool_contract_runner(rtc):
@@ -1040,6 +1343,15 @@ def _resolved_tool_contract_runner(rtc):
         json_report=rtc.task.output_files[0])
 
 
+def add_state_file_option(parser):
+    parser.arg_parser.parser.add_argument(
+        "--state-file", default=None,
+        help="File saving the statistics of the alignment files analyzed, "
+             "so that re-running the report on an AlignmentSet with added "
+             "resources only analyzes the new ones.  Command line only, "
+             "tool contract tasks always analyze every resource")
+
+
 def _get_parser():
     desc = "Create a Mapping Report from a Aligned BAM or Alignment DataSet"
     driver_exe = "python -m pbreports.report.mapping_stats --resolved-tool-contract "
@@ -1052,6 +1364,7 @@ def _get_parser():
     parser.add_output_file_type(FileTypes.REPORT, "report_json",
                                 "Mapping Statistics Report",
                                 "Summary of alignment results", Constants.R_ID)
+    add_state_file_option(parser)
 
     return parser
 
@@ -16,6 +16,7 @@ from pbreports.plot.helper import (get_fig_axes_lpr, apply_line_data, Line)
 from pbreports.report.mapping_stats import *
 from pbreports.report.mapping_stats import Constants as BaseConstants
 from pbreports.report.ccs import create_plot
+from pbreports.io.pbi_cache import load_pbi_columns
 from pbreports.io.specs import *
 
 
@@ -97,6 +98,9 @@ class CCSMappingStatsCollector(MappingStatsCollector):
         MeanSubreadConcordanceAggregator
     ]
 
+    # the QV calibration plot reads the pbis again
+    MEMO_PBI_COLUMNS = True
+
     def _get_plot_view_configs(self):
         """
         There are just two histogram plots in this report:
@@ -155,11 +159,11 @@ class CCSMappingStatsCollector(MappingStatsCollector):
 
     def add_more_plots(self, plot_groups, output_dir):
         try:
-            ds = ConsensusAlignmentSet(self.alignment_file)
             accuracy, concordance = [], []
-            for bam in ds.resourceReaders():
-                accuracy.extend(list(bam.pbi.readQual))
-                concordance.extend(list(bam.identity))
+            for file_name in self.alignment_file_list:
+                pbi = load_pbi_columns(file_name, memo=self.pbi_memo)
+                accuracy.extend(list(pbi.readQual))
+                concordance.extend(list(pbi.identity))
             qv_validation_plot = create_plot(
                 _make_plot_func=scatter_plot_accuracy_vs_concordance,
                 plot_id=Constants.P_QV_CALIBRATION,
@@ -182,13 +186,17 @@ class CCSMappingStatsCollector(MappingStatsCollector):
         return plot_groups
 
 
-def to_report(alignment_file, output_dir, subreads_file=None):
-    return ccs_spec.apply_view(CCSMappingStatsCollector(alignment_file).to_report(output_dir, Constants.R_ID))
+def to_report(alignment_file, output_dir, subreads_file=None,
+              state_file=None):
+    return ccs_spec.apply_view(CCSMappingStatsCollector(alignment_file, state_file=state_file).to_report(output_dir, Constants.R_ID))
 
 
 def _args_runner(args):
     return run_and_write_report(args.alignment_file, args.report_json,
-                                report_func=to_report)
+                                report_func=to_report,
+                                report_id=Constants.R_ID,
+                                version=__version__,
+                                state_file=args.state_file)
 
 
 def _resolved_tool_contract_runner(resolved_contract):
@@ -208,7 +216,9 @@ def _resolved_tool_contract_runner(resolved_contract):
     output_report = resolved_contract.task.output_files[0]
 
     return run_and_write_report(alignment_path, output_report,
-                                report_func=to_report)
+                                report_func=to_report,
+                                report_id=Constants.R_ID,
+                                version=__version__)
 
 
 def _get_parser():
@@ -222,6 +232,7 @@ def _get_parser():
                                 "Mapping Statistics Report",
                                 "Summary of alignment results",
                                 default_name=Constants.R_ID)
+    add_state_file_option(parser)
     return parser
 
 
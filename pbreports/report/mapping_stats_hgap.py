@@ -24,15 +24,18 @@ class Constants(BaseConstants):
 spec = load_spec(Constants.R_ID)
 
 
-def to_report(alignment_file, output_dir, subreads_file):
-    return spec.apply_view(MappingStatsCollector(alignment_file, subreads_file).to_report(output_dir, Constants.R_ID))
+def to_report(alignment_file, output_dir, subreads_file, state_file=None):
+    return spec.apply_view(MappingStatsCollector(alignment_file, subreads_file, state_file).to_report(output_dir, Constants.R_ID))
 
 
 def _args_runner(args):
     return run_and_write_report(args.alignment_file,
                                 args.report_json,
                                 report_func=to_report,
-                                subreads_file=args.subreads_file)
+                                subreads_file=args.subreads_file,
+                                report_id=Constants.R_ID,
+                                version=__version__,
+                                state_file=args.state_file)
 
 
 def _resolved_tool_contract_runner(resolved_contract):
@@ -41,7 +44,9 @@ def _resolved_tool_contract_runner(resolved_contract):
     output_report = resolved_contract.task.output_files[0]
     return run_and_write_report(alignment_path, output_report,
                                 report_func=to_report,
-                                subreads_file=subreads_path)
+                                subreads_file=subreads_path,
+                                report_id=Constants.R_ID,
+                                version=__version__)
 
 
 def _get_parser():
@@ -58,6 +63,7 @@ def _get_parser():
                                 "Mapping Statistics Report",
                                 "Summary of alignment results",
                                 default_name=Constants.R_ID)
+    add_state_file_option(parser)
     return parser
 
 
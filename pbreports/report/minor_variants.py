@@ -9,7 +9,6 @@ import logging
 import sys
 import csv
 import itertools
-import json
 
 import numpy as np
 
@@ -17,6 +16,7 @@ from pbcommand.models.report import Report, Table, Column
 from pbcommand.models import FileTypes, get_pbparser
 from pbcommand.cli import pbparser_runner
 from pbcommand.utils import setup_log
+from pbreports.io.json_stream import iter_json_object
 from pbreports.io.specs import *
 
 __version__ = '0.1.1'
@@ -72,6 +72,12 @@ def get_hap_vals(hap_hits, hap_vals, _type):
     return haps
 
 
+def iter_juliet_summary(file_obj, chunk_size=2 ** 20):
+    """Yields the (sample name, sample details) pairs of a juliet summary
+       JSON in file order, decoding one sample at a time"""
+    return iter_json_object(file_obj, chunk_size)
+
+
 def to_variant_table(juliet_summary):
     samples = []
     positions = []
@@ -126,19 +132,22 @@ def join_col(col):
     return joined_col
 
 
+def _variant_table_header():
+    return [spec.get_table_spec(Constants.T_VARIANTS).get_column_spec(
+        c_id).header for c_id in Constants.VARIANTS_COL_IDS]
+
+
+def _write_variant_rows(writer, variant_table):
+    variant_table_csv = variant_table[:7] + \
+        [join_col(col) for col in variant_table[7:]]
+    writer.writerows(itertools.izip(*variant_table_csv))
+
+
 def write_variant_table(variant_table, file_name):
-    header_row = []
-    for c_id in Constants.VARIANTS_COL_IDS:
-        header_row.append(spec.get_table_spec(
-            Constants.T_VARIANTS).get_column_spec(c_id).header)
-    variant_table_csv = variant_table[:]
-    for i in [7, 8, 9]:
-        variant_table_csv[i] = join_col(variant_table_csv[i])
-    variant_table_csv_tr = zip(*variant_table_csv)
     with open(file_name, 'w') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(header_row)
-        [writer.writerow(r) for r in variant_table_csv_tr]
+        writer.writerow(_variant_table_header())
+        _write_variant_rows(writer, variant_table)
 
 
 def _round(freqs):
@@ -148,8 +157,8 @@ def _round(freqs):
     return rounded
 
 
-def to_rpt_variant_table(variant_table):
-
+def _to_rpt_variant_columns(variant_table):
+    """Formats the variant table columns for display in the report"""
     variant_table_r = variant_table[:]
 
     variant_table_r[9] = map(lambda x: _round(x), variant_table_r[9])
@@ -157,6 +166,10 @@ def to_rpt_variant_table(variant_table):
     for i in [7, 8, 9]:
         variant_table_r[i] = join_col(variant_table_r[i])
 
+    return variant_table_r
+
+
+def _to_rpt_variant_table(variant_table_r):
     columns = []
     for i, col_id in enumerate(Constants.VARIANTS_COL_IDS):
         columns.append(Column(col_id, values=variant_table_r[i]))
@@ -166,45 +179,71 @@ def to_rpt_variant_table(variant_table):
     return variant_table_rpt
 
 
-def my_agg(my_list, _func):
-    """Performs the specified function on an array of arrays, 
-       returning None in the case of a ValueError"""
-    try:
-        return _func([i for i in itertools.chain(*my_list)])
-    except ValueError:
-        # case for max of empty list
-        return None
+def to_rpt_variant_table(variant_table):
+    return _to_rpt_variant_table(_to_rpt_variant_columns(variant_table))
+
+
+def _flatten_by_group(codes, col):
+    """Flattens a column of lists, repeating the group code of each row
+       once per item"""
+    lengths = np.fromiter((len(item) for item in col), dtype=int,
+                          count=len(col))
+    flat = list(itertools.chain.from_iterable(col))
+    return np.repeat(codes, lengths), flat
+
+
+def _count_unique_by_group(codes, values, ngroups):
+    """Returns the number of distinct values in each group"""
+    if len(values) == 0:
+        return np.zeros(ngroups, dtype=int)
+    _, value_codes = np.unique(values, return_inverse=True)
+    nvalues = value_codes.max() + 1
+    pairs = np.unique(codes * nvalues + value_codes)
+    return np.bincount(pairs // nvalues, minlength=ngroups)
+
+
+def _median_by_group(codes, values, ngroups):
+    """Returns the median value of each (non-empty) group"""
+    order = np.lexsort((values, codes))
+    values = np.asarray(values)[order]
+    counts = np.bincount(codes, minlength=ngroups)
+    starts = np.cumsum(counts) - counts
+    lo = values[starts + (counts - 1) // 2]
+    hi = values[starts + counts // 2]
+    return (lo + hi) / 2.0
+
+
+def _max_by_group(codes, values, ngroups):
+    """Returns the maximum value of each group, or None for empty groups"""
+    maxima = np.full(ngroups, -np.inf)
+    np.maximum.at(maxima, codes, values)
+    counts = np.bincount(codes, minlength=ngroups)
+    return [float(v) if n > 0 else None for v, n in zip(maxima, counts)]
 
 
 def aggregate_variant_table(variant_table):
 
-    samples = []
-    coverage = []
-    variants = []
-    genes = []
-    drms = []
-    haplotypes = []
-    max_hap_freq = []
-
-    for sample in set(variant_table[0]):
-        indices = [i for i, x in enumerate(variant_table[0]) if x == sample]
-        _coverage = [variant_table[5][i] for i in indices]
-        _genes = [variant_table[6][i] for i in indices]
-        _drms = [variant_table[7][i] for i in indices]
-        _haplotypes = [variant_table[8][i] for i in indices]
-        _max_hap_freq = [variant_table[9][i] for i in indices]
-
-        samples.append(str(sample))
-        coverage.append(int(np.median(_coverage)))
-        variants.append(len(_coverage))
-        genes.append(len(np.unique(_genes)))
-        drms.append(len(my_agg(_drms, np.unique)))
-        haplotypes.append(len(my_agg(_haplotypes, np.unique)))
-        agg_max_hap_freq = my_agg(_max_hap_freq, max)
-        if agg_max_hap_freq is not None:
-            max_hap_freq.append(float(my_agg(_max_hap_freq, max)))
-        else:
-            max_hap_freq.append(None)
+    # factorize the samples once, keeping the existing set() row order
+    samples = [str(sample) for sample in set(variant_table[0])]
+    sample_codes = {sample: i for i, sample in enumerate(samples)}
+    codes = np.fromiter((sample_codes[x] for x in variant_table[0]),
+                        dtype=int, count=len(variant_table[0]))
+    nsamples = len(samples)
+
+    coverage = [int(c) for c in _median_by_group(
+        codes, variant_table[5], nsamples)]
+    variants = np.bincount(codes, minlength=nsamples).tolist()
+    genes = _count_unique_by_group(
+        codes, variant_table[6], nsamples).tolist()
+    drms = _count_unique_by_group(
+        *_flatten_by_group(codes, variant_table[7]),
+        ngroups=nsamples).tolist()
+    haplotypes = _count_unique_by_group(
+        *_flatten_by_group(codes, variant_table[8]),
+        ngroups=nsamples).tolist()
+    max_hap_freq = _max_by_group(
+        *_flatten_by_group(codes, variant_table[9]),
+        ngroups=nsamples)
 
     sample_table = [samples, coverage, variants,
                     genes, drms, haplotypes, max_hap_freq]
@@ -212,10 +251,7 @@ def aggregate_variant_table(variant_table):
     return sample_table
 
 
-def to_sample_table(variant_table):
-
-    sample_table = aggregate_variant_table(variant_table)
-
+def _to_rpt_sample_table(sample_table):
     columns = []
     for i, col_id in enumerate(Constants.SAMPLES_COL_IDS):
         columns.append(Column(col_id, values=sample_table[i]))
@@ -225,19 +261,38 @@ def to_sample_table(variant_table):
     return sample_table_r
 
 
+def to_sample_table(variant_table):
+    return _to_rpt_sample_table(aggregate_variant_table(variant_table))
+
+
 def to_report(juliet_summary_file, csv_file, output_dir):
     log.info("Starting {f} v{v}".format(f=os.path.basename(__file__),
                                         v=__version__))
 
-    with open(juliet_summary_file) as f:
-        juliet_summary = json.load(f)
-
-    variant_table = to_variant_table(juliet_summary)
-    write_variant_table(variant_table, csv_file)
-
-    rpt_variant_table = to_rpt_variant_table(variant_table)
-    sample_table = to_sample_table(variant_table)
-    tables = [sample_table, rpt_variant_table]
+    # The summary is processed one sample at a time: the CSV rows are
+    # written immediately and only the formatted report columns and the
+    # per-sample summary rows are kept.
+    rpt_columns = [[] for _ in Constants.VARIANTS_COL_IDS]
+    sample_rows = {}
+    with open(juliet_summary_file) as f, open(csv_file, 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(_variant_table_header())
+        for sample_name, sample_details in iter_juliet_summary(f):
+            variant_table = to_variant_table({sample_name: sample_details})
+            _write_variant_rows(writer, variant_table)
+            for column, values in zip(rpt_columns,
+                                      _to_rpt_variant_columns(variant_table)):
+                column.extend(values)
+            for row in zip(*aggregate_variant_table(variant_table)):
+                sample_rows[row[0]] = row
+
+    # same row order as aggregate_variant_table on the whole table
+    samples = list(set(rpt_columns[0]))
+    sample_table = [[sample_rows[sample][i] for sample in samples]
+                    for i in xrange(len(Constants.SAMPLES_COL_IDS))]
+
+    tables = [_to_rpt_sample_table(sample_table),
+              _to_rpt_variant_table(rpt_columns)]
 
     report = Report(Constants.R_ID, tables=tables)
 
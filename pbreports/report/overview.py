@@ -5,6 +5,7 @@
 Counts the number of movies and cells in the input dataset.
 """
 
+from multiprocessing.pool import ThreadPool
 import logging
 import sys
 
@@ -15,6 +16,7 @@ from pbcommand.utils import setup_log
 from pbcore.io import openDataSet, BamReader
 
 from pbreports.util import movie_to_cell, path_to_movie
+from pbreports.io.pbi_cache import cached_movie_names
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -29,23 +31,70 @@ class Constants(object):
     R_ID = "overview"
     A_NCELLS = "ncells"
     A_NMOVIES = "nmovies"
+    # read group tables read concurrently
+    MAX_HEADER_THREADS = 8
 
 spec = load_spec(Constants.R_ID)
 
 
+def _movies_from_header(file_name):
+    with BamReader(file_name) as bam:
+        return [rg["PU"] for rg in bam.peer.header["RG"]]
+
+
+def _movies_from_read_groups(file_name):
+    """
+    Movie names of the read groups of a BAM, from its pbi columns when they
+    are already loaded or cached, otherwise from its header.
+    """
+    movies = cached_movie_names(file_name)
+    if movies is None:
+        movies = _movies_from_header(file_name)
+    return movies
+
+
+def _movies_from_metadata(ds):
+    """Movie names recorded in the collection metadata of the dataset"""
+    try:
+        return set([c.context for c in ds.metadata.collections])
+    except (IndexError, AttributeError) as e:
+        log.debug(e)
+        return set([])
+
+
+def get_movie_names(ds, nthreads=Constants.MAX_HEADER_THREADS):
+    """
+    Get the movie names of a dataset from its collection metadata, when it
+    names the movie of every resource.  Collections without a resource
+    don't count, and the read groups of the other resources are read
+    instead (a merged BAM has several), concurrently in at most nthreads
+    threads.
+    """
+    file_names = ds.toExternalFiles()
+    resource_movies = set([path_to_movie(file_name)
+                           for file_name in file_names])
+    if type(ds).__name__ == "HdfSubreadSet":
+        return resource_movies
+    metadata_movies = _movies_from_metadata(ds)
+    movies = metadata_movies & resource_movies
+    file_names = [file_name for file_name in file_names
+                  if path_to_movie(file_name) not in metadata_movies]
+    if len(file_names) > 0:
+        pool = ThreadPool(min(nthreads, len(file_names)))
+        try:
+            for rg_movies in pool.map(_movies_from_read_groups, file_names):
+                movies.update(rg_movies)
+        finally:
+            pool.close()
+            pool.join()
+    return movies
+
+
 def run(dataset_file):
     """Reads in the input.fofn and counts movies and cells. Outputs in XML."""
 
     with openDataSet(dataset_file) as ds:
-        movies = None
-        movies = set([])
-        for file_name in ds.toExternalFiles():
-            if type(ds).__name__ == "HdfSubreadSet":
-                movies.add(path_to_movie(file_name))
-            else:
-                with BamReader(file_name) as bam:
-                    for rg in bam.peer.header["RG"]:
-                        movies.add(rg["PU"])
+        movies = get_movie_names(ds)
         cells = set([movie_to_cell(movie) for movie in movies])
         ncells_attr = Attribute(Constants.A_NCELLS, len(cells))
         nmovies_attr = Attribute(Constants.A_NMOVIES, len(movies))
@@ -14,10 +14,10 @@ from pbcommand.models.report import (Attribute, Report, Plot, PlotGroup,
 from pbcommand.models import FileTypes, get_pbparser
 from pbcommand.cli import pbparser_runner
 from pbcommand.utils import setup_log
-from pbcore.io import FastqReader, GffReader
 
-from pbreports.report.coverage import ContigCoverage
-from pbreports.util import compute_n50
+from pbreports.report.coverage import ContigCoverage, load_coverage_regions
+from pbreports.util import compute_n50, compute_esize
+from pbreports.io.fastx import fastq_stats
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -68,8 +68,7 @@ def make_polished_assembly_report(report, gff, fastq, output_dir):
 
     rep = Report(Constants.R_ID)
     rep.add_attribute(Attribute(Constants.A_N_CONTIGS, len(contigs)))
-    read_lengths = [c.length for c in contigs.values()]
-    read_lengths.sort()
+    read_lengths = np.sort([c.length for c in contigs.values()])
     rep.add_attribute(_get_att_max_contig_length(read_lengths))
     rep.add_attribute(_get_att_n_50_contig_length(read_lengths))
     rep.add_attribute(_get_att_sum_contig_lengths(read_lengths))
@@ -90,11 +89,11 @@ def _get_contigs(fastq):
     :return: (dict) contig id -> ContigInfo object
     """
     contigs = {}
-    fqr = FastqReader(fastq)
-    for rec in fqr:
+    stats = fastq_stats(fastq, with_names=True)
+    for name, length, mean_qv in zip(*stats):
         # remove quiver/arrow appended string, otherwise we can't cross
         # reference the name in the gff
-        cinf = ContigInfo(rec)
+        cinf = ContigInfo.from_stats(name, int(length), mean_qv)
         contigs[cinf.name] = cinf
 
     return contigs
@@ -160,7 +159,7 @@ def _get_att_max_contig_length(read_lengths):
     if l == 0:
         val = 0
     else:
-        val = read_lengths[l - 1]
+        val = int(read_lengths[l - 1])
     return Attribute(Constants.A_MAX_LEN, val)
 
 
@@ -169,7 +168,7 @@ def _get_att_sum_contig_lengths(read_lengths):
     Return the last member of the sorted list. 0 if read_lengths is empty.
     :param read_lengths: sorted list
     """
-    return Attribute(Constants.A_SUM_LEN, sum(read_lengths))
+    return Attribute(Constants.A_SUM_LEN, int(np.sum(read_lengths)))
 
 
 def _get_att_n_50_contig_length(read_lengths):
@@ -182,12 +181,7 @@ def _get_att_n_50_contig_length(read_lengths):
 
 
 def get_esize(read_lengths):
-    if not read_lengths:
-        return 0.0
-    else:
-        sum1 = sum(read_lengths)
-        sum2 = sum(r * r for r in read_lengths)
-        return float(sum2) / float(sum1)
+    return compute_esize(read_lengths)
 
 
 def _get_att_esize_contig_length(read_lengths):
@@ -216,13 +210,10 @@ def _get_contig_coverage(alignment_summ_gff, contigs):
     :param alignment_summ_gff: (str) path to alignment_summ_gff
     :param contigs: (dict) contig id -> ContigInfo object
     """
-    reader = GffReader(alignment_summ_gff)
-    for rec in reader:
-        # Some contigs don't have any coverage, but make it into the gff file
-        if rec.seqid in contigs:
-            contigs[rec.seqid].add_coverage_data(rec)
-
-    reader.close()
+    # Some contigs don't have any coverage, but make it into the gff file
+    regions = load_coverage_regions(alignment_summ_gff, contigs.keys())
+    for seqid in regions.seqids:
+        contigs[seqid].set_coverage(ContigCoverage(seqid, regions=regions))
 
 
 class ContigInfo(object):
@@ -232,13 +223,23 @@ class ContigInfo(object):
 
     def __init__(self, rec):
         """Constructs a new object with the given fastq record"""
+        self._set_stats(rec.name, len(rec.sequence), np.average(rec.quality))
+
+    @classmethod
+    def from_stats(cls, name, length, mean_qv):
+        """Constructs a new object from the statistics of a fastq record"""
+        cinf = cls.__new__(cls)
+        cinf._set_stats(name, length, mean_qv)
+        return cinf
+
+    def _set_stats(self, name, length, mean_qv):
         # strip quiver appendage from name
-        if rec.name.endswith("|quiver"):
-            self._name = rec.name[:rec.name.index('|quiver')]
+        if name.endswith("|quiver"):
+            self._name = name[:name.index('|quiver')]
         else:
-            self._name = rec.name[:rec.name.index('|arrow')]
-        self._qv = np.average(rec.quality)
-        self._len = len(rec.sequence)
+            self._name = name[:name.index('|arrow')]
+        self._qv = mean_qv
+        self._len = length
         self._cov = ContigCoverage(self._name)
 
     def __repr__(self):
@@ -249,6 +250,10 @@ class ContigInfo(object):
         """Adds coverage information from a gff record"""
         self._cov.add_data(gffrec)
 
+    def set_coverage(self, contig_coverage):
+        """Sets the coverage information (ContigCoverage) of the contig"""
+        self._cov = contig_coverage
+
     @property
     def name(self):
         """Contig name (or ID)"""
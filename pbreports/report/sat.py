@@ -4,11 +4,12 @@
 Generates the SAT metric performance attributes
 """
 
-from collections import defaultdict
 import logging
 import os
 import sys
 
+import numpy as np
+
 from pbcommand.models.report import Attribute, Report, PbReportError
 from pbcommand.models import FileTypes, get_pbparser
 from pbcommand.pb_io.report import load_report_from_json
@@ -17,6 +18,8 @@ from pbcommand.utils import setup_log
 from pbcore.io import AlignmentSet
 
 from pbreports.util import movie_to_cell, add_base_options_pbcommand
+from pbreports.io.align import AlignmentSetCollector, PbiConsumer
+from pbreports.io.pbi_cache import PbiColumns, Constants as PbiConstants
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -123,8 +126,9 @@ def _get_mapping_stats_data(mapping_stats_rpt_file):
 
 def _get_read_hole_data(reads_by_cell, instrument):
     """
-    Process the dictionary of hole data.
-    :param reads_by_cell_then_set: (dict) _get_reads_info
+    Process the per-cell hole counts.
+    :param reads_by_cell: (dict) cell -> (n_holes, n_holes_set_1) from
+    _get_reads_info
     """
     if len(reads_by_cell) == 0:
         return {
@@ -133,15 +137,8 @@ def _get_read_hole_data(reads_by_cell, instrument):
             Constants.A_READS: 0
         }
         #raise ValueError("NO CELLS found!")
-    yield_, yield_1 = None, None
-
-    cell = reads_by_cell.keys()[0]
-    reads = reads_by_cell[cell]
-
-    if '1' in reads:
-        yield_1 = len(reads['1'])
-
-    yield_ = len(reads)
+    cell = sorted(reads_by_cell.keys())[0]
+    yield_, yield_1 = reads_by_cell[cell]
     d = {}
     d[Constants.A_INSTRUMENT] = instrument
     d['reads_set_1'] = yield_1
@@ -149,37 +146,116 @@ def _get_read_hole_data(reads_by_cell, instrument):
     return d
 
 
+def _movie_to_set(movie):
+    """
+    Parse the set number from an RS movie name (..._s1_p0), or None
+    """
+    chunks = os.path.basename(movie).split('_')
+    if len(chunks) > 4 and chunks[4].startswith('s'):
+        return chunks[4][1:]
+    return None
+
+
+class CellHolesConsumer(PbiConsumer):
+    """
+    Counts the distinct ZMW hole numbers with alignments in each cell (in
+    total, and in set 1), and collects the instruments of all cells, as part
+    of an AlignmentSetCollector pass.
+
+    Holes are encoded as int64 keys (cell index << 32 | hole number) and
+    reduced with np.unique, so no per-record Python objects are created.
+    """
+
+    def __init__(self):
+        self.cells = []
+        self.instruments = set()
+        self._cell_index = {}
+        self._set_1_cells = set()
+        self._keys = []
+        self._keys_set_1 = []
+
+    def _get_cell_index(self, cell):
+        if not cell in self._cell_index:
+            self._cell_index[cell] = len(self.cells)
+            self.cells.append(cell)
+        return self._cell_index[cell]
+
+    def consume(self, bam_file_name, pbi):
+        cells = [movie_to_cell(movie) for movie in pbi.movie_names]
+        for cell in cells:
+            self.instruments.add(_cell_2_inst(cell))
+        # movie code -> cell index, and whether the movie is in set 1
+        cell_lut = np.array([self._get_cell_index(cell) for cell in cells],
+                            dtype=np.int64)
+        set_1_lut = np.array([_movie_to_set(movie) == '1'
+                              for movie in pbi.movie_names], dtype=bool)
+        self._set_1_cells.update(cell_lut[set_1_lut].tolist())
+        if len(pbi) == 0:
+            return
+        movie_codes = np.asarray(pbi.movie)
+        keys = ((cell_lut[movie_codes] << 32) |
+                np.asarray(pbi.holeNumber, dtype=np.int64))
+        self._keys.append(np.unique(keys))
+        is_set_1 = set_1_lut[movie_codes]
+        if is_set_1.any():
+            self._keys_set_1.append(np.unique(keys[is_set_1]))
+
+    def _count_by_cell(self, keys):
+        if len(keys) == 0:
+            return np.zeros(len(self.cells), dtype=int)
+        # a hole aligned in several files is only counted once
+        cell_indices = np.unique(np.concatenate(keys)) >> 32
+        return np.bincount(cell_indices, minlength=len(self.cells))
+
+    def hole_counts(self):
+        """
+        :return dict: cell -> (distinct holes, distinct holes in set 1 or
+        None if the cell has no set 1 movie), for cells with alignments
+        """
+        n_holes = self._count_by_cell(self._keys)
+        n_holes_set_1 = self._count_by_cell(self._keys_set_1)
+        return {cell: (int(n_holes[i]), int(n_holes_set_1[i])
+                       if i in self._set_1_cells else None)
+                for i, cell in enumerate(self.cells) if n_holes[i] > 0}
+
+
+def _read_hole_columns(bamfile):
+    """
+    Hole number and movie columns of an unindexed BAM file, in the layout
+    of the pbi columns.
+    """
+    movie_names = sorted(set(rg.MovieName for rg in bamfile.readGroupTable))
+    movie_codes = {movie: i for i, movie in enumerate(movie_names)}
+    holes, movies = [], []
+    for aln in bamfile:
+        holes.append(aln.HoleNumber)
+        movies.append(movie_codes[aln.movieName])
+    columns = {"holeNumber": np.array(holes, dtype=np.int64),
+               PbiConstants.C_MOVIE: np.array(movies, dtype=int)}
+    return PbiColumns(columns, movie_names, {})
+
+
 def _get_reads_info(aligned_reads_file):
     """
     Extract information from the BAM files. Returns a tuple of length 2.
-    First item is a dictionary of dictionaries, such that holes are mapped by cell, then set.
-    Second item is the instrument name. 
+    First item is a dictionary mapping each cell to its number of distinct
+    holes, and its number of distinct holes in set 1.
+    Second item is the instrument name.
     :param aligned_reads_file: (str) path to aligned_reads[.xml,.bam]
-    :return tuple (reads_by_cell_then_set, instrument) (dict, string): A dictionary of dictionaries,
-    instrument name
+    :return tuple (reads_by_cell, instrument) (dict, string): A dictionary of
+    (n_holes, n_holes_set_1) tuples, instrument name
     """
-    instruments = set()
-    reads_by_cell = defaultdict(set)
+    holes = CellHolesConsumer()
     with AlignmentSet(aligned_reads_file) as ds:
-        for bamfile in ds.resourceReaders():
-            for rg in bamfile.readGroupTable:
-                cell = movie_to_cell(rg.MovieName)
-                instruments.add(_cell_2_inst(cell))
-            if ds.isIndexed:
-                logging.info("Indexed file - will use fast loop.")
-                for (hole, rgId) in zip(bamfile.holeNumber, bamfile.qId):
-                    movie_name = bamfile.readGroupInfo(rgId).MovieName
-                    cell = movie_to_cell(movie_name)
-                    reads_by_cell[cell].add(hole)
-            else:
-                for aln in bamfile:
-                    hole = aln.HoleNumber
-                    movie_name = aln.movieName
-                    cell = movie_to_cell(movie_name)
-                    if inst is None:
-                        inst = _cell_2_inst(cell)
-                    reads_by_cell[cell].add(hole)
-    return reads_by_cell, ", ".join(sorted(list(instruments)))
+        if ds.isIndexed:
+            logging.info("Indexed file - will use fast loop.")
+            collector = AlignmentSetCollector(ds.toExternalFiles())
+            collector.register(holes)
+            collector.run()
+        else:
+            for bamfile in ds.resourceReaders():
+                holes.consume(bamfile.filename, _read_hole_columns(bamfile))
+    return holes.hole_counts(), ", ".join(sorted(holes.instruments))
 
 
 def summarize_report(report_file, out=sys.stdout):
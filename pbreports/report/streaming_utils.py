@@ -14,6 +14,7 @@ import matplotlib.pyplot as plt
 
 from pbcommand.models.report import Plot, PlotGroup
 
+from pbreports.util import compute_percentile_from_counts
 from pbreports.plot.helper import get_fig_axes_lpr, get_green, DEFAULT_DPI, DEFAULT_THUMB_DPI
 
 log = logging.getLogger(__name__)
@@ -379,26 +380,8 @@ def get_percentile(h, bin_edges, percentile):
     :param percentile: int Percentile to compute
     :type percentile: int
 
-    The bin width is assumed to be constant.
+    The bin width is assumed to be constant.  Like zip(h, bin_edges[:-1]),
+    only the bins with a lower edge in bin_edges[:-1] are counted.
     """
-    assert (percentile >= 0) and (percentile <= 100)
-
-    total_integral = 0
-    dx = bin_edges[1] - bin_edges[0]
-    for x, y in zip(h, bin_edges[:-1]):
-        v = x * dx
-        total_integral += v
-
-    max_integral = total_integral * (percentile / 100.0)
-    assert max_integral <= total_integral
-
-    total = 0
-    for x, y in zip(h, bin_edges[:-1]):
-        v = x * dx
-        total += v
-        if total >= max_integral:
-            # return x, y, max_integral
-            return y
-
-    # should never get here
-    raise ValueError("Unable to compute percentile {n}".format(n=percentile))
+    n = min(len(h), len(bin_edges) - 1)
+    return compute_percentile_from_counts(bin_edges[:n], h[:n], percentile)
@@ -5,6 +5,7 @@ Output file is a JSON datastore listing the reports that succeeded.
 """
 
 import logging
+import multiprocessing
 import os
 import sys
 
@@ -25,42 +26,83 @@ log = logging.getLogger(__name__)
 __version__ = "0.1"
 
 
-def to_reports(subreads, output_dir):
-    output_files = []
+REPORT_MODULES = [("filter_stats_xml", filter_stats_xml),
+                  ("adapter_xml", adapter_xml),
+                  ("loading_xml", loading_xml),
+                  ("control", control)]
+
+# SubreadSet with loaded stats, shared with forked workers so that the
+# sts.xml is only parsed once
+_DSET = None
+
+
+def _run_report(base, output_dir):
+    """
+    Generate a single report from the shared dataset, returning a tuple of
+    (uuid, task_id, file_name, base), or None if the stats are missing.
+    """
+    module = dict(REPORT_MODULES)[base]
+    task_id = module.Constants.TOOL_ID
+    try:
+        rpt_output_dir = os.path.join(output_dir, base)
+        os.mkdir(rpt_output_dir)
+        file_name = os.path.join(rpt_output_dir, "{b}.json".format(b=base))
+        report = module.to_report_impl(_DSET, rpt_output_dir)
+        log.info("Writing {f}".format(f=file_name))
+        report.write_json(file_name)
+        return report.uuid, task_id, file_name, base
+    except InvalidStatsError as e:
+        log.error("This dataset lacks some required statistics")
+        log.error("Skipping generation of {b} report".format(b=base))
+        return None
+
+
+def _run_report_args(args):
+    return _run_report(*args)
+
+
+def to_reports(subreads, output_dir, nproc=1):
+    """
+    Generate all reports from a single load of the SubreadSet stats. With
+    nproc > 1 the reports run concurrently in forked worker processes
+    (pyplot is not thread-safe).
+    """
+    global _DSET
     log.info("Loading {f}".format(f=subreads))
     ds = SubreadSet(subreads)
     ds.loadStats()
-    for base, module in [("filter_stats_xml", filter_stats_xml),
-                         ("adapter_xml", adapter_xml),
-                         ("loading_xml", loading_xml),
-                         ("control", control)]:
-        constants = getattr(module, "Constants")
-        task_id = constants.TOOL_ID
-        to_report = getattr(module, "to_report_impl")
-        try:
-            rpt_output_dir = os.path.join(output_dir, base)
-            os.mkdir(rpt_output_dir)
-            file_name = os.path.join(rpt_output_dir, "{b}.json".format(b=base))
-            report = to_report(ds, rpt_output_dir)
-            log.info("Writing {f}".format(f=file_name))
-            report.write_json(file_name)
+    _DSET = ds
+    args = [(base, output_dir) for base, _ in REPORT_MODULES]
+    try:
+        if nproc > 1:
+            pool = multiprocessing.Pool(min(nproc, len(args)))
+            try:
+                results = pool.map(_run_report_args, args)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(_run_report_args, args)
+    finally:
+        _DSET = None
+    output_files = []
+    for result in results:
+        if result is not None:
+            uuid, task_id, file_name, base = result
             output_files.append(DataStoreFile(
-                uuid=report.uuid,
+                uuid=uuid,
                 source_id=task_id,
                 type_id=FileTypes.REPORT.file_type_id,
                 path=file_name,
                 is_chunked=False,
                 name=base))
-        except InvalidStatsError as e:
-            log.error("This dataset lacks some required statistics")
-            log.error("Skipping generation of {b} report".format(b=base))
     datastore = DataStore(output_files)
     return datastore
 
 
 def _run_args(args):
     base_output_dir = os.path.dirname(args.datastore)
-    datastore = to_reports(args.subreads, base_output_dir)
+    datastore = to_reports(args.subreads, base_output_dir, nproc=args.nproc)
     datastore.write_json(args.datastore)
     return 0
 
@@ -76,6 +118,8 @@ def _get_parser():
                                              description=__doc__)
     p.add_argument("subreads", type=validate_file)
     p.add_argument("datastore", type=_validate_output_file)
+    p.add_argument("--nproc", type=int, default=1,
+                   help="Number of reports to generate concurrently")
     return p
 
 
@@ -82,9 +82,20 @@ PSEUDO_PARSER = re.compile(r'(_F[^|]+)|(\.f[^|]+)$')
 EXPT_RUN_PARSER = re.compile(r'/(\d\d\d\d\d\d\d)/(\d\d\d\d)/')
 
 QV_THRESHOLDS = [6, 8, 10]
+# integer QV bins needed to count QV / 10 >= each threshold
+N_QV_BINS = 10 * max(QV_THRESHOLDS) + 1
 NULL_QV_STRING = ','.join(['0' for i in xrange(len(QV_THRESHOLDS))])
 Z_THRESHOLD = 3.0
 
+# cmp.h5 datasets read by the alignment index path
+CMP_ZSCORE = "/AlnInfo/ZScore"
+CMP_MOVIE_ID = "/MovieInfo/ID"
+CMP_MOVIE_NAME = "/MovieInfo/Name"
+CMP_ALN_GROUP_ID = "/AlnGroup/ID"
+CMP_ALN_GROUP_PATH = "/AlnGroup/Path"
+# number of QVs read from a QualityValue dataset at a time
+QV_CHUNK_SIZE = 1 << 22
+
 # length to reuse when converting Z to accuracy
 FIXED_LENGTH = 500
 # fixed parameters for Z (simple model)
@@ -158,12 +169,60 @@ class MovieParseException(Exception):
     pass
 
 
+class ValueBuffer(object):
+
+    """
+    Growable typed NumPy buffer of values. The sorted values are cached
+    until the next append.
+    """
+
+    def __init__(self, dtype, capacity=256):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._n = 0
+        self._sorted = None
+
+    def __len__(self):
+        return self._n
+
+    def _reserve(self, n):
+        if n > self._data.size:
+            data = np.empty(max(n, 2 * self._data.size), dtype=self._data.dtype)
+            data[:self._n] = self.values
+            self._data = data
+
+    def append(self, value):
+        self._reserve(self._n + 1)
+        self._data[self._n] = value
+        self._n += 1
+        self._sorted = None
+
+    def extend(self, values):
+        values = np.asarray(values)
+        self._reserve(self._n + values.size)
+        self._data[self._n:self._n + values.size] = values
+        self._n += values.size
+        self._sorted = None
+
+    @property
+    def values(self):
+        return self._data[:self._n]
+
+    @property
+    def sorted_values(self):
+        if self._sorted is None:
+            self._sorted = np.sort(self.values)
+        return self._sorted
+
+    def median(self):
+        return np.median(self.sorted_values)
+
+
 class ReadStats(object):
 
     def __init__(self):
-        self.lengths = []
-        self.zs = []
-        self.accs = []
+        self.lengths = ValueBuffer(np.int32)
+        self.zs = ValueBuffer(np.float64)
+        self.accs = ValueBuffer(np.float64)
         self.n = 0
         self.reportAccuracy = False
 
@@ -178,21 +237,21 @@ class ReadStats(object):
     @property
     def zscore(self):
         if self.zs:
-            return np.median(np.array(self.zs))
+            return self.zs.median()
         else:
             return 0.0
 
     @property
     def length(self):
         if self.lengths:
-            return np.median(np.array(self.lengths))
+            return self.lengths.median()
         else:
             return 0.0
 
     @property
     def accuracy(self):
         if self.accs:
-            return np.median(np.array(self.accs))
+            return self.accs.median()
         else:
             return 0.0
 
@@ -217,14 +276,21 @@ class ReadStats(object):
         self.accs.append(acc)
         self.n += 1
 
+    def addArrays(self, lengths, zs, accs):
+        """Add the lengths, z-scores and accuracies of many alignments"""
+        self.lengths.extend(lengths)
+        self.zs.extend(zs)
+        self.accs.extend(accs)
+        self.n += len(lengths)
+
     def _quantile(self, v, quantile):
+        """:param v: sorted values"""
         if len(v) == 0:
             return 0.0
         n = len(v)
         nq = int(round(quantile * float(n)))
         if nq > n - 1:
             nq = n - 1
-        v.sort()
         return v[nq]
 
     def _accFromZ(self, z):
@@ -243,15 +309,14 @@ class ReadStats(object):
 
             if self.n == 0:
                 return '0,0.0,0.0,0.0,0.0,0.0,0'
-            zs = np.array(self.zs)
-            z50 = np.median(zs)
-            z95 = self._quantile(zs, 0.95)
+            z50 = self.zscore
+            z95 = self._quantile(self.zs.sorted_values, 0.95)
             return '%d,%.2f,%.2f,%.2f,%.2f,%.2f,%.0f' % (self.n, z50, 100.0 * self._accFromZ(z50), z95, 100.0 * self._accFromZ(z95), self.accuracy, self.length)
         else:
             if self.n == 0:
                 return '0,0.00,0.0'
-            meanAcc = np.mean(np.array(self.accs))
-            meanRl = np.mean(np.array(self.lengths))
+            meanAcc = np.mean(self.accs.values)
+            meanRl = np.mean(self.lengths.values)
             return '%d,%.2f,%.1f' % (self.n, meanAcc, meanRl)
 
 
@@ -288,7 +353,8 @@ class MovieStats(object):
         self.allStats = ReadStats()
         self.highZStats = ReadStats()
         self.highZStats.reportAccuracy = True
-        self.nHighQVs = [0 for _ in xrange(len(QV_THRESHOLDS))]
+        # number of bases at each (integer) QV, see nHighQVs
+        self.qvCounts = np.zeros(N_QV_BINS, dtype=np.int64)
         self.code = 'POSTALIGNMENT'
         self.setId = setId if setId else 'NA'
         self.partId = partId if partId else 'NA'
@@ -338,11 +404,24 @@ class MovieStats(object):
         # if not hit.hasPulseInfo:
         #    return
 
-        for qv in hit.QualityValue():
-            qv = qv / 10.0
-            for i, qvThreshold in enumerate(QV_THRESHOLDS):
-                if qv >= qvThreshold:
-                    self.nHighQVs[i] += 1
+        self.addQualityValues(hit.QualityValue())
+
+    def addQualityValues(self, qvs):
+        """Add the per-base QVs of an alignment to the QV histogram"""
+        # the thresholds are integers, so truncating doesn't change any
+        # comparison; QVs past the last threshold share the last bin
+        qvs = np.clip(np.asarray(qvs), 0, self.qvCounts.size - 1)
+        self.qvCounts += np.bincount(qvs.astype(int),
+                                     minlength=self.qvCounts.size)
+
+    def addQualityValueCounts(self, counts):
+        """Add a histogram of QVs, binned as qvCounts"""
+        self.qvCounts += counts
+
+    @property
+    def nHighQVs(self):
+        """Number of bases with QV / 10 >= each of the QV_THRESHOLDS"""
+        return [int(self.qvCounts[10 * t:].sum()) for t in QV_THRESHOLDS]
 
     def tostring(self, external=False):
         """date,movie,runCode,expt,chip,inst,movieType,nReads,medianZ,
@@ -417,17 +496,21 @@ def _get_run_code_from_path(path):
     return search.group(1), search.group(2)
 
 
-def _get_post_mapping_from_movies(allMovies, cmp_h5):
-    """
-    Go through all movies post alignment.
+def _to_post_mapping_stats(stats):
+    return MovieStats(stats.expt, stats.chip, stats.movie, stats.inst,
+                      movieType=stats.movieType, setId=stats.setId,
+                      partId=stats.partId, cellId=stats.cellId,
+                      date=stats.date)
+
 
+def _get_post_mapping_from_alignments(allMovies, reader):
+    """
+    Go through all alignments one at a time.
 
     returns dict of {movie:MovieStats}
     """
     postMappingMovies = {}
 
-    reader = CmpH5Reader(cmp_h5)
-
     for alignment in reader:
         # returns a tuple of
         # (2, 'm101210_151341_Jan_p1_b15', 100.0, 0.009999999776482582)
@@ -435,22 +518,108 @@ def _get_post_mapping_from_movies(allMovies, cmp_h5):
 
         movie = movie_info[1]
         if movie not in postMappingMovies:
-            stats = allMovies[movie]
-            postMappingMovies[movie] = MovieStats(stats.expt,
-                                                  stats.chip, stats.movie,
-                                                  stats.inst,
-                                                  movieType=stats.movieType,
-                                                  setId=stats.setId,
-                                                  partId=stats.partId,
-                                                  cellId=stats.cellId,
-                                                  date=stats.date)
+            postMappingMovies[movie] = _to_post_mapping_stats(
+                allMovies[movie])
         postMappingMovies[movie].add(alignment)
 
-    reader.close()
+    return postMappingMovies
+
+
+def _count_qvs_by_movie(reader, aln_index, movie_codes, nmovies):
+    """
+    Histogram the QVs of all alignments by movie, reading each alignment
+    group's QualityValue dataset in contiguous slices of about
+    QV_CHUNK_SIZE values.
+
+    returns an (nmovies, N_QV_BINS) array of counts
+    """
+    counts = np.zeros((nmovies, N_QV_BINS), dtype=np.int64)
+    group_paths = dict(zip(reader.file[CMP_ALN_GROUP_ID][:],
+                           reader.file[CMP_ALN_GROUP_PATH][:]))
+    for group_id in np.unique(aln_index.AlnGroupID):
+        qv_path = group_paths[group_id] + "/QualityValue"
+        if qv_path not in reader.file:
+            log.warn("No QVs found in {p}".format(p=qv_path))
+            continue
+        dataset = reader.file[qv_path]
+        rows = np.flatnonzero(aln_index.AlnGroupID == group_id)
+        rows = rows[np.argsort(aln_index.Offset_begin[rows], kind="mergesort")]
+        begins = aln_index.Offset_begin[rows].astype(np.int64)
+        lengths = aln_index.Offset_end[rows].astype(np.int64) - begins
+        codes = movie_codes[rows]
+        chunks = np.cumsum(lengths) // QV_CHUNK_SIZE
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(np.diff(chunks)) + 1, [len(rows)]])
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            b, n = begins[first:last], lengths[first:last]
+            lo, hi = int(b.min()), int((b + n).max())
+            qvs = dataset[lo:hi]
+            # position of every QV of these alignments in the slice
+            offsets = np.repeat(b - lo - (np.cumsum(n) - n), n)
+            qvs = qvs[offsets + np.arange(n.sum())]
+            qvs = np.clip(qvs, 0, N_QV_BINS - 1).astype(int)
+            keys = np.repeat(codes[first:last], n) * N_QV_BINS + qvs
+            counts += np.bincount(keys, minlength=counts.size).reshape(
+                counts.shape)
+    return counts
+
+
+def _get_post_mapping_from_alignment_index(allMovies, reader):
+    """
+    Compute the per-movie statistics from the AlignmentIndex columns, with
+    only the QVs read from the alignment groups.
+
+    returns dict of {movie:MovieStats}
+    """
+    aln_index = reader.alignmentIndex
+    movie_names = dict(zip(reader.file[CMP_MOVIE_ID][:],
+                           reader.file[CMP_MOVIE_NAME][:]))
+    movie_ids, movie_codes = np.unique(aln_index.MovieID, return_inverse=True)
+
+    lengths = np.abs(aln_index.rEnd.astype(np.int64) - aln_index.rStart)
+    n_correct = (lengths - aln_index.nMM.astype(np.int64) -
+                 aln_index.nIns - aln_index.nDel)
+    accs = n_correct / lengths.astype(float) * 100.0
+    zs = np.ravel(reader.file[CMP_ZSCORE][:]).astype(float)
+    # consistent with ReadStats.addCmpAlnHit for missing values
+    zs[np.isnan(zs)] = -1.0
+
+    qv_counts = _count_qvs_by_movie(reader, aln_index, movie_codes,
+                                    len(movie_ids))
+
+    postMappingMovies = {}
+    for code, movie_id in enumerate(movie_ids):
+        movie = movie_names[movie_id]
+        stats = _to_post_mapping_stats(allMovies[movie])
+        rows = movie_codes == code
+        stats.allStats.addArrays(lengths[rows], zs[rows], accs[rows])
+        high_z = rows & (zs > Z_THRESHOLD)
+        stats.highZStats.addArrays(lengths[high_z], zs[high_z], accs[high_z])
+        stats.addQualityValueCounts(qv_counts[code])
+        postMappingMovies[movie] = stats
 
     return postMappingMovies
 
 
+def _get_post_mapping_from_movies(allMovies, cmp_h5):
+    """
+    Go through all movies post alignment, using the alignment index when
+    the cmp.h5 has z-scores.
+
+
+    returns dict of {movie:MovieStats}
+    """
+    reader = CmpH5Reader(cmp_h5)
+    try:
+        if CMP_ZSCORE in reader.file:
+            return _get_post_mapping_from_alignment_index(allMovies, reader)
+        log.warn("No {d} in {f}, reading alignments one at a time".format(
+            d=CMP_ZSCORE, f=cmp_h5))
+        return _get_post_mapping_from_alignments(allMovies, reader)
+    finally:
+        reader.close()
+
+
 def _get_movie_stats_from_movie_files(movie_files):
     """
     :param movie_files: List of Movies
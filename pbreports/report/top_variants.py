@@ -15,6 +15,7 @@ from pbcommand.utils import setup_log
 from pbcore.io import GffReader, ReferenceSet
 
 from pbreports.util import openReference
+from pbreports.io.reference import get_contigs
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -199,9 +200,10 @@ class VariantFinder(object):
     def _addContigNames(self, list):
         """Add reference repos contig names to the top variants"""
 
+        ctigs = get_contigs(self._reference, [v.contig for v in list])
         for v in list:
             # top variants are initialized with contig == seqid
-            ctig = self._reference.get_contig(v.contig)
+            ctig = ctigs.get(v.contig)
             if ctig == None:
                 continue
             v.contig = ctig.id
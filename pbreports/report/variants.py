@@ -26,6 +26,7 @@ from pbreports.util import (openReference, average_or_none,
                             get_top_contigs_from_ref_entry)
 import pbreports.plot.helper as PH
 from pbreports.plot.helper import DEFAULT_DPI
+from pbreports.io.reference import ReferenceIndex, get_contigs
 from pbreports.io.specs import *
 
 log = logging.getLogger(__name__)
@@ -113,15 +114,12 @@ def _extract_alignment_summ_data(aln_summ_gff, contigs):
     :param contigs: (list) top contigs from reference
     :returns: 2 dictionaries containing data extracted from alignment_summary.gff
     """
+    # slots index the top contigs, so GFF records can be routed to
+    # per-contig accumulators without a list scan
+    index = ReferenceIndex.from_contigs(contigs)
 
-    def _get_name(id_):
-        for c in contigs:
-            if c.id == id_:
-                return c.name
-
-    contig_ids = [c.id for c in contigs]
-
-    ref_data = {}
+    # one entry per accepted GFF record, reduced per contig below
+    rec_slots, rec_ends, rec_gaps, rec_covs = [], [], [], []
     var_map = {}
 
     log.info("Reading GFF data from {f}".format(f=aln_summ_gff))
@@ -129,32 +127,55 @@ def _extract_alignment_summ_data(aln_summ_gff, contigs):
     reader = GffReader(aln_summ_gff)
     for rec in reader:
         seqid = rec.seqid.split()[0]
-        if seqid not in contig_ids:
+        slot = index.slot(seqid)
+        if slot is None:
             continue
 
         # first data set
-        ref_data.setdefault(seqid, [0, 0, 0, 0])
-        ref_data[seqid][LENGTH] = max(rec.end, ref_data[seqid][LENGTH])
+        rec_slots.append(slot)
+        rec_ends.append(rec.end)
         numGaps, lenGaps = rec.attributes["gaps"].split(",")
-        ref_data[seqid][GAPS] += int(lenGaps)
-        ref_data[seqid][COV] += float( rec.attributes["cov2"].split(",")[0] ) * \
-            (rec.end - rec.start + 1)
+        rec_gaps.append(int(lenGaps))
+        rec_covs.append(float(rec.attributes["cov2"].split(",")[0]) *
+                        (rec.end - rec.start + 1))
 
         # second data set
-        contig_var = None
-        try:
-            contig_var = var_map[seqid]
-        except KeyError:
-            contig_var = ContigVariants(seqid, _get_name(seqid))
+        contig_var = var_map.get(seqid)
+        if contig_var is None:
+            contig_var = ContigVariants(seqid, contigs[slot].name)
             var_map[seqid] = contig_var
 
         contig_var.add_data(rec)
 
     reader.close()
 
+    data = _reduce_by_contig(len(index), rec_slots, rec_ends, rec_gaps,
+                             rec_covs)
+    # each value is a view on a row of data, so later updates (e.g., from
+    # the variants GFF) are visible through ref_data
+    ref_data = {seqid: data[index.slot(seqid)] for seqid in var_map}
     return ref_data, var_map
 
 
+def _reduce_by_contig(n_contigs, rec_slots, rec_ends, rec_gaps, rec_covs):
+    """
+    Collapse the per-record alignment summary columns into one row per
+    contig, indexed by LENGTH, GAPS, ERR and COV.
+    :returns: np.array of shape (n_contigs, 4)
+    """
+    data = np.zeros((n_contigs, 4), dtype=np.float64)
+    if len(rec_slots) == 0:
+        return data
+    rec_slots = np.array(rec_slots, dtype=np.int64)
+    np.maximum.at(data[:, LENGTH], rec_slots,
+                  np.array(rec_ends, dtype=np.float64))
+    data[:, GAPS] = np.bincount(rec_slots, weights=rec_gaps,
+                                minlength=n_contigs)
+    data[:, COV] = np.bincount(rec_slots, weights=rec_covs,
+                               minlength=n_contigs)
+    return data
+
+
 def _create_variants_plot_grp(top_contigs, var_map, output_dir):
     """
     Returns io.model.PlotGroup object
@@ -201,7 +222,7 @@ def _create_variants_plot_grp(top_contigs, var_map, output_dir):
 
 
 def _get_x_labels(ctg_var):
-    return np.array([l[0] for l in ctg_var.variants])
+    return ctg_var.variants[:, 0]
 
 
 def _get_legend_file(bars, output_dir):
@@ -224,9 +245,9 @@ def _create_bars(contig_variants):
     :returns: tuple of pbreports.plot.helper.Bar objects
     """
 
-    dataIns = np.array([l[1] for l in contig_variants.variants])
-    dataDels = np.array([l[2] for l in contig_variants.variants])
-    dataSnv = np.array([l[3] for l in contig_variants.variants])
+    dataIns = contig_variants.variants[:, 1]
+    dataDels = contig_variants.variants[:, 2]
+    dataSnv = contig_variants.variants[:, 3]
 
     insBarModel = PH.Bar(dataIns, 'Insertions', color=PH.get_blue(3))
     delBarModel = PH.Bar(dataDels, 'Deletions', color=PH.get_green(3))
@@ -255,10 +276,15 @@ def _append_variants_gff_data(ref_data, variants_gff):
 
     :type variants_gff: str
     """
+    err_lens = {}
     reader = GffReader(variants_gff)
     for record in reader:
-        err_len = record.end - record.start + 1
         seqid = record.seqid.split()[0]
+        err_lens[seqid] = err_lens.get(seqid, 0) + \
+            (record.end - record.start + 1)
+    reader.close()
+
+    for seqid, err_len in err_lens.iteritems():
         if seqid in ref_data:
             ref_data[seqid][ERR] += err_len
         else:
@@ -268,8 +294,6 @@ def _append_variants_gff_data(ref_data, variants_gff):
                 r=seqid, f=variants_gff)
             log.warn(msg)
 
-    reader.close()
-
 
 def _get_consensus_table_and_attributes(ref_data, reference_entry):
     """
@@ -293,8 +317,9 @@ def _get_consensus_table_and_attributes(ref_data, reference_entry):
     columns.append(Column(Constants.C_COVERAGE))
     table = Table(Constants.T_STATS, columns=columns)
 
+    contigs = get_contigs(reference_entry, ordered_ids)
     for seqid in ordered_ids:
-        contig = reference_entry.get_contig(seqid)
+        contig = contigs[seqid]
 
         length = float(ref_data[seqid][LENGTH])
         gaps = float(ref_data[seqid][GAPS])
@@ -369,13 +394,15 @@ def _ref_ids_ordered_by_len(ref_data):
 
 class ContigVariants(object):
 
-    def __init__(self, seqId, name=None):
+    def __init__(self, seqId, name=None, nrecords=256):
         """Encapsulates variant info relevant to one chart"""
         self.seqid = seqId
 
         self.name = seqId if name is None else name
 
-        self.variants = []
+        # (start, ins, del, sub) per record; grown geometrically as needed
+        self._variants = np.zeros((nrecords, 4), dtype=np.int64)
+        self._nrecords = 0
 
         # seqId is the fasta header, which could be long and have spaces and/or symbols that are
         # not good to use in filename.
@@ -384,6 +411,11 @@ class ContigVariants(object):
 
         self.file_name = "variants_plot_%s%s" % (m.hexdigest(), ".png")
 
+    @property
+    def variants(self):
+        """np.array of shape (nrecords, 4) with columns start, ins, del, sub"""
+        return self._variants[:self._nrecords]
+
     def add_data(self, gff3Record):
         """Append x,y data from this record to the contig graph"""
 
@@ -393,7 +425,13 @@ class ContigVariants(object):
         de1e = int(atts['del'])
         snv = int(atts['sub'])
 
-        self.variants.append((startPos, inse, de1e, snv))
+        if self._nrecords == self._variants.shape[0]:
+            grown = np.zeros((max(1, 2 * self._nrecords), 4),
+                             dtype=self._variants.dtype)
+            grown[:self._nrecords] = self._variants
+            self._variants = grown
+        self._variants[self._nrecords] = (startPos, inse, de1e, snv)
+        self._nrecords += 1
 
 
 def _args_runner(args):
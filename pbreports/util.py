@@ -9,15 +9,15 @@ import sys
 
 import numpy as np
 
-from copy import deepcopy
-
-from pbcore.io import FastaReader, ReferenceSet
+from pbcore.io import ReferenceSet
 from pbcommand.pb_io.report import load_report_from_json
 from pbcommand.models import FileTypes, get_pbparser
 from pbcommand.models.report import Attribute, Column, Table
 from pbcommand.validators import validate_output_dir, validate_report
 
 from pbreports.model import InvalidStatsError
+from pbreports.io.fastx import fasta_lengths
+from pbreports.io.reference import load_reference_index, get_contigs
 
 log = logging.getLogger(__name__)
 
@@ -45,15 +45,10 @@ def path_to_movie(path):
 
 def get_fasta_readlengths(fasta_file):
     """
-    Get a sorted list of contig lengths
-    :return: (tuple) 
+    Get a sorted array of contig lengths
+    :return: (np.ndarray)
     """
-    lens = []
-    with FastaReader(fasta_file) as f:
-        for record in f:
-            lens.append(len(record.sequence))
-    lens.sort()
-    return lens
+    return np.sort(fasta_lengths(fasta_file))
 
 
 def accuracy_as_phred_qv(accuracy, max_qv=70):
@@ -101,35 +96,89 @@ def get_top_contigs_from_ref_entry(ref_entry, max_contigs):
     :param reference: ref_entry
     :param max_contigs: (int) max number of contigs to return
     """
-    contigs = sorted(list(ref_entry.contigs),
-                     key=len,
-                     reverse=True)
-    return contigs[:max_contigs]
+    top_ids = load_reference_index(ref_entry).top_ids(max_contigs)
+    contigs = get_contigs(ref_entry, top_ids)
+    return [contigs[contig_id] for contig_id in top_ids]
 
 
 def compute_n50(readlengths):
     """
-    :param contig_lengths: list of contig lengths
+    :param contig_lengths: list or array of contig lengths
     see get_fasta_readlengths
     """
     # this might not be the best expected behavior.
-    # this could be a np.array
     if len(readlengths) == 0:
         return 0
 
     sorted_readlengths = np.sort(readlengths)
-    n50 = sorted_readlengths[0]
-    half_length = np.sum(readlengths) / 2.0
-
-    total = 0
-    for readlength in sorted_readlengths:
-        if total < half_length:
-            n50 = readlength
-            total += n50
-        else:
-            break
+    totals = np.cumsum(sorted_readlengths)
+    # first length at which the running total reaches half the total
+    i = np.searchsorted(totals, totals[-1] / 2.0, side="left")
+    return sorted_readlengths[i]
+
+
+def compute_n50_from_counts(values, counts):
+    """
+    Compute n50 from a histogram of (value, count) pairs, returning the
+    same result as compute_n50 on the expanded list of values, without
+    materializing it.
+
+    :param values: representative length of each bin
+    :param counts: number of items in each bin
+    """
+    values = np.asarray(values)
+    counts = np.asarray(counts)
+    keep = counts > 0
+    if not keep.any():
+        return 0
+    values, counts = values[keep], counts[keep]
+    order = np.argsort(values, kind="mergesort")
+    values, counts = values[order], counts[order]
+    totals = np.cumsum(values * counts)
+    i = np.searchsorted(totals, totals[-1] / 2.0, side="left")
+    return values[i]
+
+
+def compute_esize(values, counts=None):
+    """
+    Compute the E-size (the length-weighted mean length, a.k.a. auN) of a
+    list or array of lengths, or of a histogram of (value, count) pairs.
+    0.0 if there are no lengths.
+    """
+    values = np.asarray(values)
+    weighted = values if counts is None else values * np.asarray(counts)
+    total = np.sum(weighted)
+    if len(values) == 0 or total == 0:
+        return 0.0
+    return float(np.sum(weighted * values)) / float(total)
 
-    return n50
+
+def compute_percentile_from_counts(values, counts, percentile):
+    """
+    Return the first value of a histogram of (value, count) pairs at which
+    the cumulative count reaches the percentile (0-100) of the total count.
+
+    :param values: lower bound of each bin, in ascending order
+    :param counts: number of items in each bin
+    """
+    assert (percentile >= 0) and (percentile <= 100)
+    totals = np.cumsum(counts)
+    if len(totals) == 0:
+        raise ValueError(
+            "Unable to compute percentile {n}".format(n=percentile))
+    i = np.searchsorted(totals, totals[-1] * (percentile / 100.0),
+                        side="left")
+    return values[min(i, len(totals) - 1)]
+
+
+def compute_percentile(values, percentile):
+    """
+    Return the smallest of the values (list or array) at which the
+    percentile (0-100) of the values is reached.
+    """
+    sorted_values = np.sort(values)
+    return compute_percentile_from_counts(
+        sorted_values, np.ones(len(sorted_values), dtype=int), percentile)
 
 
 def add_plot_options(parser):
@@ -215,7 +264,6 @@ def openReference(fname):
     return ref
 
 
-# FIXME can this be combined with compute_n50?
 def compute_n50_from_bins(bins):
     """
     Compute n50 from the numpy array when the index is the length
@@ -225,32 +273,74 @@ def compute_n50_from_bins(bins):
     :note: Bin width is assumed to be 1
 
     """
-    total = 0
-    for i, j in enumerate(bins):
-        for _ in xrange(int(j)):
-            total += i
-    half_total = total / 2.0
-    n50 = 0
-    # initialize n50 by finding the first bin that != 0
-    for i, bin_value in enumerate(bins):
-        if bin_value != 0:
-            n50 = i
-            break
-    rtotal = 0
-    for i, bin_value in enumerate(bins):
-        if bin_value != 0:
-            for _ in xrange(int(bin_value)):
-                if rtotal < half_total:
-                    n50 = i
-                    rtotal += i
-                    #log.debug(("N50", n50, rtotal, half_total, total))
-                else:
-                    return n50
-    msg = "Unable to compute n50 from {n} bins with sum {x}".format(
-        n=len(bins), x=total)
-    # warnings.warn(msg)
-    log.warn(msg)
-    return 0
+    counts = np.asarray(bins).astype(int)
+    if not counts.any():
+        msg = "Unable to compute n50 from {n} bins with sum 0".format(
+            n=len(counts))
+        log.warn(msg)
+        return 0
+    return int(compute_n50_from_counts(np.arange(len(counts)), counts))
+
+
+class BinnedDistribution(object):
+    """
+    NumPy-backed histogram of equal-width bins, where each label is the
+    lower bound of its bin. The reshaping methods return new instances.
+    """
+
+    def __init__(self, bins, labels, bin_width=None):
+        self.bins = np.asarray(bins)
+        self.labels = np.asarray(labels)
+        if bin_width is None:
+            bin_width = labels[1] - labels[0]
+        self.bin_width = bin_width
+
+    def __len__(self):
+        return len(self.bins)
+
+    def crop(self, bmin, bmax):
+        """Keep the bins from the one containing bmin to the one with bmax"""
+        first = max(np.searchsorted(self.labels, bmin, side="right") - 1, 0)
+        last = max(np.searchsorted(self.labels, bmax, side="right") - 1, 0)
+        return BinnedDistribution(self.bins[first:last + 1],
+                                  self.labels[first:last + 1],
+                                  self.bin_width)
+
+    def pad(self, bmin, bmax):
+        """Add empty bins on either side to extend the range to bmin, bmax"""
+        bwidth = self.bin_width
+        bins, labels = self.bins, self.labels
+        lpad = rpad = 0
+        under = labels[0] - bmin
+        if under > 0:
+            lpad = int(under / bwidth)
+        under = bmax - labels[-1]
+        if under > 0:
+            rpad = int(round(under / bwidth))
+        if lpad == 0 and rpad == 0:
+            return self
+        zeros = functools.partial(np.zeros, dtype=bins.dtype)
+        lpad_labels = labels[0] - (lpad - np.arange(lpad)) * bwidth
+        rpad_labels = labels[-1] + np.arange(1, rpad + 1) * bwidth
+        return BinnedDistribution(
+            np.concatenate([zeros(lpad), bins, zeros(rpad)]),
+            np.concatenate([lpad_labels, labels, rpad_labels]),
+            bwidth)
+
+    def pool(self, poolby):
+        """Sum each run of poolby adjacent bins into a single bin"""
+        assert (len(self) % poolby) == 0, ("pooling factor doesn't "
+                                           "divide new "
+                                           "nbins evenly")
+        return BinnedDistribution(self.bins.reshape(-1, poolby).sum(axis=1),
+                                  self.labels[::poolby],
+                                  self.bin_width * poolby)
+
+    def trim(self, trim_to):
+        """Drop the bins with a label greater than trim_to"""
+        cutoff = np.searchsorted(self.labels, trim_to, side="right")
+        return BinnedDistribution(self.bins[:cutoff], self.labels[:cutoff],
+                                  self.bin_width)
 
 
 def _dist_shaper(bmin, bmax, poolby, dist, trim_to=None):
@@ -263,78 +353,43 @@ def _dist_shaper(bmin, bmax, poolby, dist, trim_to=None):
         bins, labels = dist
         assert len(bins) > 1, "Need more than 1 bin"
         assert len(bins) == len(labels), "Need same bin, label count"
-        # bins and labels
-        first = 0
-        firstl = labels[0]
-        last = 0
-        lastl = labels[-1]
-        bwidth = labels[1] - labels[0]
-        for i, l in enumerate(labels):
-            if l <= bmin:
-                first = i
-                firstl = l
-            if l <= bmax:
-                last = i
-                lastl = l
-            else:
-                break
-        # bound the range:
-        newbins = bins[first:last + 1]
-        newlabels = labels[first:last + 1]
-
-        # pad the range:
-        under = firstl - bmin
-        if under > 0:
-            lpad = int(under / bwidth)
-            newbins = [0] * lpad + newbins
-            newlabels = [newlabels[0] - (lpad - i) * bwidth
-                         for i in range(lpad)] + newlabels
-        under = bmax - lastl
-        if under > 0:
-            rpad = int(round(under / bwidth))
-            newbins = newbins + [0] * rpad
-            newlabels = newlabels + [newlabels[-1] + i * bwidth
-                                     for i in range(1, rpad + 1)]
-
-        assert (len(newbins) % poolby) == 0, ("pooling factor doesn't "
-                                              "divide new "
-                                              "nbins evenly")
-
-        # collapse with poolby
-        cbins = [sum(newbins[start:start + poolby])
-                 for start in xrange(0, len(newbins), poolby)]
-        clabels = [newlabels[start]
-                   for start in xrange(0, len(newbins), poolby)]
-
+        shaped = BinnedDistribution(bins, labels).crop(
+            bmin, bmax).pad(bmin, bmax).pool(poolby)
         if not trim_to is None:
-            cutoff = len(clabels)
-            for i, lab in enumerate(clabels):
-                if lab > trim_to:
-                    cutoff = i
-                    break
-            cbins = cbins[:cutoff]
-            clabels = clabels[:cutoff]
-
-        bins = cbins
-        labels = clabels
-
+            shaped = shaped.trim(trim_to)
     except AssertionError as e:
         log.error("Malformed dist_shaper: " + e.message)
         return dist
-    return (bins, labels)
+    return (shaped.bins.tolist(), shaped.labels.tolist())
+
+
+class ShapedDistribution(object):
+    """
+    Rebinned view of a pbcore ContinuousDistribution. The bins and bin
+    attributes are replaced, everything else (the sample means etc.) is
+    looked up on the original, so the metadata object is never copied.
+    """
+
+    def __init__(self, dist, bins, labels):
+        self._dist = dist
+        self.bins = bins
+        self.labels = labels
+        self.minBinValue = labels[0]
+        self.maxBinValue = labels[-1]
+        self.numBins = len(bins)
+        if len(labels) > 1:
+            self.binWidth = labels[1] - labels[0]
+        else:
+            self.binWidth = dist.binWidth
+
+    def __getattr__(self, name):
+        return getattr(self._dist, name)
 
 
 def _cont_dist_shaper(shape_func, dist):
     """Just change the bins and binlabels! Not the sample means etc."""
-    dist = deepcopy(dist)
     newbins, newlabels = shape_func((dist.bins, dist.labels))
-    dist.bins = newbins
-    dist.minBinValue = newlabels[0]
-    dist.maxBinValue = newlabels[-1]
-    dist.numBins = len(newbins)
-    if len(newlabels) > 1:
-        dist.binWidth = newlabels[1] - newlabels[0]
-    return dist
+    return ShapedDistribution(dist, newbins, newlabels)
 
 
 def dist_shaper(dist_list, nbins=40, trim_excess=False):
@@ -366,14 +421,10 @@ def dist_shaper(dist_list, nbins=40, trim_excess=False):
         # range
         bwidth = 0
         for bins, labels in dist_list:
-            first = None
-            last = None
-            if sum(bins) > 0:
-                for i, (bv, bl) in enumerate(zip(bins, labels)):
-                    if bv != 0:
-                        last = bl
-                        if first is None:
-                            first = bl
+            nonzero = np.flatnonzero(bins)
+            if len(nonzero) > 0:
+                first = labels[nonzero[0]]
+                last = labels[nonzero[-1]]
                 if bmin > first:
                     bmin = first
                 if bmax < last:
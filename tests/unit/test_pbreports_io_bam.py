@@ -1,11 +1,18 @@
 
 import os
 import logging
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 import pbtestdata
 
-from pbreports.io.align import from_alignment_file, alignment_info_from_bam
+from pbreports.io.align import (from_alignment_file, alignment_info_from_bam,
+                                AlignmentSetCollector, PbiConsumer)
+from pbreports.io.pbi_cache import (load_pbi_columns, cached_movie_names,
+                                    PbiMemo, Constants as PbiConstants)
 
 from base_test_case import ROOT_DATA_DIR, skip_if_data_dir_not_present
 
@@ -58,6 +65,68 @@ class TestBam(unittest.TestCase):
         raise unittest.SkipTest("FIXME")
 
 
+class TestPbiCache(unittest.TestCase):
+    BAM_PATH = pbtestdata.get_file("aligned-bam")
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(suffix="pbi_cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_load_pbi_columns(self):
+        direct = load_pbi_columns(self.BAM_PATH, cache_dir="")
+        self.assertFalse(
+            load_pbi_columns(self.BAM_PATH, cache_dir="") is direct)
+        filled = load_pbi_columns(self.BAM_PATH, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        cached = load_pbi_columns(self.BAM_PATH, cache_dir=self.cache_dir)
+        self.assertEqual(cached_movie_names(self.BAM_PATH,
+                                            cache_dir=self.cache_dir),
+                         [TestBam.MOVIE])
+        self.assertTrue(isinstance(cached.holeNumber, np.memmap))
+        self.assertEqual(len(cached), len(direct))
+        self.assertEqual(cached.movie_names, [TestBam.MOVIE])
+        self.assertEqual(cached.reference_names, direct.reference_names)
+        for name in PbiConstants.COLUMNS + (PbiConstants.C_MOVIE,):
+            self.assertTrue(np.array_equal(getattr(cached, name),
+                                           getattr(direct, name)))
+            self.assertTrue(np.array_equal(getattr(filled, name),
+                                           getattr(direct, name)))
+
+    def test_pbi_memo(self):
+        memo = PbiMemo()
+        pbi = load_pbi_columns(self.BAM_PATH, cache_dir="", memo=memo)
+        self.assertTrue(
+            load_pbi_columns(self.BAM_PATH, cache_dir="", memo=memo) is pbi)
+        # columns larger than the memo are not kept
+        memo = PbiMemo(max_bytes=pbi.nbytes - 1)
+        memo.load(self.BAM_PATH)
+        self.assertEqual(len(memo), 0)
+
+
+class _RecordCounter(PbiConsumer):
+
+    def __init__(self):
+        self.seen = []
+
+    def consume(self, bam_file_name, pbi):
+        self.seen.append((bam_file_name, len(pbi)))
+
+
+class TestAlignmentSetCollector(unittest.TestCase):
+
+    def test_run(self):
+        bam_file_names = [TestBam.BAM_PATH, TestBam.BAM_PATH]
+        collector = AlignmentSetCollector(bam_file_names)
+        a = collector.register(_RecordCounter())
+        b = collector.register(_RecordCounter())
+        self.assertEqual(collector.run(), [a, b])
+        self.assertEqual([f for f, n in a.seen], bam_file_names)
+        self.assertEqual(a.seen, b.seen)
+        self.assertTrue(a.seen[0][1] > 0)
+
+
 @skip_if_data_dir_not_present
 class TestBamLarge(TestBam):
     BAM_PATH = os.path.join(IO_DATA_DIR, "lambda_aligned.bam")
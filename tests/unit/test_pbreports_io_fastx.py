@@ -0,0 +1,40 @@
+import os.path as op
+import unittest
+
+import numpy as np
+
+from pbcore.io import FastaReader, FastqReader
+
+from pbreports.io.fastx import (fasta_lengths, contig_set_lengths,
+                                fastq_stats)
+
+from base_test_case import LOCAL_DATA
+
+_DATA_DIR = op.join(LOCAL_DATA, "isoseq")
+
+
+class TestFastx(unittest.TestCase):
+    FASTA = op.join(_DATA_DIR, "consensus_isoforms.fasta")
+    FASTQ = op.join(_DATA_DIR, "hq_isoforms.fastq")
+    FASTQ_GZ = op.join(LOCAL_DATA, "polished_assembly", "assembly.fastq.gz")
+
+    def test_fasta_lengths(self):
+        with FastaReader(self.FASTA) as f:
+            expected = [len(rec.sequence) for rec in f]
+        self.assertEqual(fasta_lengths(self.FASTA).tolist(), expected)
+        self.assertEqual(
+            fasta_lengths(self.FASTA, use_index=False).tolist(), expected)
+        xml = op.join(_DATA_DIR, "consensus_isoforms.contigset.xml")
+        self.assertEqual(contig_set_lengths(xml).tolist(), expected)
+
+    def test_fastq_stats(self):
+        for file_name in [self.FASTQ, self.FASTQ_GZ]:
+            with FastqReader(file_name) as f:
+                records = list(f)
+            stats = fastq_stats(file_name, with_names=True, chunk_size=1000)
+            self.assertEqual(stats.names, [rec.name for rec in records])
+            self.assertEqual(stats.lengths.tolist(),
+                             [len(rec.sequence) for rec in records])
+            np.testing.assert_allclose(
+                stats.mean_qvs, [np.mean(rec.quality) for rec in records])
+        self.assertIsNone(fastq_stats(self.FASTQ).names)
@@ -0,0 +1,41 @@
+from collections import OrderedDict
+from StringIO import StringIO
+import json
+import unittest
+
+from pbreports.io.json_stream import iter_json_object
+
+_OBJECT = OrderedDict([
+    ("sample1", {"coverage": 1234, "freq": 0.25, "ok": True, "x": None}),
+    ("sample 2", [1, -2.5e-3, "a \"quoted\" {string}", []]),
+    ("empty", {}),
+])
+
+
+class TestIterJsonObject(unittest.TestCase):
+
+    def _items(self, s, chunk_size):
+        return list(iter_json_object(StringIO(s), chunk_size))
+
+    def test_iter_json_object(self):
+        for s in (json.dumps(_OBJECT), json.dumps(_OBJECT, indent=4)):
+            # small chunks split keys, strings, numbers and literals
+            for chunk_size in (1, 2, 3, 7, 1 << 20):
+                self.assertEqual(self._items(s, chunk_size), _OBJECT.items())
+
+    def test_empty_object(self):
+        for s in ("{}", " \n{ \n}\n"):
+            self.assertEqual(self._items(s, 1), [])
+
+    def test_truncated(self):
+        s = json.dumps(_OBJECT)
+        for end in (0, 1, 5, len(s) // 2, len(s) - 1):
+            for chunk_size in (1, 1 << 20):
+                with self.assertRaises(ValueError):
+                    self._items(s[:end], chunk_size)
+
+    def test_malformed(self):
+        for s in ('[1, 2]', '{"a" 1}', '{"a": 1,}', '{"a": 1 "b": 2}',
+                  '{a: 1}', '{"a": [1, 2}'):
+            with self.assertRaises(ValueError):
+                self._items(s, 3)
@@ -0,0 +1,66 @@
+import tempfile
+import shutil
+import os.path as op
+import unittest
+
+from pbcore.io import ReferenceSet
+
+from pbreports.io.reference import (ReferenceIndex, load_reference_index,
+                                    get_contigs)
+
+_CONTIGS = [("ctg1", "ACGT"), ("ctg2", "ACGTACGTAC"), ("ctg3", "A"),
+            ("ctg4", "ACGTACGTAC"), ("ctg5", "ACGTAC")]
+
+
+def _write_fasta(file_name, with_index):
+    offset = 0
+    with open(file_name, "w") as fasta:
+        with open(file_name + ".fai", "w") if with_index else \
+                open(op.devnull, "w") as fai:
+            for name, seq in _CONTIGS:
+                header = ">{n}\n".format(n=name)
+                fasta.write(header + seq + "\n")
+                offset += len(header)
+                fai.write("{n}\t{l}\t{o}\t{l}\t{w}\n".format(
+                    n=name, l=len(seq), o=offset, w=len(seq) + 1))
+                offset += len(seq) + 1
+
+
+class TestReferenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _load(self, with_index):
+        fasta = op.join(self._tmp_dir, "ref_{i}.fasta".format(i=with_index))
+        _write_fasta(fasta, with_index)
+        return ReferenceSet(fasta)
+
+    def test_top_ids(self):
+        index = ReferenceIndex([c[0] for c in _CONTIGS],
+                               [len(c[1]) for c in _CONTIGS])
+        self.assertEqual(index.top_ids(3), ["ctg2", "ctg4", "ctg5"])
+        self.assertEqual(index.top_ids(10), ["ctg2", "ctg4", "ctg5", "ctg1",
+                                             "ctg3"])
+        self.assertEqual(index.top_ids(0), [])
+        self.assertEqual(index.slot("ctg3"), 2)
+        self.assertIsNone(index.slot("ctg6"))
+        self.assertTrue("ctg5" in index)
+        self.assertFalse("ctg6" in index)
+
+    def test_load_reference_index(self):
+        for with_index in (True, False):
+            ref = self._load(with_index)
+            index = load_reference_index(ref)
+            self.assertEqual(index.ids, [c[0] for c in _CONTIGS])
+            self.assertEqual(index.lengths.tolist(),
+                             [len(c[1]) for c in _CONTIGS])
+
+    def test_get_contigs(self):
+        ref = self._load(True)
+        contigs = get_contigs(ref, ["ctg4", "ctg1", "ctg6"])
+        self.assertEqual(sorted(contigs.keys()), ["ctg1", "ctg4"])
+        self.assertEqual(contigs["ctg4"].sequence, "ACGTACGTAC")
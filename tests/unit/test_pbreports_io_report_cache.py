@@ -0,0 +1,111 @@
+import tempfile
+import shutil
+import json
+import os.path as op
+import unittest
+import uuid
+
+import numpy as np
+
+from pbreports.io.report_cache import run_cached_report, cached_result
+
+_REPORT_ID = "mapping_stats"
+
+
+class TestReportCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._cache_dir = op.join(self._tmp_dir, "cache")
+        self._input_file = op.join(self._tmp_dir, "input.txt")
+        with open(self._input_file, "w") as f:
+            f.write("ACGT\n")
+        self._nruns = 0
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _get_report_runner(self, output_dir):
+        report_json = op.join(output_dir, "report.json")
+        csv_file = op.join(output_dir, "report.csv")
+
+        def _run_report():
+            self._nruns += 1
+            for file_name in ("plot.png", "plot_thumb.png"):
+                with open(op.join(output_dir, file_name), "w") as f:
+                    f.write(file_name)
+            with open(csv_file, "w") as f:
+                f.write("a,b\n")
+            report_d = {
+                "id": _REPORT_ID,
+                "uuid": str(uuid.uuid4()),
+                "plotGroups": [{"id": "pg", "thumbnail": "plot_thumb.png",
+                                "legend": None,
+                                "plots": [{"id": "p", "image": "plot.png"}]}]}
+            with open(report_json, "w") as f:
+                json.dump(report_d, f)
+            return 0
+        return _run_report, report_json, csv_file
+
+    def _run(self, output_dir, options=None):
+        run_report, report_json, csv_file = self._get_report_runner(
+            output_dir)
+        return run_cached_report(run_report, report_json, _REPORT_ID, "1.0",
+                                 [self._input_file], options=options,
+                                 extra_outputs=[csv_file],
+                                 cache_dir=self._cache_dir)
+
+    def test_run_cached_report(self):
+        output_dirs = [tempfile.mkdtemp(dir=self._tmp_dir) for i in range(3)]
+        self.assertEqual(self._run(output_dirs[0]), 0)
+        self.assertEqual(self._nruns, 1)
+        self.assertEqual(self._run(output_dirs[1]), 0)
+        self.assertEqual(self._nruns, 1)
+        for file_name in ("report.csv", "plot.png", "plot_thumb.png"):
+            with open(op.join(output_dirs[0], file_name)) as f:
+                expected = f.read()
+            with open(op.join(output_dirs[1], file_name)) as f:
+                self.assertEqual(f.read(), expected)
+        reports = []
+        for output_dir in output_dirs[:2]:
+            with open(op.join(output_dir, "report.json")) as f:
+                reports.append(json.load(f))
+        # the restored report is a new report
+        self.assertNotEqual(reports[1].pop("uuid"), reports[0].pop("uuid"))
+        self.assertEqual(reports[1], reports[0])
+        self._run(output_dirs[2], options={"max_contigs": 5})
+        self.assertEqual(self._nruns, 2)
+        with open(self._input_file, "a") as f:
+            f.write("ACGT\n")
+        self._run(output_dirs[2])
+        self.assertEqual(self._nruns, 3)
+
+    def test_run_report_without_cache(self):
+        run_report, report_json, csv_file = self._get_report_runner(
+            self._tmp_dir)
+        for i in range(2):
+            run_cached_report(run_report, report_json, _REPORT_ID, "1.0",
+                              [self._input_file])
+        self.assertEqual(self._nruns, 2)
+        self.assertFalse(op.exists(self._cache_dir))
+
+    def test_cached_result(self):
+        def _compute():
+            self._nruns += 1
+            return {"total": np.array([1, 2, 3])}
+        for i in range(2):
+            result = cached_result("test", _compute, [self._input_file],
+                                   "1.0", cache_dir=self._cache_dir)
+            self.assertEqual(result.keys(), ["total"])
+            self.assertTrue(np.array_equal(result["total"], [1, 2, 3]))
+        self.assertEqual(self._nruns, 1)
+        cached_result("test", _compute, [self._input_file], "1.1",
+                      cache_dir=self._cache_dir)
+        self.assertEqual(self._nruns, 2)
+
+    def test_cached_result_objects(self):
+        def _compute():
+            return {"total": np.array([{"a": 1}])}
+        self.assertRaises(ValueError, cached_result, "test", _compute,
+                          [self._input_file], "1.0",
+                          cache_dir=self._cache_dir)
@@ -0,0 +1,20 @@
+import json
+import unittest
+
+from pbreports.io.specs import SPEC_INDEX, build_spec_index, load_spec
+
+
+class TestSpecIndex(unittest.TestCase):
+
+    def test_index_is_current(self):
+        with open(SPEC_INDEX) as f:
+            index = json.load(f)
+        msg = "Run 'python -m pbreports.io.specs' to update {f}".format(
+            f=SPEC_INDEX)
+        self.assertEqual(index, build_spec_index(), msg)
+
+    def test_load_spec(self):
+        spec = load_spec("raw_data_report")
+        self.assertEqual(spec.id, "raw_data_report")
+        self.assertIs(load_spec("raw_data_report"), spec)
+        self.assertRaises(KeyError, load_spec, "not_a_report")
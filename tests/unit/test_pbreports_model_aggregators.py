@@ -1,6 +1,8 @@
 import unittest
 import logging
 
+import numpy as np
+
 from pbreports.model.aggregators import (MaxAggregator, MinAggregator,
                                          MeanAggregator, CountAggregator,
                                          SumAggregator, HistogramAggregator)
@@ -66,3 +68,63 @@ class TestAggregators(unittest.TestCase):
         nbins = 26
         self.assertEqual(a.nbins, nbins)
         self.assertEqual(a.max_value, max(self.values) + 3)
+
+    def test_apply_batch(self):
+        records = np.rec.fromarrays([np.array(self.values)],
+                                    names=self.record_name)
+        for klass in (MaxAggregator, MinAggregator, MeanAggregator,
+                      CountAggregator, SumAggregator):
+            a = klass(self.record_name)
+            b = klass(self.record_name)
+            for record in self.records:
+                a.apply(record)
+            b.apply_batch(records[:2])
+            b.apply_batch(records[2:])
+            self.assertEqual(a.attribute, b.attribute)
+
+    def test_histogram_aggregator_apply_batch(self):
+        a = HistogramAggregator(self.record_name, 0.0, dx=1)
+        b = HistogramAggregator(self.record_name, 0.0, dx=1)
+        for record in self.records:
+            a.apply(record)
+        b.apply_batch(np.rec.fromarrays([np.array(self.values)],
+                                        names=self.record_name))
+        self.assertEqual(a.nbins, b.nbins)
+        self.assertEqual(a.bins.tolist(), b.bins.tolist())
+
+    def test_apply_array(self):
+        values = np.array(self.values)
+        for klass in (MaxAggregator, MinAggregator, MeanAggregator,
+                      CountAggregator, SumAggregator):
+            a = klass(self.record_name)
+            b = klass(self.record_name)
+            for record in self.records:
+                a.apply(record)
+            b.apply_array(values)
+            self.assertEqual(a.attribute, b.attribute)
+
+    def test_merge(self):
+        values = np.array(self.values)
+        for klass in (MaxAggregator, MinAggregator, MeanAggregator,
+                      CountAggregator, SumAggregator):
+            a = klass(self.record_name)
+            b = klass(self.record_name)
+            c = klass(self.record_name)
+            a.apply_array(values)
+            b.apply_array(values[:3])
+            c.apply_array(values[3:])
+            self.assertEqual(a.attribute, b.merge(c).attribute)
+        with self.assertRaises(TypeError):
+            MaxAggregator(self.record_name).merge(
+                MinAggregator(self.record_name))
+
+    def test_histogram_aggregator_merge(self):
+        a = HistogramAggregator(self.record_name, 0.0, dx=1)
+        b = HistogramAggregator(self.record_name, 0.0, dx=1)
+        a.apply_array(np.array(self.values[:2]))
+        b.apply_array(np.array(self.values[2:]))
+        a.merge(b)
+        self.assertEqual(a.bins.sum(), len(self.values))
+        self.assertEqual(a.nbins, 26)
+        with self.assertRaises(ValueError):
+            a.merge(HistogramAggregator(self.record_name, 0.0, dx=2))
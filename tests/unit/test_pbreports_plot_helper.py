@@ -3,7 +3,15 @@ import logging
 import unittest
 import tempfile
 
+import numpy as np
+
 from pbreports.plot.helper import get_fig_axes_lpr, apply_histogram_data, save_figure_with_thumbnail, make_2d_histogram, DEFAULT_DPI
+from pbreports.plot.helper import (apply_line_data, apply_line_fill_data,
+                                   LineFill, LineFillFigure,
+                                   save_line_fill_figures,
+                                   apply_histogram_counts,
+                                   make_histogram_with_cdf_from_counts,
+                                   make_2d_histogram_from_counts)
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +40,69 @@ class TestPlotHelper(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(tmpdir, 'foo.png')))
         self.assertTrue(os.path.exists(os.path.join(tmpdir, 'foo_thumb.png')))
 
+    def _get_line_fills(self):
+        line_fills = []
+        for n in (10, 3, 50):
+            x = np.arange(n) * 100
+            y = np.sin(x) * n + n
+            line_fills.append(LineFill(x, y, np.maximum(y - 2, 0), y + 5))
+        return line_fills
+
+    def test_line_fill_figure(self):
+        """Redrawn figure has the limits of a new figure for each data set"""
+        line_fill_figure = LineFillFigure(LineFill([], [], [], []),
+                                          axis_labels=('foo', 'bar'))
+        for line_fill in self._get_line_fills():
+            line_fill_figure.draw(line_fill)
+            fig, ax = get_fig_axes_lpr()
+            apply_line_data(ax, [line_fill], ('foo', 'bar'))
+            apply_line_fill_data(ax, [line_fill])
+            self.assertEqual(ax.get_xlim(), line_fill_figure.ax.get_xlim())
+            self.assertEqual(ax.get_ylim(), line_fill_figure.ax.get_ylim())
+
+    def test_save_line_fill_figures(self):
+        tmpdir = tempfile.mkdtemp(prefix='pbreport_output')
+        line_fills = self._get_line_fills()
+        for nproc in (1, 2):
+            fnames = [os.path.join(tmpdir, 'foo{n}_{i}.png'.format(n=nproc, i=i))
+                      for i in range(len(line_fills))]
+            thumb = save_line_fill_figures(line_fills, fnames, ('foo', 'bar'),
+                                           nproc=nproc)
+            self.assertEqual(os.path.join(tmpdir, 'foo{n}_0_thumb.png'.format(
+                n=nproc)), thumb)
+            self.assertTrue(os.path.exists(thumb))
+            for fname in fnames:
+                self.assertTrue(os.path.exists(fname))
+        self.assertIsNone(save_line_fill_figures([], [], ('foo', 'bar')))
+
+    def test_apply_histogram_counts(self):
+        """Pre-binned counts plot the same bars as the raw data"""
+        data = [1.5, 2.0, 2.2, 7.1, 3.3, 3.3, 9.9]
+        fig, ax = get_fig_axes_lpr()
+        apply_histogram_data(ax, data, 4)
+        counts, edges = np.histogram(data, bins=4)
+        fig2, ax2 = get_fig_axes_lpr()
+        apply_histogram_counts(ax2, counts, edges)
+        to_rects = lambda a: [(p.get_x(), p.get_width(), p.get_height())
+                              for p in a.patches]
+        self.assertEqual(len(ax.patches), 4)
+        self.assertEqual(to_rects(ax), to_rects(ax2))
+
+    def test_make_histogram_with_cdf_from_counts(self):
+        counts, edges = np.histogram([1, 2, 2, 3, 5, 8], bins=5)
+        fig, ax = make_histogram_with_cdf_from_counts(
+            counts, edges, ("foo", "bar", "baz"), "#505050")
+        self.assertEqual(len(ax.patches), 5)
+
+    def test_make_2d_histogram_from_counts(self):
+        x = [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3]
+        y = [4, 4, 3, 1, 2, 5, 6, 3, 3, 2, 4, 5, 6, 1, 3, 3, 4, 6, 5, 1]
+        counts, xedges, yedges = np.histogram2d(x, y, bins=[3, 6])
+        fig, ax = make_2d_histogram_from_counts(
+            counts, xedges, yedges, "Number of Reads",
+            "Imaginary read metric", "Some other metric")
+        self.assertEqual(ax.get_xlim(), (-1, 4))
+
     def test_make_2d_histogram(self):
         x = [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3]
         y = [4, 4, 3, 1, 2, 5, 6, 3, 3, 2, 4, 5, 6, 1, 3, 3, 4, 6, 5, 1]
@@ -5,10 +5,13 @@ import unittest
 import json
 from pprint import pformat
 
+import numpy as np
+
 from pbcommand.models.report import Report
 import pbcommand.testkit
 
-from pbreports.report.amplicon_analysis_consensus import run_to_report
+from pbreports.report.amplicon_analysis_consensus import (run_to_report,
+                                                          create_table)
 from base_test_case import LOCAL_DATA, run_backticks, validate_report_complete
 
 log = logging.getLogger(__name__)
@@ -37,6 +40,26 @@ class TestLongAmpliconAnalysisReport(unittest.TestCase):
         self.assertIsNotNone(report)
 
 
+class TestCreateTable(unittest.TestCase):
+
+    def test_create_table(self):
+        d = np.rec.fromarrays(
+            [["bc2", "bc1", "bc1"], ["c", "a", "b"], [2, 0, 1], [0, 0, 1],
+             [900, 1000, 1100], [0.99, 0.98, 0.97], [30, 10, 20]],
+            names=["barcodename", "fastaname", "coarsecluster", "phase",
+                   "sequencelength", "predictedaccuracy", "totalcoverage"])
+        t = create_table(d, True)
+        self.assertEqual([c.id for c in t.columns],
+                         ["barcodename", "coarsecluster", "phase",
+                          "sequencelength", "predictedaccuracy",
+                          "totalcoverage"])
+        self.assertEqual(t.columns[0].values, ["bc1", "bc1", "bc2"])
+        self.assertEqual(t.columns[3].values, [1000, 1100, 900])
+        t = create_table(d, False)
+        self.assertEqual(len(t.columns), 5)
+        self.assertEqual(t.columns[-1].values, [10, 20, 30])
+
+
 class TestIntegrationLongAmpliconAnalysisReport(TestLongAmpliconAnalysisReport):
 
     def test_basic(self):
@@ -8,6 +8,8 @@ import json
 import os.path as op
 import os
 
+import numpy as np
+
 from pbcore.util.Process import backticks
 from pbcore.io import SubreadSet, BarcodeSet
 import pbcommand.testkit
@@ -17,6 +19,7 @@ from pbreports.plot.helper import DEFAULT_DPI
 import pbtestdata
 
 from pbreports.report.barcode import *
+from pbreports.report.barcode import _get_group_hist2d
 
 from base_test_case import (validate_report_complete,
                             skip_if_data_dir_not_present)
@@ -127,6 +130,31 @@ class TestBarcodeReport(unittest.TestCase):
         self.assertRaises(AssertionError,
                           lambda: bc_group.add_read(read_info[3]))
 
+    def test_value_histogram(self):
+        hist = ValueHistogram([3, 5, 3])
+        values, counts = hist.get_values()
+        self.assertEqual(values.tolist(), [3, 5])
+        self.assertEqual(counts.tolist(), [2, 1])
+        # larger values merge bins, keeping the count, sum, min and max
+        hist = ValueHistogram(max_bins=8)
+        for value in range(2, 100):
+            hist.add(value)
+        self.assertEqual(hist.dx, 16)
+        self.assertTrue(len(hist.bins) <= 8)
+        self.assertEqual((hist.n, hist.total), (98, 4949))
+        self.assertEqual((hist.min_value, hist.max_value), (2, 99))
+        values, counts = hist.get_values()
+        self.assertEqual(counts.sum(), 98)
+        self.assertEqual((values.min(), values.max()), (8, 99))
+        # adding an array bins it like adding each value
+        hist2 = ValueHistogram(max_bins=8)
+        hist2.add_array(range(2, 50))
+        hist2.add_array(np.arange(50, 100))
+        self.assertEqual(hist2.dx, hist.dx)
+        self.assertEqual(hist2.bins.tolist(), hist.bins.tolist())
+        self.assertEqual((hist2.n, hist2.total), (98, 4949))
+        self.assertEqual((hist2.min_value, hist2.max_value), (2, 99))
+
     def test_make_nreads_histogram(self):
         bc_groups = self._get_synthetic_bc_info()
         p = make_nreads_histogram(bc_groups, self._tmp_dir)
@@ -168,6 +196,19 @@ class TestBarcodeReport(unittest.TestCase):
         p = make_bcqual_hist2d(bc_groups, self._tmp_dir)
         self.assertTrue(op.isfile(op.join(self._tmp_dir, p.image)))
 
+    def test_get_group_hist2d(self):
+        bc_groups = self._get_synthetic_bc_info()
+        x, y = [], []
+        for i, group in enumerate(bc_groups, start=1):
+            x.extend([i] * group.n_subreads)
+            y.extend(np.repeat(*group.bq_hist.get_values()))
+        counts, xedges, yedges = np.histogram2d(x, y, bins=[4, 10])
+        h = _get_group_hist2d([g.bq_hist for g in bc_groups], 10)
+        self.assertEqual(h[0].tolist(), counts.tolist())
+        self.assertEqual(h[1].tolist(), xedges.tolist())
+        self.assertEqual(h[2].tolist(), yedges.tolist())
+        self.assertEqual(h[3], 90)
+
     def test_make_plots(self):
         bc_groups = self._get_synthetic_bc_info()
         pgs = make_plots(bc_groups, self._tmp_dir)
@@ -15,6 +15,7 @@ import pbtestdata
 
 from pbreports.util import get_top_contigs
 from pbreports.report.coverage import (make_coverage_report, CoverageReport,
+                                       ContigCoverage, load_coverage_regions,
                                        _get_contigs_to_plot,
                                        _get_reference_coverage_stats,
                                        _get_att_mean_coverage,
@@ -97,6 +98,31 @@ class TestCoverageRpt(unittest.TestCase):
         self.assertEqual(self.PLOT_FILE_NAME, op.basename(c_cov.file_name))
         # TODO  more testing of cc
 
+    def test_contig_coverage_add_data(self):
+        """
+        Test that adding GFF records one at a time matches the columnar load
+        """
+        regions = load_coverage_regions(self.GFF)
+        contigs = {}
+        with GffReader(self.GFF) as gff_in:
+            for rec in gff_in:
+                if rec.seqid not in contigs:
+                    contigs[rec.seqid] = ContigCoverage(rec.seqid)
+                contigs[rec.seqid].add_data(rec)
+        self.assertEqual(sorted(contigs.keys()), sorted(regions.seqids))
+        for seqid, c_cov in contigs.iteritems():
+            l_cov = ContigCoverage(seqid, regions=regions)
+            self.assertEqual(repr(c_cov), repr(l_cov))
+            for attr in ("xData", "yDataMean", "yDataStdevPlus",
+                         "yDataStdevMinus"):
+                self.assertEqual(list(getattr(c_cov, attr)),
+                                 list(getattr(l_cov, attr)))
+            self.assertEqual(c_cov.meanCoveragePerBase(),
+                             l_cov.meanCoveragePerBase())
+            self.assertEqual(c_cov.aveRegionSize(), l_cov.aveRegionSize())
+            self.assertEqual(c_cov.missingBases(), l_cov.missingBases())
+            self.assertEqual(c_cov.numBases(), l_cov.numBases())
+
     def test_create_contig_plot(self):
         """
         Simple non-null test of single contig fig,ax
@@ -6,12 +6,18 @@ import logging
 import tempfile
 import functools
 
+import numpy as np
+
 from pbcommand.pb_io.report import dict_to_report
 from pbcommand.models.report import Report
 
 from pbreports.report.filter_subread import (to_report,
+                                             to_records,
+                                             iter_record_blocks,
                                              NoSubreadsFound,
                                              NoSubreadsPassedFilter,
+                                             N50Aggregator,
+                                             SubreadLengthHistogram,
                                              Constants)
 
 from base_test_case import ROOT_DATA_DIR, run_backticks, \
@@ -167,3 +173,37 @@ class TestFilterSubreadReportNoSubreadsPassedFilterException(unittest.TestCase):
         with self.assertRaises(NoSubreadsPassedFilter):
             report = to_report(filtered_subread_summary_csv, output_dir)
             log.info(report)
+
+
+class TestToRecords(unittest.TestCase):
+    MOVIE = "m120404_091356_42139_c000325362550000001500000112311376_s1_p0"
+    LINES = ["{m},8,426,664,238,0\n".format(m=MOVIE),
+             "{m},8,705,1035,330,1\n".format(m=MOVIE),
+             "{m},9,1079,1401,322,1\n".format(m=MOVIE)]
+
+    def test_to_records(self):
+        records = to_records(self.LINES)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records.length.tolist(), [238, 330, 322])
+        self.assertEqual(records.hole_number.tolist(), [8, 8, 9])
+        self.assertEqual(records.passed_filter.tolist(), [False, True, True])
+        self.assertEqual(records[records.passed_filter].length.sum(), 652)
+
+    def test_to_records_bad_line(self):
+        with self.assertRaises(ValueError):
+            to_records(self.LINES + ["{m},9,1079\n".format(m=self.MOVIE)])
+
+    def test_iter_record_blocks(self):
+        blocks = list(iter_record_blocks(iter(self.LINES), block_size=2))
+        self.assertEqual([len(b) for b in blocks], [2, 1])
+
+    def test_merge_aggregators(self):
+        records = to_records(self.LINES)
+        for klass, args, value in ((N50Aggregator, ("length",), "n50"),
+                                   (SubreadLengthHistogram, (), "bins")):
+            a, b, c = klass(*args), klass(*args), klass(*args)
+            a.apply_batch(records)
+            b.apply_batch(records[:1])
+            c.apply_batch(records[1:])
+            self.assertEqual(list(np.atleast_1d(getattr(a, value))),
+                             list(np.atleast_1d(getattr(b.merge(c), value))))
@@ -9,6 +9,8 @@ import json
 import os.path as op
 import sys
 
+import numpy as np
+
 from pbcommand.pb_io.report import dict_to_report, load_report_from_json
 from pbcommand.models.report import Report
 import pbcommand.testkit
@@ -17,7 +19,12 @@ from pbcore.io import AlignmentSet, ConsensusAlignmentSet
 import pbtestdata
 
 from pbreports.report import mapping_stats_ccs
-from pbreports.report.mapping_stats import to_report, Constants, spec
+from pbreports.report.streaming_utils import get_percentile
+from pbreports.report.mapping_stats import (to_report, Constants, spec,
+                                           load_aggregator_state,
+                                           SubReadlengthHistogram,
+                                           MappedReadLengthQ95,
+                                           MappingStatsCollector)
 
 from base_test_case import ROOT_DATA_DIR, run_backticks, \
     skip_if_data_dir_not_present, LOCAL_DATA, validate_report_metadata, \
@@ -305,6 +312,84 @@ class TestMappingStatsMisc(unittest.TestCase):
             self.assertTrue(w >= 4)
 
 
+class TestSubreadLengthHistogram(unittest.TestCase):
+
+    def test_rebinned(self):
+        lengths = {"Length": np.array([0, 1, 99, 100, 101, 250, 999, 1000,
+                                       123456], dtype=float)}
+        fine = SubReadlengthHistogram(dx=100)
+        fine.apply(lengths)
+        for dx in (100, 200, 500):
+            expected = SubReadlengthHistogram(dx=dx)
+            expected.apply(lengths)
+            rebinned = fine.rebinned(dx)
+            self.assertEqual(rebinned.dx, dx)
+            self.assertTrue(np.array_equal(rebinned.bins, expected.bins))
+        self.assertRaises(ValueError, fine.rebinned, 150)
+
+
+class TestMappedReadLengthQ95(unittest.TestCase):
+
+    def test_longest_read_in_last_bin(self):
+        q95 = MappedReadLengthQ95(dx=10, nbins=10000)
+        q95.apply(np.array([500, 600, 150000], dtype=float))
+        self.assertEqual(q95.nbins, 15001)
+        # the last bin is not counted
+        self.assertEqual(q95.attribute, 600)
+
+    def test_get_percentile_np_histogram(self):
+        h, bin_edges = np.histogram([0, 1, 9, 9, 9, 9], bins=3)
+        self.assertEqual(get_percentile(h, bin_edges, 95), 6)
+
+
+class _CountingCollector(MappingStatsCollector):
+    """Records the alignment files analyzed by each run"""
+    analyzed = []
+
+    def _analyze_files(self, state, file_names):
+        self.analyzed.append(list(file_names))
+        return super(_CountingCollector, self)._analyze_files(state,
+                                                              file_names)
+
+
+class TestMappingStatsIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(suffix="_mapping_stats")
+        self.bam_files = []
+        for i in range(2):
+            bam_file = op.join(self.output_dir,
+                               "aligned_{i}.bam".format(i=i))
+            for ext in ("", ".pbi"):
+                shutil.copyfile(pbtestdata.get_file("aligned-bam") + ext,
+                                bam_file + ext)
+            self.bam_files.append(bam_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_added_resources(self):
+        """Test that adding resources gives the same report as a full run"""
+        state_file = op.join(self.output_dir, "mapping_stats_state.npz")
+        _CountingCollector.analyzed = []
+        for n in range(1, len(self.bam_files) + 1):
+            ds_file = op.join(self.output_dir,
+                              "aligned_{n}.alignmentset.xml".format(n=n))
+            AlignmentSet(*self.bam_files[:n]).write(ds_file)
+            report = _CountingCollector(
+                ds_file, state_file=state_file).to_report(self.output_dir)
+        # the second run only analyzes the added resource
+        self.assertEqual(_CountingCollector.analyzed,
+                         [self.bam_files[:1], self.bam_files[1:]])
+        state = load_aggregator_state(state_file)
+        self.assertEqual(sorted(state.resources.keys()), self.bam_files)
+        expected = MappingStatsCollector(ds_file).to_report(self.output_dir)
+        self.assertEqual({a.id: a.value for a in report.attributes},
+                         {a.id: a.value for a in expected.attributes})
+        self.assertEqual([c.values for c in report.tables[0].columns],
+                         [c.values for c in expected.tables[0].columns])
+
+
 # gmap data from pbsmrtpipe is not yet available for testing, this class needs to be updated
 # with fresh data
 
@@ -6,10 +6,13 @@ import shutil
 import os.path as op
 import csv
 import itertools
+from collections import OrderedDict
 
 import pbcommand.testkit
 
-from pbreports.report.minor_variants import to_report
+from pbreports.report.minor_variants import (to_report,
+                                             aggregate_variant_table,
+                                             iter_juliet_summary)
 
 from base_test_case import LOCAL_DATA, validate_report_complete
 
@@ -154,3 +157,31 @@ class TestMinorVariantsRpt(unittest.TestCase):
         self.assertAlmostEqual(95.8553791887125, c6['values'][1], delta=.0003)
 
         validate_report_complete(self, rpt)
+
+    def test_aggregate_variant_table(self):
+        variant_table = [["a", "b", "a", "a"],
+                         [10, 20, 30, 40],
+                         ["AAA"] * 4,
+                         ["AAC"] * 4,
+                         [1.0, 2.0, 3.0, 4.0],
+                         [100, 50, 200, 400],
+                         ["gag", "pol", "pol", "gag"],
+                         [["x"], ["y"], ["x", "z"], ["z"]],
+                         [["h1"], [], ["h1", "h2"], []],
+                         [[10.0], [], [10.0, 30.0], []]]
+        samples, coverage, variants, genes, drms, haps, max_freq = \
+            aggregate_variant_table(variant_table)
+        rows = dict(zip(samples, zip(coverage, variants, genes, drms, haps,
+                                     max_freq)))
+        self.assertEqual(rows["a"], (200, 3, 2, 2, 2, 30.0))
+        self.assertEqual(rows["b"], (50, 1, 1, 1, 0, None))
+
+    def test_iter_juliet_summary(self):
+        juliet_summary = op.join(_DATA_DIR, 'mix.json')
+        with open(juliet_summary) as f:
+            expected = json.load(f, object_pairs_hook=OrderedDict).items()
+        # small chunks force values to be split across reads
+        for chunk_size in [1, 7, 2 ** 20]:
+            with open(juliet_summary) as f:
+                self.assertEqual(list(iter_juliet_summary(f, chunk_size)),
+                                 expected)
@@ -5,6 +5,7 @@ import unittest
 import logging
 
 import pbcommand.testkit
+from pbcore.io import openDataSet
 
 from pbreports.report import overview
 from base_test_case import run_backticks, validate_report_complete
@@ -40,6 +41,67 @@ class TestOverViewReport(unittest.TestCase):
         a = self.report.get_attribute_by_id(id_)
         self.assertEqual(a.value, 1)
 
+    def test_get_movie_names(self):
+        with openDataSet(self.input_file) as ds:
+            movies = overview.get_movie_names(ds)
+            headers = set([])
+            for file_name in ds.toExternalFiles():
+                headers.update(overview._movies_from_header(file_name))
+        self.assertEqual(movies, headers)
+
+    def test_get_movie_names_unmatched_collection(self):
+        """Collections without a resource are not counted"""
+        with openDataSet(self.input_file) as ds:
+            expected = overview.get_movie_names(ds)
+            contexts = [c.context for c in ds.metadata.collections]
+            _ds = _Dataset(ds.toExternalFiles(),
+                           contexts + ["m00000_000000_000000_c0_s1_p0"])
+            self.assertEqual(overview.get_movie_names(_ds), expected)
+
+    def test_get_movie_names_from_metadata(self):
+        """Only the resources missing from the metadata are opened"""
+        movies = ["m54006_160504_020705", "m54006_160505_030808"]
+        file_names = ["/missing/{m}.subreads.bam".format(m=m) for m in movies]
+        opened = []
+
+        def _movies_from_read_groups(file_name):
+            opened.append(file_name)
+            return [overview.path_to_movie(file_name)]
+        movies_from_read_groups = overview._movies_from_read_groups
+        overview._movies_from_read_groups = _movies_from_read_groups
+        try:
+            _ds = _Dataset(file_names, movies)
+            self.assertEqual(overview.get_movie_names(_ds), set(movies))
+            self.assertEqual(opened, [])
+            _ds = _Dataset(file_names, movies[:1])
+            self.assertEqual(overview.get_movie_names(_ds), set(movies))
+            self.assertEqual(opened, file_names[1:])
+        finally:
+            overview._movies_from_read_groups = movies_from_read_groups
+
+
+class _Collection(object):
+
+    def __init__(self, context):
+        self.context = context
+
+
+class _Metadata(object):
+
+    def __init__(self, contexts):
+        self.collections = [_Collection(c) for c in contexts]
+
+
+class _Dataset(object):
+    """Resources and collection metadata of a dataset"""
+
+    def __init__(self, file_names, contexts):
+        self._file_names = file_names
+        self.metadata = _Metadata(contexts)
+
+    def toExternalFiles(self):
+        return self._file_names
+
 
 class TestOverviewReportIntegration(unittest.TestCase):
 
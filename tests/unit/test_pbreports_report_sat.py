@@ -12,13 +12,16 @@ import pbcommand.testkit
 from pbcommand.pb_io.report import load_report_from_json
 from pbcore.util.Process import backticks
 
+import numpy as np
 import pbtestdata
 
 from pbreports.util import movie_to_cell
 from pbreports.report.sat import (_validate_inputs, _get_read_hole_data,
                                   _cell_2_inst, _get_variants_data,
                                   _get_mapping_stats_data,
-                                  _get_reads_info, summarize_report)
+                                  _get_reads_info, summarize_report,
+                                  CellHolesConsumer)
+from pbreports.io.pbi_cache import PbiColumns
 
 from base_test_case import LOCAL_DATA, validate_report_complete
 
@@ -40,6 +43,19 @@ class TestCoreFunctions(unittest.TestCase):
         self.assertEqual(moviename, cellname)
         self.assertEqual('54004', _cell_2_inst(cellname))
 
+    def test_cell_holes_consumer(self):
+        rs_cell = "m130306_023456_42129_c100422252550000001523053002121396"
+        movies = [rs_cell + "_s1_p0", rs_cell + "_s2_p0", "m54004_151002_00100"]
+        holes = CellHolesConsumer()
+        for hole_numbers, movie_codes in [([1, 1, 2, 5, 7], [0, 0, 1, 1, 2]),
+                                          ([2, 3, 7], [0, 1, 2])]:
+            pbi = PbiColumns({"holeNumber": np.array(hole_numbers),
+                              "movie": np.array(movie_codes)}, movies, {})
+            holes.consume("movie.bam", pbi)
+        self.assertEqual(holes.hole_counts(),
+                         {rs_cell: (4, 2), movies[2]: (1, None)})
+        self.assertEqual(holes.instruments, {"42129", "54004"})
+
     def test_variants_rpt_atts(self):
         rpt = os.path.join(DATA, 'variants_report.json')
         d = _get_variants_data(rpt)
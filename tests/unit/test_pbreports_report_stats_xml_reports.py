@@ -17,7 +17,8 @@ from pbcore.io import SubreadSet
 
 import pbtestdata
 
-from pbreports.util import dist_shaper, continuous_dist_shaper
+from pbreports.util import (dist_shaper, continuous_dist_shaper,
+                            BinnedDistribution)
 from pbreports.report.loading_xml import to_report as make_loading_report
 from pbreports.report.filter_stats_xml import to_report as make_filter_report
 from pbreports.report.filter_stats_xml import Constants
@@ -647,3 +648,20 @@ class TestBinning(unittest.TestCase):
         ob, ol = shaper((bins, labels))
         self.assertEqual(eb, ob)
         self.assertEqual(el, ol)
+
+    def test_binned_distribution(self):
+        dist = BinnedDistribution([0, 1, 2, 3, 4, 0], [10, 15, 20, 25, 30, 35])
+        cropped = dist.crop(15, 30)
+        self.assertEqual(cropped.bins.tolist(), [1, 2, 3, 4])
+        self.assertEqual(cropped.labels.tolist(), [15, 20, 25, 30])
+        padded = cropped.pad(5, 40)
+        self.assertEqual(padded.bins.tolist(), [0, 0, 1, 2, 3, 4, 0, 0])
+        self.assertEqual(padded.labels.tolist(),
+                         [5, 10, 15, 20, 25, 30, 35, 40])
+        pooled = padded.pool(2)
+        self.assertEqual(pooled.bins.tolist(), [0, 3, 7, 0])
+        self.assertEqual(pooled.labels.tolist(), [5, 15, 25, 35])
+        self.assertEqual(pooled.bin_width, 10)
+        trimmed = pooled.trim(25)
+        self.assertEqual(trimmed.bins.tolist(), [0, 3, 7])
+        self.assertEqual(trimmed.labels.tolist(), [5, 15, 25])
@@ -33,6 +33,17 @@ class TestDataSetReports(unittest.TestCase):
                           "pbreports.tasks.filter_stats_report_xml",
                           "pbreports.tasks.loading_report_xml"])
 
+    @skip_if_no_testdata
+    def test_sequel_subreads_nproc(self):
+        data = pbtestdata.get_file("subreads-sequel")
+        datastore = subreads_reports.to_reports(data, self._output_dir,
+                                                nproc=4)
+        datastore_files = [f for u,f in datastore.files.iteritems()]
+        self.assertEqual(sorted([f.file_id for f in datastore_files]),
+                         ["pbreports.tasks.adapter_report_xml",
+                          "pbreports.tasks.filter_stats_report_xml",
+                          "pbreports.tasks.loading_report_xml"])
+
     def test_integration(self):
         ds_out = op.join(self._output_dir, "datastore.json")
         args = ["python", "-m", "pbreports.report.subreads_reports",
@@ -22,6 +22,7 @@ from pbreports.report.variants import (make_variants_report, _extract_alignment_
                                        _append_variants_gff_data,
                                        _get_consensus_table_and_attributes,
                                        _ref_ids_ordered_by_len,
+                                       _reduce_by_contig, GAPS, COV,
                                        _create_variants_plot_grp, _create_bars, _get_legend_file)
 
 from base_test_case import _get_root_data_dir, run_backticks, \
@@ -365,6 +366,20 @@ class TestVariantsReportMisc(unittest.TestCase):
         self.assertEqual('2', o[1])
         self.assertEqual('1', o[2])
 
+    def test_reduce_by_contig(self):
+        """
+        Test the per-record columns collapse into one row per contig
+        """
+        data = _reduce_by_contig(3, [0, 2, 0], [10, 5, 20], [1, 2, 3],
+                                 [1.5, 2.0, 3.0])
+        self.assertEqual((3, 4), data.shape)
+        self.assertEqual(20, data[0][LENGTH])
+        self.assertEqual(4, data[0][GAPS])
+        self.assertAlmostEqual(4.5, data[0][COV])
+        self.assertEqual(0, data[1][LENGTH])
+        self.assertEqual(5, data[2][LENGTH])
+        self.assertEqual(0, data[2][ERR])
+
 
 class TestToolContract(pbcommand.testkit.PbTestApp):
     DATA_DIR = op.join(LOCAL_DATA, "variants")
@@ -4,10 +4,18 @@ import unittest
 import tempfile
 import shlex
 
+import numpy as np
+
 from base_test_case import ROOT_DATA_DIR, run_backticks, \
     skip_if_data_dir_not_present
 
-from pbreports.report.summarize_compare_by_movie import main
+from pbcore.io import CmpH5Reader
+from pbcommand.validators import fofn_to_files
+
+from pbreports.report.summarize_compare_by_movie import (
+    main, MovieStats, ValueBuffer, CMP_ZSCORE,
+    _get_movie_stats_from_movie_files, _get_post_mapping_from_alignments,
+    _get_post_mapping_from_alignment_index)
 
 log = logging.getLogger()
 
@@ -31,6 +39,34 @@ def _generate_tmp_file():
     return t.name
 
 
+class TestMovieStats(unittest.TestCase):
+
+    def test_n_high_qvs(self):
+        m = MovieStats("1234567", "0001", "movie", "inst")
+        self.assertEqual(m.nHighQVs, [0, 0, 0])
+        m.addQualityValues(np.array([0, 59, 60, 79, 80, 99, 100, 254],
+                                    dtype=np.uint8))
+        m.addQualityValues(np.array([], dtype=np.uint8))
+        m.addQualityValues(np.array([61.5, 99.9]))
+        self.assertEqual(m.nHighQVs, [8, 5, 2])
+
+
+class TestValueBuffer(unittest.TestCase):
+
+    def test_append_extend(self):
+        b = ValueBuffer(np.int32, capacity=2)
+        self.assertEqual(len(b), 0)
+        for x in [5, 1, 4]:
+            b.append(x)
+        b.extend([3, 2, 6])
+        self.assertEqual(b.values.tolist(), [5, 1, 4, 3, 2, 6])
+        self.assertEqual(b.sorted_values.tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(b.median(), 3.5)
+        b.append(7)
+        self.assertEqual(b.median(), 4)
+        self.assertEqual(b.values.dtype, np.int32)
+
+
 class TestHelp(unittest.TestCase):
 
     def test_help(self):
@@ -50,6 +86,23 @@ class TestSummarizeCompareByMovie(unittest.TestCase):
         rcode = main(args)
         self.assertEqual(rcode, 0)
 
+    def test_alignment_index(self):
+        """The alignment index path matches the per-alignment path"""
+        movies = _get_movie_stats_from_movie_files(fofn_to_files(_INPUT_FOFN))
+        reader = CmpH5Reader(_CONTROL_CMP_H5)
+        try:
+            if CMP_ZSCORE not in reader.file:
+                raise unittest.SkipTest("No z-scores in the cmp.h5")
+            expected = _get_post_mapping_from_alignments(movies, reader)
+            stats = _get_post_mapping_from_alignment_index(movies, reader)
+        finally:
+            reader.close()
+        self.assertEqual(sorted(stats.keys()), sorted(expected.keys()))
+        for movie, movie_stats in stats.items():
+            for external in [False, True]:
+                self.assertEqual(movie_stats.tostring(external),
+                                 expected[movie].tostring(external))
+
 
 @skip_if_data_dir_not_present
 class TestIntegrationSummarizeCompareByMovie(unittest.TestCase):
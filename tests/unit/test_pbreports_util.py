@@ -4,10 +4,15 @@ import os
 import unittest
 import nose
 
+import numpy as np
+
 from pbcommand.models.report import Attribute
 
 from pbreports.util import (movie_to_cell, get_fasta_readlengths,
                             compute_n50_from_file, compute_n50,
+                            compute_n50_from_counts, compute_n50_from_bins,
+                            compute_esize, compute_percentile,
+                            compute_percentile_from_counts,
                             accuracy_as_phred_qv, report_to_attributes,
                             attributes_to_table)
 
@@ -36,6 +41,31 @@ class TestFunctions(unittest.TestCase):
         n = compute_n50(x)
         self.assertEqual(n, 69)
 
+    def test_compute_n50_from_histogram(self):
+        x = [91, 77, 70, 69, 62, 56, 45, 29, 16, 4, 69, 69]
+        values, counts = np.unique(x, return_counts=True)
+        self.assertEqual(compute_n50_from_counts(values, counts),
+                         compute_n50(x))
+        bins = np.bincount(x)
+        self.assertEqual(compute_n50_from_bins(bins), compute_n50(x))
+        self.assertEqual(compute_n50_from_bins([0, 0, 1]), 2)
+        self.assertEqual(compute_n50_from_bins([0, 0, 0]), 0)
+
+    def test_compute_esize(self):
+        self.assertEqual(compute_esize([]), 0.0)
+        self.assertEqual(compute_esize([2, 6]), 5.0)
+        self.assertEqual(compute_esize([2, 6], counts=[3, 0]), 2.0)
+        self.assertEqual(compute_esize(np.array([2, 6, 6]), [1, 1, 0]), 5.0)
+
+    def test_compute_percentile(self):
+        self.assertEqual(compute_percentile([5, 1, 3, 2, 4], 50), 3)
+        self.assertEqual(compute_percentile([5, 1, 3, 2, 4], 100), 5)
+        edges = np.arange(0, 40, 10)
+        counts = [1, 0, 8, 1]
+        self.assertEqual(compute_percentile_from_counts(edges, counts, 5), 0)
+        self.assertEqual(compute_percentile_from_counts(edges, counts, 50), 20)
+        self.assertEqual(compute_percentile_from_counts(edges, counts, 95), 30)
+
 
 class TestUtil(BaseTestCase):
 